@@ -6,13 +6,18 @@
 
 import os
 import sys
+import json
 import argparse
-import whisper
-import stable_whisper
-from typing import List, Dict, Tuple
+import contextlib
+from typing import List, Dict, Tuple, Iterable, Iterator, Optional, Union
 import re
-from dtw import dtw
+import bisect
+import hashlib
 import numpy as np
+from txt2srt_models import registry as model_registry, lease_faster_whisper_model, acquire_inference
+from txt2srt_timeline import CharTimeline, remove_punctuation, text_to_codes
+from txt2srt_cues import CueList, settle_starts
+from txt2srt_report import AlignmentReport, STAGE_NAMES, stage, write_report
 
 
 def format_timestamp(seconds: float) -> str:
@@ -180,7 +185,228 @@ def _force_split_by_chars(text: str, max_chars: int) -> List[str]:
     return segments
 
 
-def align_audio_text(audio_path: str, text: str, model_name: str = "base", use_gpu: bool = True, max_chars: int = 30) -> List[Dict]:
+# stable-ts 识别参数（所有识别路径共用）
+TRANSCRIBE_OPTIONS = dict(
+    language="zh",
+    word_timestamps=True,
+    verbose=False,
+    regroup=True,     # 重新分组，获得合理的句子切分
+    beam_size=1,      # 强制使用 Greedy Loading，大幅进一步提速
+    temperature=0,    # 确定性输出
+    vad_filter=True,  # ⚡️ 性能优化核心 2: 开启 VAD (语音活动检测)，跳过静音片段
+    vad_parameters=dict(min_silence_duration_ms=500), # 只有超过500ms的静音才跳过
+)
+
+
+def resolve_device(use_gpu: bool = True) -> Tuple[str, str]:
+    """
+    选择推理设备和计算精度
+    
+    Returns:
+        (device, compute_type)
+    """
+    try:
+        import torch
+        cuda_available = torch.cuda.is_available()
+    except ImportError:
+        # 未安装 PyTorch（例如只用模拟识别后端跑基准测试）时只能用CPU
+        cuda_available = False
+    
+    # 检查GPU可用性
+    device = "cuda" if use_gpu and cuda_available else "cpu"
+    if use_gpu and not cuda_available:
+        print("⚠️ 警告: GPU不可用，使用CPU处理（速度较慢）")
+        print("   如需GPU加速，请安装CUDA版本的PyTorch")
+    else:
+        print(f"✅ 使用设备: {device.upper()}")
+    
+    # ⚠️ 修复 cuBLAS 错误: 回退到 float16，int8_float16 在部分环境会导致 CUBLAS_STATUS_NOT_SUPPORTED
+    compute_type = "float16" if device == "cuda" else "int8"
+    return device, compute_type
+
+
+def load_whisper_model(model_name: str, use_gpu: bool = True, device: str = None, compute_type: str = None):
+    """
+    选择设备和计算精度，并从进程级缓存获取 Faster-Whisper 模型
+    
+    返回的模型不受淘汰保护，只用于预热；要用模型推理时请用 whisper_model_lease
+    
+    Args:
+        model_name: Whisper模型大小 (tiny, base, small, medium, large)
+        use_gpu: 是否使用GPU加速
+        device, compute_type: 已由 resolve_device 确定时直接传入
+    
+    Returns:
+        stable-ts 封装的 faster-whisper 模型
+    """
+    with whisper_model_lease(model_name, use_gpu, device, compute_type) as model:
+        return model
+
+
+@contextlib.contextmanager
+def whisper_model_lease(model_name: str, use_gpu: bool = True, device: str = None, compute_type: str = None):
+    """
+    with whisper_model_lease(...) as model: ...  —— 参数同 load_whisper_model
+    
+    with 块内模型被标记为占用，不会因为其他任务加载模型超出预算而被卸载
+    """
+    if device is None or compute_type is None:
+        device, compute_type = resolve_device(use_gpu)
+    
+    print(f"加载Whisper模型 (Faster-Whisper增强版): {model_name}...")
+    # 使用stable-ts加载faster-whisper模型
+    print(f"   - 计算精度: {compute_type} (兼容性模式)")
+    
+    # 从进程级缓存获取模型（UI多次点击处理时无需重复加载）
+    with lease_faster_whisper_model(model_name, device, compute_type) as model:
+        cache_stats = model_registry.stats()
+        print(f"   - 模型缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次, 累计加载耗时 {cache_stats['load_seconds']:.1f}s")
+        yield model
+
+
+def transcribe_audio(audio_path: str, model_name: str = "base", use_gpu: bool = True, long_audio: bool = False,
+                     chunk_seconds: float = 600.0, checkpoint_dir: str = None, use_cache: bool = True,
+                     report: AlignmentReport = None) -> List[Dict]:
+    """
+    识别音频，返回带时间戳的段落列表 [{"start", "end", "text", "words"}, ...]
+    
+    结果按 音频内容哈希 + 模型 + 计算精度 + 识别参数 缓存在磁盘上（见 txt2srt_asrcache），
+    命中时不加载模型也不识别。
+    
+    Args:
+        audio_path: 音频文件路径
+        model_name: Whisper模型大小
+        use_gpu: 是否使用GPU加速
+        long_audio: 长音频模式（按静音分块识别）
+        chunk_seconds: 长音频模式下每块的目标时长（秒）
+        checkpoint_dir: 长音频模式的检查点目录
+        use_cache: 是否使用识别结果磁盘缓存
+        report: 分阶段指标（可选，记录 asr_cache / model_load / queue_wait / transcribe 阶段）
+    
+    Returns:
+        识别出的段落列表（全局时间轴）
+    """
+    device, compute_type = resolve_device(use_gpu)
+    
+    # 使用stable-ts识别音频（获取精确的句子级时间戳）
+    transcribe_options = dict(TRANSCRIBE_OPTIONS)
+    
+    cache = cache_key = None
+    if use_cache:
+        from txt2srt_asrcache import ASRCache, hash_audio, make_cache_key
+        with stage(report, "asr_cache"):
+            cache = ASRCache()
+            # 分块方式会影响识别结果，长音频模式把分块参数也计入缓存键
+            key_options = dict(transcribe_options, long_audio=long_audio, chunk_seconds=chunk_seconds if long_audio else None)
+            cache_key = make_cache_key(hash_audio(audio_path), model_name, compute_type, key_options)
+            cached = cache.get(cache_key)
+        if report is not None:
+            report.cache_hit = cached is not None
+        if cached is not None:
+            print(f"   ⚡ 命中识别结果缓存 ({cache_key[:12]})，跳过模型加载和识别")
+            return cached
+    
+    with contextlib.ExitStack() as held:
+        with stage(report, "model_load"):
+            model = held.enter_context(whisper_model_lease(model_name, use_gpu, device, compute_type))
+        recognized_segments = _run_transcribe(model, audio_path, transcribe_options, long_audio, chunk_seconds,
+                                              checkpoint_dir, report)
+    
+    if cache is not None:
+        cache.put(cache_key, recognized_segments, meta={
+            "audio_name": os.path.basename(audio_path),
+            "model": model_name,
+            "compute_type": compute_type,
+            "language": transcribe_options.get("language"),
+        })
+    
+    return recognized_segments
+
+
+def _run_transcribe(model, audio_path: str, transcribe_options: Dict, long_audio: bool, chunk_seconds: float,
+                    checkpoint_dir: str, report: AlignmentReport = None) -> List[Dict]:
+    """
+    用已加载的模型识别音频（整段或按静音分块），等推理锁的时间记入 queue_wait 阶段
+    """
+    if long_audio:
+        # 长音频：按静音分块识别，内存占用与时长无关，支持断点续跑
+        from txt2srt_longaudio import transcribe_long_audio
+        recognized_segments = transcribe_long_audio(
+            model,
+            audio_path,
+            transcribe_options,
+            chunk_seconds=chunk_seconds,
+            checkpoint_dir=checkpoint_dir,
+            report=report
+        )
+    else:
+        # 多个任务共用同一个模型时依次推理（长音频模式在每块识别时加锁）
+        with acquire_inference(model, report), stage(report, "transcribe"):
+            result = model.transcribe(audio_path, **transcribe_options)
+        
+        # 提取识别出的句子和时间戳（词级时间戳一并保存，供缓存复用）
+        recognized_segments = []
+        for segment in result.segments:
+            recognized_segments.append({
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text.strip(),
+                "words": [
+                    {"start": word.start, "end": word.end, "word": word.word}
+                    for word in (segment.words or [])
+                ]
+            })
+    return recognized_segments
+
+
+def force_align_audio(audio_path: str, text: str, model_name: str = "base", use_gpu: bool = True,
+                      report: AlignmentReport = None) -> List[Dict]:
+    """
+    用 Whisper 对已知文本做强制对齐，返回词级时间戳 [{"start", "end", "text"}, ...]
+    
+    文稿已知时，自回归解码的大部分计算都在"重新猜出"已有的文本。
+    stable-ts 的 align 把用户文本的 token 直接喂给解码器（teacher forcing），
+    每个30秒窗口只需一次批量前向计算，再由时间戳 token 概率和交叉注意力得到词级时间戳。
+    输出文本就是用户文本，不存在识别错误导致的匹配问题。
+    
+    Args:
+        audio_path: 音频文件路径
+        text: 用户提供的准确文本
+        model_name: Whisper模型大小
+        use_gpu: 是否使用GPU加速
+        report: 分阶段指标（可选，记录 model_load / queue_wait / forced_align 阶段）
+    
+    Returns:
+        词级段落列表（全局时间轴）
+    """
+    # 换行/多余空白对对齐没有意义，统一压缩为单个空格
+    plain_text = " ".join(text.split())
+    with contextlib.ExitStack() as held:
+        with stage(report, "model_load"):
+            model = held.enter_context(whisper_model_lease(model_name, use_gpu))
+        with acquire_inference(model, report), stage(report, "forced_align"):
+            result = model.align(
+                audio_path,
+                plain_text,
+                language=TRANSCRIBE_OPTIONS["language"],
+                verbose=False
+            )
+    if result is None:
+        raise RuntimeError("强制对齐失败，请改用其他匹配引擎（-e banded）")
+    
+    words = []
+    for segment in result.segments:
+        for word in segment.words:
+            if word.word.strip():
+                words.append({"start": word.start, "end": word.end, "text": word.word.strip()})
+    
+    print(f"   强制对齐得到 {len(words)} 个词级时间戳")
+    return words
+
+
+def align_audio_text(audio_path: str, text: str, model_name: str = "base", use_gpu: bool = True, max_chars: int = 30, engine: str = "banded",
+                     long_audio: bool = False, chunk_seconds: float = 600.0, checkpoint_dir: str = None, use_cache: bool = True,
+                     state_path: str = None, report: AlignmentReport = None, workers: int = 1) -> List[Dict]:
     """
     先用Whisper识别获取准确的时间戳，然后用用户文本替换识别文本
     
@@ -195,52 +421,43 @@ def align_audio_text(audio_path: str, text: str, model_name: str = "base", use_g
         text: 用户提供的准确文本
         model_name: Whisper模型大小 (tiny, base, small, medium, large)
         use_gpu: 是否使用GPU加速
+        max_chars: 每行最大字符数
+        engine: 字符匹配引擎 (banded, full, anchor, lcs)，见 match_user_text_to_timestamps；
+            "forced" 表示不识别音频，直接对用户文本做强制对齐（见 force_align_audio）；
+            "draft" 表示只做语音活动检测的草稿模式（见 align_audio_text_draft）
+        long_audio: 长音频模式（按静音分块识别，内存占用恒定，支持断点续跑）
+        chunk_seconds: 长音频模式下每块的目标时长（秒）
+        checkpoint_dir: 长音频模式的检查点目录（默认在音频旁创建，成功后删除）
+        use_cache: 是否使用识别结果磁盘缓存（同一音频只改文稿时跳过识别）
+        state_path: 增量对齐状态文件（指定后只重新对齐文稿中改动的部分，见 match_user_text_incremental）
+        report: 分阶段指标（可选，传入 AlignmentReport 后填充各阶段耗时、内存、字符数和匹配率）
+        workers: anchor 引擎并行处理锚点空隙的进程数（默认 1，不启动子进程）
     
     Returns:
         包含时间戳的文本段落列表（使用用户提供的文本 + Whisper的时间戳）
     """
-    import torch
-    
-    # 检查GPU可用性
-    device = "cuda" if use_gpu and torch.cuda.is_available() else "cpu"
-    if use_gpu and not torch.cuda.is_available():
-        print("⚠️ 警告: GPU不可用，使用CPU处理（速度较慢）")
-        print("   如需GPU加速，请安装CUDA版本的PyTorch")
-    else:
-        print(f"✅ 使用设备: {device.upper()}")
-    
-    print(f"加载Whisper模型 (Faster-Whisper增强版): {model_name}...")
-    # 使用stable-ts加载faster-whisper模型
-    # ⚠️ 修复 cuBLAS 错误: 回退到 float16，int8_float16 在部分环境会导致 CUBLAS_STATUS_NOT_SUPPORTED
-    compute_type = "float16" if device == "cuda" else "int8"
-    print(f"   - 计算精度: {compute_type} (兼容性模式)")
-    
-    model = stable_whisper.load_faster_whisper(model_name, device=device, compute_type=compute_type)
+    if engine == "draft":
+        return align_audio_text_draft(audio_path, text, max_chars=max_chars, report=report)
     
     print(f"正在处理音频文件: {audio_path}")
-    print("🎯 步骤1: 使用Faster-Whisper识别音频，获取准确的时间戳...")
-    
-    # 使用stable-ts识别音频（获取精确的句子级时间戳）
-    result = model.transcribe(
-        audio_path,
-        language="zh",
-        word_timestamps=True,
-        verbose=False,
-        regroup=True,     # 重新分组，获得合理的句子切分
-        beam_size=1,      # 强制使用 Greedy Loading，大幅进一步提速
-        temperature=0,    # 确定性输出
-        vad_filter=True,  # ⚡️ 性能优化核心 2: 开启 VAD (语音活动检测)，跳过静音片段
-        vad_parameters=dict(min_silence_duration_ms=500), # 只有超过500ms的静音才跳过
-    )
     
-    # 提取识别出的句子和时间戳
-    recognized_segments = []
-    for segment in result.segments:
-        recognized_segments.append({
-            "start": segment.start,
-            "end": segment.end,
-            "text": segment.text.strip()
-        })
+    if engine == "forced":
+        print("🎯 步骤1: 用Whisper对已知文本做强制对齐（teacher forcing，不做自回归解码）...")
+        recognized_segments = force_align_audio(audio_path, text, model_name, use_gpu, report=report)
+        # 强制对齐得到的就是用户文本本身，字符匹配几乎是一一对应
+        engine = "banded"
+    else:
+        print("🎯 步骤1: 使用Faster-Whisper识别音频，获取准确的时间戳...")
+        recognized_segments = transcribe_audio(
+            audio_path,
+            model_name,
+            use_gpu,
+            long_audio=long_audio,
+            chunk_seconds=chunk_seconds,
+            checkpoint_dir=checkpoint_dir,
+            use_cache=use_cache,
+            report=report
+        )
     
     print(f"   Whisper识别到 {len(recognized_segments)} 个语音段落")
     
@@ -251,7 +468,8 @@ def align_audio_text(audio_path: str, text: str, model_name: str = "base", use_g
             print(f"   [{i+1}] {seg['start']:.1f}s - {seg['end']:.1f}s: {seg['text'][:30]}...")
     
     print("\n🎯 步骤2: 将用户文本分割成句子...")
-    user_sentences = split_text_into_segments(text, max_chars=max_chars)
+    with stage(report, "split"):
+        user_sentences = split_text_into_segments(text, max_chars=max_chars)
     print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
     
     # 显示前几个用户句子
@@ -262,27 +480,584 @@ def align_audio_text(audio_path: str, text: str, model_name: str = "base", use_g
     
     print("\n🎯 步骤3: 使用DTW算法匹配识别文本和用户文本...")
     
-    # 使用DTW在字符级别匹配
-    aligned_segments = match_user_text_to_timestamps(
-        recognized_segments, 
-        user_sentences
-    )
+    with stage(report, "match"):
+        aligned_segments = _match_sentences(recognized_segments, user_sentences, engine, state_path, report, workers)
     
     print(f"\n🎯 步骤4: 修复时间戳重叠与微调字幕体验...")
     
-    # 修复重叠的时间戳，确保严格按时间顺序
-    aligned_segments = fix_overlapping_timestamps(aligned_segments)
-    
-    # 进一步优化字幕持续时间（消除闪烁感，填补小空隙）
-    aligned_segments = optimize_subtitle_duration(aligned_segments)
+    with stage(report, "postprocess"):
+        # 修复重叠的时间戳，确保严格按时间顺序
+        aligned_segments = fix_overlapping_timestamps(aligned_segments)
+        
+        # 进一步优化字幕持续时间（消除闪烁感，填补小空隙）
+        aligned_segments = optimize_subtitle_duration(aligned_segments)
     
     print(f"\n✅ 对齐完成！生成了 {len(aligned_segments)} 个字幕段落")
     print(f"   保留了Whisper的准确时间戳，使用了用户的正确文本")
     
+    if report is not None:
+        report.finish(aligned_segments)
     return aligned_segments
 
 
-def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentences: List[str]) -> List[Dict]:
+def _match_sentences(recognized_segments: List[Dict], user_sentences: List[str], engine: str, state_path: str = None,
+                     report: AlignmentReport = None, workers: int = 1) -> CueList:
+    """
+    字符匹配（指定 state_path 时增量对齐并更新状态文件）
+    """
+    if state_path:
+        # 增量模式：复用上次的字符映射，只重新对齐改动的段落
+        previous = None
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                print(f"   ⚠️ 无法读取增量对齐状态 {state_path}，进行完整对齐")
+        aligned_segments, state = match_user_text_incremental(
+            recognized_segments,
+            user_sentences,
+            previous,
+            engine=engine,
+            report=report,
+            workers=workers
+        )
+        if state is not None:
+            tmp_path = state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, state_path)
+    else:
+        # 使用DTW在字符级别匹配
+        aligned_segments = match_user_text_to_timestamps(
+            recognized_segments, 
+            user_sentences,
+            engine=engine,
+            report=report,
+            workers=workers
+        )
+    return aligned_segments
+
+
+def align_audio_text_streaming(audio_path: str, text: str, output_path: str, model_name: str = "base", use_gpu: bool = True, max_chars: int = 30,
+                               engine: str = "anchor", chunk_seconds: float = 60.0, checkpoint_dir: str = None) -> int:
+    """
+    流式对齐：按块识别音频，每确定一段字幕就立即写入SRT文件
+    
+    识别 → 匹配 → 修复重叠 → 优化时长 → 写文件 整条流水线都是生成器，
+    每个后处理步骤只向后看一个字幕，首批字幕在第一块音频识别完成后即可写出。
+    
+    Args:
+        audio_path: 音频文件路径
+        text: 用户提供的准确文本
+        output_path: 输出SRT文件路径
+        model_name: Whisper模型大小 (tiny, base, small, medium, large)
+        use_gpu: 是否使用GPU加速
+        max_chars: 每行最大字符数
+        engine: 字符匹配引擎（默认 anchor，适合反复对齐的长窗口）
+        chunk_seconds: 每块音频的目标时长（秒）
+        checkpoint_dir: 检查点目录（默认在音频旁创建，成功后删除）
+    
+    Returns:
+        写入的字幕数量
+    """
+    from txt2srt_longaudio import iter_transcribe_long_audio
+    
+    if engine in ("forced", "draft"):
+        print(f"⚠️ 流式模式需要逐块识别音频，不支持 {engine} 引擎，改用 anchor")
+        engine = "anchor"
+    
+    with whisper_model_lease(model_name, use_gpu) as model:
+        print(f"正在处理音频文件: {audio_path}")
+        print("🎯 流式模式: 按块识别音频，对齐后立即写入字幕...")
+        
+        user_sentences = split_text_into_segments(text, max_chars=max_chars)
+        print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
+        
+        chunks = iter_transcribe_long_audio(
+            model,
+            audio_path,
+            dict(TRANSCRIBE_OPTIONS),
+            chunk_seconds=chunk_seconds,
+            checkpoint_dir=checkpoint_dir
+        )
+        aligned = iter_match_user_text_streaming(chunks, user_sentences, engine=engine)
+        aligned = iter_fix_overlapping_timestamps(aligned)
+        aligned = iter_optimize_subtitle_duration(aligned)
+        
+        count = generate_srt_streaming(aligned, output_path)
+    print(f"\n✅ 对齐完成！生成了 {count} 个字幕段落")
+    return count
+
+
+def banded_dtw(query: np.ndarray, reference: np.ndarray, band_radius: int = 100) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    带状（Sakoe-Chiba）DTW，局部距离为 0/1（字符相同为0，否则为1）
+
+    递推方式与 dtw-python 的默认设置（symmetric2 步进模式）相同：
+    g[i,j] = min(g[i-1,j-1] + 2d, g[i,j-1] + d, g[i-1,j] + d)
+
+    优化点：
+    1. 只计算引导线附近宽度约 2*band_radius+1 的带状区域，内存 O(n·band) 而非 O(n·m)
+    2. 带状区域沿锚点链（两边都只出现一次的 n-gram，见 find_anchor_runs）走，锚点之间的空隙整块计算，
+       用户文稿整段缺失、识别结果多出一段时，最优路径偏离对角线很远也仍在带内
+    3. 每一行使用 NumPy 向量化计算（行内的横向依赖转化为前缀最小值扫描）
+    4. 使用整数代价，只保存 int8 的回溯方向
+
+    最优性检查：带状结果的代价 C 是最优代价的上界。再用只保留累计代价 <= C 的格子的全矩阵递推
+    （_cost_outside_band）确认没有任何代价 <= C 的路径经过带外格子，否则加宽带宽重新计算。
+    通过检查时所有最优路径都在带内，返回的路径与完整矩阵 DTW（dtw-python）完全相同。
+
+    Args:
+        query: 用户文本的码点数组（长度n）
+        reference: 识别文本的码点数组（长度m）
+        band_radius: 初始带宽半径（字符数）
+
+    Returns:
+        (index1, index2, normalized_distance)，含义与 dtw-python 的同名属性相同
+    """
+    n = len(query)
+    m = len(reference)
+    if n == 0 or m == 0:
+        raise ValueError("DTW输入序列不能为空")
+
+    lower, upper = _band_guides(query, reference)
+    radius = max(int(band_radius), 1)
+
+    while True:
+        index1, index2, distance = _banded_dtw_pass(query, reference, lower, upper, radius)
+
+        # 带宽已覆盖整行 → 就是全矩阵DTW
+        if radius >= m:
+            break
+        lows, highs = _band_limits(lower, upper, radius, m)
+        outside = _cost_outside_band(query, reference, lows, highs, distance)
+        if outside is None:
+            break
+
+        radius *= 2
+        print(f"   带外存在代价不高于 {distance} 的DTW路径（{outside}），带宽加宽到 ±{radius} 字符后重新计算...")
+
+    return index1, index2, distance / (n + m)
+
+
+def _band_limits(lower: np.ndarray, upper: np.ndarray, radius: int, m: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每一行带状区域的列范围 [lows[i], highs[i]]：[lower[i] - radius, max(upper[i], lower[i+1]) + radius]
+
+    引导线在一行内跳过多列（识别结果多出一段）时相邻两行的窗口仍然相接。
+    """
+    next_lower = np.append(lower[1:], m - 1)
+    lows = np.clip(lower - radius, 0, m - 1)
+    highs = np.clip(np.maximum(upper, next_lower) + radius, 0, m - 1)
+    lows[0] = 0
+    highs[-1] = m - 1
+    return lows, highs
+
+
+def _cost_outside_band(query: np.ndarray, reference: np.ndarray, lows: np.ndarray, highs: np.ndarray, bound: int) -> Optional[int]:
+    """
+    经过至少一个带外格子的路径中最小的代价；该代价大于 bound 时返回 None
+
+    bound 取带状结果的代价时，返回 None 说明所有最优路径都在带内，
+    带内回溯与全矩阵回溯选出的路径完全相同。
+
+    同时递推两个量：g 为全矩阵DTW的累计代价，g_out 为经过带外格子的路径的累计代价
+    （带外格子处 g_out = g）。代价非负、沿路径只增不减，累计代价已超过 bound 的格子不用再算，
+    所以每一行只计算最优路径附近很窄的一段，只保存一行代价。
+    """
+    n = len(query)
+    m = len(reference)
+    inf = np.int32(2 ** 30)
+
+    # 上一行中 g <= bound 的列区间 [prev_lo, prev_lo + len(prev_g))
+    prev_g = prev_out = None
+    prev_lo = 0
+    for i in range(n):
+        lo = prev_lo
+        hi = 0 if prev_g is None else min(m - 1, prev_lo + len(prev_g))
+        chunk = 256
+        while True:
+            local = (reference[lo:hi + 1] != query[i]).astype(np.int32)
+            cum = np.cumsum(local, dtype=np.int32)
+            outside = np.arange(lo, hi + 1)
+            outside = (outside < lows[i]) | (outside > highs[i])
+            if prev_g is None:
+                cand = np.full(hi - lo + 1, inf, dtype=np.int32)
+                cand[0] = local[0]
+                cand_out = np.full(hi - lo + 1, inf, dtype=np.int32)
+            else:
+                ext = np.full(hi - lo + 2, inf, dtype=np.int32)
+                ext[1:len(prev_g) + 1] = prev_g
+                cand = np.minimum(ext[:-1] + 2 * local, ext[1:] + local)
+                ext[1:len(prev_g) + 1] = prev_out
+                cand_out = np.minimum(ext[:-1] + 2 * local, ext[1:] + local)
+            # 横向依赖用前缀最小值扫描（同 _banded_dtw_pass）
+            g = cum + np.minimum.accumulate(cand - cum)
+            g_out = cum + np.minimum.accumulate(np.where(outside, g, cand_out) - cum)
+            # 区间右侧的格子只能从本行左边横向到达：累计代价还没超过 bound 时向右加宽后重算
+            if g[-1] > bound or hi == m - 1:
+                break
+            hi = min(m - 1, hi + chunk)
+            chunk *= 2
+
+        alive = np.flatnonzero(g <= bound)
+        if len(alive) == 0:
+            return None
+        first, last = int(alive[0]), int(alive[-1])
+        prev_g = g[first:last + 1]
+        prev_out = g_out[first:last + 1]
+        prev_lo = lo + first
+
+    if prev_lo + len(prev_g) - 1 < m - 1 or prev_out[-1] > bound:
+        return None
+    return int(prev_out[-1])
+
+
+# 锚点之间的空隙不超过这么多个格子时，整块矩形都放进带状区域
+BAND_GAP_CELLS = 1_000_000
+
+
+def _band_guides(query: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    带状区域每一行的引导范围 (lower, upper)，带宽在此基础上向两侧扩展
+
+    - 锚点区间（两边都只出现一次的 n-gram，见 find_anchor_runs）：沿对角线，lower == upper
+    - 锚点之间的空隙：整块矩形 [前一个锚点的列, 后一个锚点的列]，
+      空隙太大（超过 BAND_GAP_CELLS 个格子）时退化为两锚点之间的连线
+    - 没有锚点时整个矩阵就是一个空隙
+    """
+    n = len(query)
+    m = len(reference)
+    points_u = [0]
+    points_r = [0]
+    is_run = []
+    for u, r, length in find_anchor_runs(query, reference):
+        end_u, end_r = u + length - 1, r + length - 1
+        if u <= points_u[-1] or r <= points_r[-1] or end_u >= n - 1 or end_r >= m - 1:
+            continue
+        points_u += [u, end_u]
+        points_r += [r, end_r]
+        is_run += [False, True]
+    points_u.append(n - 1)
+    points_r.append(m - 1)
+    is_run.append(False)
+
+    points_u = np.array(points_u, dtype=np.int64)
+    points_r = np.array(points_r, dtype=np.int64)
+    rows = np.arange(n)
+    segment = np.clip(np.searchsorted(points_u, rows, side="right") - 1, 0, len(is_run) - 1)
+    start_u, start_r = points_u[segment], points_r[segment]
+    end_u, end_r = points_u[segment + 1], points_r[segment + 1]
+
+    # 分段线性插值（锚点区间内就是对角线）
+    span = np.maximum(end_u - start_u, 1)
+    line = start_r + np.rint((rows - start_u) * (end_r - start_r) / span).astype(np.int64)
+
+    gap_cells = (end_u - start_u + 1) * (end_r - start_r + 1)
+    whole = ~np.array(is_run)[segment] & (gap_cells <= BAND_GAP_CELLS)
+    lower = np.where(whole, start_r, line)
+    upper = np.where(whole, end_r, line)
+    return lower, upper
+
+
+def _banded_dtw_pass(query: np.ndarray, reference: np.ndarray, lower: np.ndarray, upper: np.ndarray, radius: int):
+    """
+    在固定带宽下执行一次带状DTW（带状区域见 _band_limits），返回 (index1, index2, 累计距离)
+    """
+    n = len(query)
+    m = len(reference)
+    inf = np.int32(2 ** 30)
+
+    lows, highs = _band_limits(lower, upper, radius, m)
+
+    # 回溯方向按行拼接存放：1=对角 (i-1,j-1)，2=横向 (i,j-1)，3=纵向 (i-1,j)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(highs - lows + 1, out=offsets[1:])
+    directions = np.zeros(int(offsets[-1]), dtype=np.int8)
+
+    prev_row = None
+    prev_lo = prev_hi = 0
+    for i in range(n):
+        lo = int(lows[i])
+        hi = int(highs[i])
+        local = (reference[lo:hi + 1] != query[i]).astype(np.int32)
+
+        # ext 覆盖绝对列号 lo-1 .. hi 的上一行代价
+        ext = np.full(hi - lo + 2, inf, dtype=np.int32)
+        if prev_row is not None:
+            a = max(prev_lo, lo - 1)
+            b = min(prev_hi, hi)
+            if a <= b:
+                ext[a - lo + 1:b - lo + 2] = prev_row[a - prev_lo:b - prev_lo + 1]
+        diag = ext[:-1] + 2 * local
+        up = ext[1:] + local
+
+        cand = np.minimum(diag, up)
+        if i == 0:
+            cand[0] = local[0]
+
+        # 横向依赖 g[j] = min(cand[j], g[j-1] + d[j]) 等价于前缀最小值扫描
+        cum = np.cumsum(local, dtype=np.int32)
+        row = cum + np.minimum.accumulate(cand - cum)
+
+        left = np.full(row.shape, inf, dtype=np.int32)
+        left[1:] = row[:-1] + local[1:]
+
+        # 平局时的优先级与 dtw-python 相同：对角 > 横向 > 纵向
+        row_dir = np.where(diag == row, 1, np.where(left == row, 2, 3)).astype(np.int8)
+        if i == 0:
+            row_dir[0] = 0
+        directions[offsets[i]:offsets[i + 1]] = row_dir
+
+        prev_row = row
+        prev_lo, prev_hi = lo, hi
+
+    distance = int(prev_row[-1])
+
+    # 回溯最优路径
+    path_i = []
+    path_j = []
+    i, j = n - 1, m - 1
+    while True:
+        path_i.append(i)
+        path_j.append(j)
+        if i == 0 and j == 0:
+            break
+        step = directions[offsets[i] + j - lows[i]]
+        if step == 1:
+            i -= 1
+            j -= 1
+        elif step == 2:
+            j -= 1
+        else:
+            i -= 1
+
+    path_i.reverse()
+    path_j.reverse()
+    return np.array(path_i), np.array(path_j), distance
+
+
+def find_anchor_runs(query: np.ndarray, reference: np.ndarray, ngram: int = 6) -> List[Tuple[int, int, int]]:
+    """
+    查找锚点：在两段文本中都只出现一次的字符n-gram
+
+    步骤：
+    1. 用滚动哈希向量化地计算所有n-gram，筛选出两边都唯一的n-gram
+    2. 用最长递增子序列（LIS）挑出一条单调的锚点链，剔除交叉的错误锚点
+    3. 把相邻/重叠的锚点合并成连续的精确匹配区间
+
+    Args:
+        query: 用户文本的码点数组
+        reference: 识别文本的码点数组
+        ngram: n-gram长度（中文建议4-8）
+
+    Returns:
+        精确匹配区间列表 [(用户起点, 识别起点, 长度), ...]，两个起点都严格递增
+    """
+    n = len(query)
+    m = len(reference)
+    if n < ngram or m < ngram:
+        return []
+
+    def unique_ngrams(codes):
+        # 多项式滚动哈希（uint64 自然溢出）
+        count = len(codes) - ngram + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for t in range(ngram):
+            hashes = hashes * np.uint64(1000003) + codes[t:t + count].astype(np.uint64)
+        values, first_pos, counts = np.unique(hashes, return_index=True, return_counts=True)
+        once = counts == 1
+        return values[once], first_pos[once]
+
+    with np.errstate(over='ignore'):
+        query_hashes, query_pos = unique_ngrams(query)
+        reference_hashes, reference_pos = unique_ngrams(reference)
+
+    _, qi, ri = np.intersect1d(query_hashes, reference_hashes, assume_unique=True, return_indices=True)
+    candidates = sorted(zip(query_pos[qi].tolist(), reference_pos[ri].tolist()))
+
+    # 最长递增子序列（按用户位置排序后，要求识别位置也递增）
+    tail_values = []
+    tail_indices = []
+    predecessors = [-1] * len(candidates)
+    for idx, (u, r) in enumerate(candidates):
+        k = bisect.bisect_left(tail_values, r)
+        if k > 0:
+            predecessors[idx] = tail_indices[k - 1]
+        if k == len(tail_values):
+            tail_values.append(r)
+            tail_indices.append(idx)
+        else:
+            tail_values[k] = r
+            tail_indices[k] = idx
+
+    chain = []
+    idx = tail_indices[-1] if tail_indices else -1
+    while idx >= 0:
+        chain.append(candidates[idx])
+        idx = predecessors[idx]
+    chain.reverse()
+
+    # 合并为互不交叉的精确匹配区间
+    runs = []
+    last_u = last_r = -1
+    for u, r in chain:
+        # 哈希碰撞校验
+        if not np.array_equal(query[u:u + ngram], reference[r:r + ngram]):
+            continue
+        skip = max(0, last_u - u + 1, last_r - r + 1)
+        if skip >= ngram:
+            continue
+        u += skip
+        r += skip
+        length = ngram - skip
+        if runs and u == last_u + 1 and r == last_r + 1:
+            start_u, start_r, run_length = runs[-1]
+            runs[-1] = (start_u, start_r, run_length + length)
+        else:
+            runs.append((u, r, length))
+        last_u = u + length - 1
+        last_r = r + length - 1
+
+    return runs
+
+
+def _align_gap(args):
+    """
+    对齐两个锚点之间的空隙（独立任务，可并行）
+    """
+    query, reference, query_offset, reference_offset = args
+    index1, index2, normalized_distance = banded_dtw(query, reference)
+    distance = normalized_distance * (len(query) + len(reference))
+    if query_offset > 0 or reference_offset > 0:
+        # 从前一个锚点斜着走进空隙的第一格，这一步的代价是 2d（空隙内的DTW只算了一次）
+        distance += float(query[0] != reference[0])
+    return index1 + query_offset, index2 + reference_offset, distance
+
+
+def anchored_alignment(query: np.ndarray, reference: np.ndarray, ngram: int = 6, workers: int = 1) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    """
+    基于锚点的分治对齐：锚点区间直接一一对应，只在锚点之间的小空隙里运行DTW
+
+    各空隙之间互不依赖，workers > 1 时使用多进程并行处理。
+
+    Args:
+        query: 用户文本的码点数组
+        reference: 识别文本的码点数组
+        ngram: 锚点n-gram长度
+        workers: 并行处理空隙的进程数
+
+    Returns:
+        (index1, index2, normalized_distance, anchor_coverage)
+        anchor_coverage 为用户文本中被锚点覆盖的字符比例 (0-1)
+    """
+    n = len(query)
+    m = len(reference)
+    runs = find_anchor_runs(query, reference, ngram=ngram)
+
+    # 锚点区间本身的路径 + 锚点之间的空隙任务
+    pieces = []
+    gaps = []
+    # 只有一侧有字符的空隙（用户文稿整段缺失 / 识别结果多出一段）：不进入路径，
+    # 但每个字符都至少要付出一个错配的代价，计入距离（否则匹配率会虚高）
+    one_sided = 0
+    prev_u = prev_r = 0
+    for u, r, length in runs + [(n, m, 0)]:
+        if u > prev_u and r > prev_r:
+            gaps.append((len(pieces), (query[prev_u:u], reference[prev_r:r], prev_u, prev_r)))
+            pieces.append(None)
+        else:
+            one_sided += (u - prev_u) + (r - prev_r)
+        if length > 0:
+            pieces.append((np.arange(u, u + length), np.arange(r, r + length)))
+        prev_u = u + length
+        prev_r = r + length
+
+    anchored_chars = sum(length for _, _, length in runs)
+    gap_chars = sum(len(task[0]) for _, task in gaps)
+    print(f"   找到 {len(runs)} 个锚点区间，覆盖 {anchored_chars}/{n} 个用户字符，剩余 {len(gaps)} 个空隙（共 {gap_chars} 字符）")
+
+    tasks = [task for _, task in gaps]
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_align_gap, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        results = [_align_gap(task) for task in tasks]
+
+    distance = float(one_sided)
+    for (piece_idx, _), (index1, index2, gap_distance) in zip(gaps, results):
+        pieces[piece_idx] = (index1, index2)
+        distance += gap_distance
+
+    pieces = [piece for piece in pieces if piece is not None]
+    if not pieces:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), 1.0, 0.0
+
+    index1 = np.concatenate([piece[0] for piece in pieces])
+    index2 = np.concatenate([piece[1] for piece in pieces])
+    return index1, index2, distance / (n + m), anchored_chars / n
+
+
+def sparse_lcs_alignment(query: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Hunt-Szymanski 最长公共子序列（LCS）对齐，只访问字符相同的位置对
+
+    中文字符集很大，0/1距离矩阵几乎全是1，相同字符的位置对 r 远小于 n·m。
+    利用识别文本的"字符 → 位置列表"索引，复杂度约为 O((r + n) log n)。
+    （英文等小字母表文本 r 会很大，此时建议使用 banded 或 anchor 引擎）
+
+    Args:
+        query: 用户文本的码点数组
+        reference: 识别文本的码点数组
+
+    Returns:
+        (index1, index2, normalized_distance)
+        index1/index2 为LCS中匹配上的字符对（两者都严格递增），
+        normalized_distance = (n + m - 2·LCS) / (n + m)
+    """
+    n = len(query)
+    m = len(reference)
+
+    # 识别文本的字符位置索引（倒序，保证同一行内不会重复使用更小的阈值）
+    positions = {}
+    for j, code in enumerate(reference.tolist()):
+        positions.setdefault(code, []).append(j)
+    for code in positions:
+        positions[code].reverse()
+
+    # thresholds[k] = 长度为 k+1 的公共子序列在识别文本中的最小结束位置
+    thresholds = []
+    links = []
+    for i, code in enumerate(query.tolist()):
+        for j in positions.get(code, ()):
+            k = bisect.bisect_left(thresholds, j)
+            if k == len(thresholds):
+                thresholds.append(j)
+                links.append((i, j, links[k - 1] if k > 0 else None))
+            elif j < thresholds[k]:
+                thresholds[k] = j
+                links[k] = (i, j, links[k - 1] if k > 0 else None)
+
+    # 回溯匹配对
+    index1 = []
+    index2 = []
+    node = links[-1] if links else None
+    while node is not None:
+        index1.append(node[0])
+        index2.append(node[1])
+        node = node[2]
+    index1.reverse()
+    index2.reverse()
+
+    lcs_length = len(index1)
+    normalized_distance = (n + m - 2 * lcs_length) / (n + m)
+    return np.array(index1, dtype=np.int64), np.array(index2, dtype=np.int64), normalized_distance
+
+
+def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentences: List[str], engine: str = "banded",
+                                  report: AlignmentReport = None, workers: int = 1, start_time: float = 0.0) -> CueList:
     """
     使用DTW算法匹配用户句子和识别句子，用用户文本替换识别文本但保留时间戳
     
@@ -294,6 +1069,14 @@ def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentence
     Args:
         recognized_segments: Whisper识别的句子列表（含准确时间戳）
         user_sentences: 用户提供的正确句子列表
+        engine: 字符匹配引擎
+            - "banded": 带状向量化DTW（默认，内存 O(n·band)）
+            - "full": 完整距离矩阵 + dtw-python（内存 O(n·m)，仅适合短文本）
+            - "anchor": 锚点分治对齐，只在锚点间的空隙运行DTW（适合长音频）
+            - "lcs": 稀疏LCS对齐，只访问字符相同的位置对（适合中文等大字符集）
+        report: 分阶段指标（可选，记录字符数和匹配率）
+        workers: anchor 引擎并行处理锚点空隙的进程数
+        start_time: 开头未匹配的字符最早可以放到的时间（流式对齐时为当前窗口的开始，默认 0 秒）
     
     Returns:
         对齐后的句子列表（用户文本 + Whisper时间戳）
@@ -302,100 +1085,237 @@ def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentence
         print("⚠️ 文本为空，无法对齐")
         return []
     
-    # 移除标点符号的辅助函数
-    def remove_punctuation(text):
-        return ''.join([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
-    
-    # 提取识别文本的字符序列（去除标点）
-    recognized_text = ''.join([seg["text"] for seg in recognized_segments])
-    recognized_chars = list(remove_punctuation(recognized_text))
+    # 识别文本的字符时间轴（去除标点）
+    timeline = CharTimeline.from_segments(recognized_segments)
     
     # 提取用户文本的字符序列（去除标点）
     user_text = ''.join(user_sentences)
-    user_chars = list(remove_punctuation(user_text))
+    user_chars = remove_punctuation(user_text)
     
-    print(f"   识别文本: {len(recognized_chars)} 个字符")
+    print(f"   识别文本: {len(timeline)} 个字符")
     print(f"   用户文本: {len(user_chars)} 个字符")
     
-    # 构建DTW距离矩阵
     n_user = len(user_chars)
-    n_recognized = len(recognized_chars)
+    n_recognized = len(timeline)
+    _record_char_counts(report, user_sentences, n_user, n_recognized)
+
+    if n_user == 0 or n_recognized == 0:
+        print("⚠️ 去除标点后文本为空，无法对齐")
+        return []
+
+    user_codes = text_to_codes(user_chars)
+
+    index1, index2, normalized_distance = _run_char_alignment(user_codes, timeline.codes, engine, workers)
+
+    match_rate = (1 - normalized_distance) * 100
+    print(f"   ✅ DTW匹配成功，相似度: {match_rate:.1f}%")
+    if report is not None:
+        report.match_rate = 1 - normalized_distance
     
-    distance_matrix = np.zeros((n_user, n_recognized))
-    for i in range(n_user):
-        for j in range(n_recognized):
-            distance_matrix[i, j] = 0 if user_chars[i] == recognized_chars[j] else 1
+    # 为每个用户字符找到对应的识别字符，再换算成时间戳（未匹配的字符线性插值）
+    user_to_recognized = _user_to_recognized_index(index1, index2, n_user)
+    user_char_times = timeline.times_for(user_to_recognized, recognized_segments[-1]["end"], start_time)
     
-    # 运行DTW算法
-    print("   运行DTW算法进行字符级匹配...")
-    alignment = dtw(distance_matrix)
+    return _assign_sentence_times(user_sentences, user_char_times)
+
+
+def match_user_text_incremental(recognized_segments: List[Dict], user_sentences: List[str], previous: Dict = None,
+                                engine: str = "banded", margin: int = 20, report: AlignmentReport = None,
+                                workers: int = 1) -> Tuple[CueList, Dict]:
+    """
+    增量匹配：文稿只改了少量段落时，只重新对齐改动的部分
     
-    # 获取对齐路径
-    path = list(zip(alignment.index1, alignment.index2))
+    策略：
+    1. previous 中保存上次的用户字符序列和 用户字符 → 识别字符 的映射
+    2. 比较新旧用户文本，找出改动的区间（两侧各扩展 margin 个字符）
+    3. 改动区间两侧未改动字符的映射确定了对应的识别字符范围，只在这个范围内重新对齐
+    4. 其余字符直接复用上次的映射
     
-    match_rate = (1 - alignment.normalizedDistance) * 100
-    print(f"   ✅ DTW匹配成功，相似度: {match_rate:.1f}%")
+    识别结果变化（换了音频/模型）或没有上次的状态时，退化为完整对齐。
     
-    # 为每个识别字符建立索引（字符 → 所属的segment和segment内的位置）
-    recognized_char_to_segment = []
-    for seg_idx, segment in enumerate(recognized_segments):
-        seg_text = remove_punctuation(segment["text"])
-        for char_idx, char in enumerate(seg_text):
-            recognized_char_to_segment.append({
-                "seg_idx": seg_idx,
-                "char_idx": char_idx,
-                "total_chars": len(seg_text),
-                "segment": segment
-            })
+    Args:
+        recognized_segments: Whisper识别的句子列表（含准确时间戳）
+        user_sentences: 修改后的用户句子列表
+        previous: 上次调用返回的状态（None 表示首次对齐）
+        engine: 字符匹配引擎，见 match_user_text_to_timestamps
+        margin: 改动区间两侧额外重新对齐的字符数
+        report: 分阶段指标（可选，记录字符数；完整对齐时记录匹配率）
+        workers: anchor 引擎并行处理锚点空隙的进程数
     
-    # 为每个用户字符找到对应的识别segment
-    user_char_to_segment = [None] * n_user
-    for user_idx, rec_idx in path:
-        if rec_idx < len(recognized_char_to_segment):
-            user_char_to_segment[user_idx] = recognized_char_to_segment[rec_idx]
-    
-    # 建立更精细的映射：为每个用户字符找到对应的时间戳
-    user_char_times = []
-    for i in range(n_user):
-        if user_char_to_segment[i] is not None:
-            seg_info = user_char_to_segment[i]
-            segment = seg_info["segment"]
-            
-            # 在segment内部进行时间插值
-            segment_duration = segment["end"] - segment["start"]
-            total_chars = seg_info["total_chars"]
-            
-            if total_chars > 0:
-                char_time = segment["start"] + (seg_info["char_idx"] / total_chars) * segment_duration
+    Returns:
+        (对齐后的句子列表, 供下次调用使用的状态)
+    """
+    timeline = CharTimeline.from_segments(recognized_segments)
+    user_chars = remove_punctuation(''.join(user_sentences))
+    recognized_key = _recognized_signature(recognized_segments)
+    
+    if len(timeline) == 0 or not user_chars:
+        return match_user_text_to_timestamps(recognized_segments, user_sentences, engine=engine, report=report,
+                                             workers=workers), None
+    _record_char_counts(report, user_sentences, len(user_chars), len(timeline))
+    
+    recognized_codes = timeline.codes
+    user_codes = text_to_codes(user_chars)
+    
+    if previous is None or previous.get("recognized") != recognized_key:
+        # 首次对齐（或识别结果已变化）：完整对齐
+        index1, index2, normalized_distance = _run_char_alignment(user_codes, recognized_codes, engine, workers)
+        print(f"   ✅ 完整对齐，相似度: {(1 - normalized_distance) * 100:.1f}%")
+        if report is not None:
+            report.match_rate = 1 - normalized_distance
+        user_to_recognized = _user_to_recognized_index(index1, index2, len(user_chars))
+    else:
+        old_chars = previous["user_chars"]
+        old_mapping = np.asarray(previous["user_to_recognized"], dtype=np.int64)
+        
+        # 改动区间（旧文本下标, 新文本下标），扩展 margin 后合并相邻区间
+        spans = []
+        for i1, i2, j1, j2 in _diff_char_spans(text_to_codes(old_chars), user_codes):
+            lo = min(margin, i1, j1)
+            hi = min(margin, len(old_chars) - i2, len(user_chars) - j2)
+            span = [i1 - lo, i2 + hi, j1 - lo, j2 + hi]
+            if spans and span[0] <= spans[-1][1]:
+                spans[-1][1], spans[-1][3] = span[1], span[3]
             else:
-                char_time = segment["start"]
-            
-            user_char_times.append(char_time)
-        else:
-            # 没有匹配到，稍后插值
-            user_char_times.append(None)
-    
-    # 对未匹配的字符进行线性插值
-    for i in range(n_user):
-        if user_char_times[i] is None:
-            # 向前找最近的有效时间
-            prev_time = 0.0
-            for j in range(i - 1, -1, -1):
-                if user_char_times[j] is not None:
-                    prev_time = user_char_times[j]
-                    break
-            
-            # 向后找最近的有效时间
-            next_time = recognized_segments[-1]["end"] if recognized_segments else 0.0
-            for j in range(i + 1, n_user):
-                if user_char_times[j] is not None:
-                    next_time = user_char_times[j]
-                    break
-            
-            user_char_times[i] = (prev_time + next_time) / 2
+                spans.append(span)
+        
+        pieces = []
+        old_pos = 0
+        changed = 0
+        for i1, i2, j1, j2 in spans:
+            pieces.append(old_mapping[old_pos:i1])
+            # 改动区间两侧最近的已匹配字符，确定识别文本中需要重新对齐的范围
+            left = old_mapping[:i1][old_mapping[:i1] >= 0]
+            right = old_mapping[i2:][old_mapping[i2:] >= 0]
+            rec_lo = int(left[-1]) if len(left) else 0
+            rec_hi = int(right[0]) if len(right) else len(timeline) - 1
+            rec_hi = max(rec_hi, rec_lo)
+            if j2 > j1:
+                index1, index2, _ = _run_char_alignment(user_codes[j1:j2], recognized_codes[rec_lo:rec_hi + 1], engine, workers)
+                local = _user_to_recognized_index(index1, index2, j2 - j1)
+                pieces.append(np.where(local >= 0, local + rec_lo, -1))
+            old_pos = i2
+            changed += j2 - j1
+        pieces.append(old_mapping[old_pos:])
+        user_to_recognized = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int64)
+        print(f"   ⚡ 增量对齐: {len(spans)} 处改动，重新对齐 {changed}/{len(user_chars)} 个字符")
+    
+    user_char_times = timeline.times_for(user_to_recognized, recognized_segments[-1]["end"])
+    state = {
+        "recognized": recognized_key,
+        "user_chars": user_chars,
+        "user_to_recognized": user_to_recognized.tolist(),
+    }
+    return _assign_sentence_times(user_sentences, user_char_times), state
+
+
+def _record_char_counts(report: AlignmentReport, user_sentences: List[str], n_user: int, n_recognized: int):
+    if report is not None:
+        report.user_sentences = len(user_sentences)
+        report.user_chars = n_user
+        report.recognized_chars = n_recognized
+
+
+def _diff_char_spans(old_codes: np.ndarray, new_codes: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    找出新旧文本之间的改动区间 [(旧起点, 旧终点, 新起点, 新终点), ...]
+    
+    用锚点（两边都唯一的n-gram）把两段文本切成若干对应的空隙，
+    每个空隙再去掉相同的前缀/后缀，剩下的就是改动区间。
+    """
+    def common_prefix(a, b):
+        length = min(len(a), len(b))
+        differ = np.flatnonzero(a[:length] != b[:length])
+        return int(differ[0]) if len(differ) else length
+    
+    # 相同的前缀/后缀直接跳过，锚点只在中间部分查找（只改一段时中间部分很短）
+    head = common_prefix(old_codes, new_codes)
+    tail = common_prefix(old_codes[head:][::-1], new_codes[head:][::-1])
+    old_end, new_end = len(old_codes) - tail, len(new_codes) - tail
+    runs = [(head + a, head + b, length) for a, b, length in find_anchor_runs(old_codes[head:old_end], new_codes[head:new_end], ngram=8)]
+    runs.append((old_end, new_end, 0))
+    
+    spans = []
+    old_pos = new_pos = head
+    for old_start, new_start, length in runs:
+        # 不同对角线上的锚点区间可能在一侧重叠，截掉重叠部分
+        overlap = max(old_pos - old_start, new_pos - new_start, 0)
+        old_start, new_start, length = old_start + overlap, new_start + overlap, length - overlap
+        if length < 0:
+            continue
+        
+        old_gap = old_codes[old_pos:old_start]
+        new_gap = new_codes[new_pos:new_start]
+        head = common_prefix(old_gap, new_gap)
+        tail = common_prefix(old_gap[head:][::-1], new_gap[head:][::-1])
+        if len(old_gap) - head - tail > 0 or len(new_gap) - head - tail > 0:
+            spans.append((old_pos + head, old_start - tail, new_pos + head, new_start - tail))
+        old_pos, new_pos = old_start + length, new_start + length
+    return spans
+
+
+def _recognized_signature(recognized_segments: List[Dict]) -> str:
+    """
+    识别结果的指纹（判断增量对齐的上次状态是否仍然有效）
+    """
+    digest = hashlib.sha1()
+    for segment in recognized_segments:
+        digest.update(f"{segment['start']:.3f}|{segment['end']:.3f}|{segment['text']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _run_char_alignment(user_codes: np.ndarray, recognized_codes: np.ndarray, engine: str = "banded",
+                        workers: int = 1) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    用指定引擎对齐两个字符码点序列，返回 (index1, index2, normalized_distance)
+
+    workers 只对 anchor 引擎有效：并行处理锚点之间空隙的进程数
+    """
+    if engine == "banded":
+        print("   运行带状DTW算法进行字符级匹配...")
+        index1, index2, normalized_distance = banded_dtw(user_codes, recognized_codes)
+    elif engine == "full":
+        # dtw-python 会连带导入 scipy，只在使用该引擎时导入
+        from dtw import dtw
+        # 构建完整的DTW距离矩阵
+        distance_matrix = (user_codes[:, None] != recognized_codes[None, :]).astype(np.float64)
+        print("   运行DTW算法进行字符级匹配...")
+        alignment = dtw(distance_matrix)
+        index1, index2, normalized_distance = alignment.index1, alignment.index2, alignment.normalizedDistance
+    elif engine == "anchor":
+        print("   查找锚点，只在锚点之间的空隙运行DTW...")
+        index1, index2, normalized_distance, coverage = anchored_alignment(user_codes, recognized_codes, workers=workers)
+        print(f"   锚点覆盖率: {coverage * 100:.1f}%")
+    elif engine == "lcs":
+        print("   运行稀疏LCS算法（Hunt-Szymanski）进行字符级匹配...")
+        index1, index2, normalized_distance = sparse_lcs_alignment(user_codes, recognized_codes)
+    else:
+        raise ValueError(f"未知的匹配引擎: {engine}")
+
+    return index1, index2, normalized_distance
+
+
+def _user_to_recognized_index(index1: np.ndarray, index2: np.ndarray, n_user: int) -> np.ndarray:
+    """
+    由对齐路径得到每个用户字符对应的识别字符下标（一对多时取路径上最后一个，未匹配为 -1）
+    """
+    index1 = np.asarray(index1, dtype=np.int64)
+    index2 = np.asarray(index2, dtype=np.int64)
+    user_to_recognized = np.full(n_user, -1, dtype=np.int64)
+    if len(index1) > 0:
+        last = np.append(index1[1:] != index1[:-1], True)
+        user_to_recognized[index1[last]] = index2[last]
+    return user_to_recognized
+
+
+def _assign_sentence_times(user_sentences: List[str], user_char_times: np.ndarray) -> CueList:
+    """
+    按句子的字符数依次切分用户字符时间轴，为每个句子分配开始/结束时间
+    """
+    n_user = len(user_char_times)
     
     # 现在为每个用户句子分配时间戳
-    aligned_segments = []
+    starts, ends, texts = [], [], []
     char_idx = 0
     
     for sentence in user_sentences:
@@ -407,13 +1327,11 @@ def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentence
         
         if len(sentence_chars) == 0:
             # 纯标点句子，使用估算时长
-            if aligned_segments:
-                last_end = aligned_segments[-1]["end"]
-                aligned_segments.append({
-                    "start": last_end,
-                    "end": last_end + 0.5,
-                    "text": sentence.strip()
-                })
+            if texts:
+                last_end = ends[-1]
+                starts.append(last_end)
+                ends.append(last_end + 0.5)
+                texts.append(sentence.strip())
             continue
         
         # 找到这个句子对应的字符范围
@@ -422,44 +1340,40 @@ def match_user_text_to_timestamps(recognized_segments: List[Dict], user_sentence
         
         if start_char_idx >= n_user:
             # 超出范围，使用估算
-            if aligned_segments:
-                last_end = aligned_segments[-1]["end"]
+            if texts:
+                last_end = ends[-1]
                 estimated_duration = len(sentence_chars) * 0.15
-                aligned_segments.append({
-                    "start": last_end,
-                    "end": last_end + estimated_duration,
-                    "text": sentence.strip()
-                })
-                print(f"   ⚠️ [{len(aligned_segments)}] 超出匹配范围，使用估算时长")
+                starts.append(last_end)
+                ends.append(last_end + estimated_duration)
+                texts.append(sentence.strip())
+                print(f"   ⚠️ [{len(texts)}] 超出匹配范围，使用估算时长")
             break
         
         # 使用字符时间戳
-        start_time = user_char_times[start_char_idx]
-        end_time = user_char_times[min(end_char_idx - 1, n_user - 1)]
+        start_time = float(user_char_times[start_char_idx])
+        end_time = float(user_char_times[min(end_char_idx - 1, n_user - 1)])
         
         # 确保时长合理（至少0.5秒）
         if end_time - start_time < 0.5:
             end_time = start_time + max(0.5, len(sentence_chars) * 0.15)
         
-        aligned_segments.append({
-            "start": start_time,
-            "end": end_time,
-            "text": sentence.strip()
-        })
+        starts.append(start_time)
+        ends.append(end_time)
+        texts.append(sentence.strip())
         
         # 调试信息（前5句和后5句）
-        if len(aligned_segments) <= 5 or len(user_sentences) - len(aligned_segments) < 5:
+        if len(texts) <= 5 or len(user_sentences) - len(texts) < 5:
             duration = end_time - start_time
-            print(f"   [{len(aligned_segments)}] {start_time:.1f}s-{end_time:.1f}s ({duration:.1f}s): {sentence[:20]}...")
+            print(f"   [{len(texts)}] {start_time:.1f}s-{end_time:.1f}s ({duration:.1f}s): {sentence[:20]}...")
         
         char_idx = end_char_idx
     
     # 检查是否所有句子都被处理了
-    if len(aligned_segments) < len(user_sentences):
-        missing = len(user_sentences) - len(aligned_segments)
+    if len(texts) < len(user_sentences):
+        missing = len(user_sentences) - len(texts)
         print(f"   ⚠️ 警告: {missing} 个句子未能匹配，将使用估算时长")
     
-    return aligned_segments
+    return CueList(np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64), texts)
 
 
 def calculate_similarity(text1: str, text2: str) -> float:
@@ -493,6 +1407,77 @@ def calculate_similarity(text1: str, text2: str) -> float:
     return similarity
 
 
+def _best_word_window(user_clean: str, clean_words: List[str], current_idx: int,
+                      min_window: int, max_window: int, start_offsets=range(-3, 4)) -> Tuple[float, Union[Tuple[int, int], None]]:
+    """
+    在候选窗口中找出与用户句子相似度（calculate_similarity）最高的词窗口
+    
+    相似度 = 用户句子中"在窗口里出现过"的字符数 / max(句子长度, 窗口长度)。
+    对每个起始位置，窗口从最小长度开始逐词加长，同时增量维护窗口内的字符计数：
+    加入一个词时只需检查这个词的字符，窗口长度由前缀和得到，
+    不再为每个窗口重新拼接文本、逐字符做 in 查找。
+    
+    结果与逐个窗口调用 calculate_similarity 完全一致：
+    相似度相同时优先窗口更短的，再优先起始位置更靠前的。
+    
+    Args:
+        user_clean: 去除标点的用户句子
+        clean_words: 每个识别词去除标点后的文本
+        current_idx: 当前词位置
+        min_window / max_window: 窗口大小范围（词数）
+        start_offsets: 起始位置相对 current_idx 的偏移
+    
+    Returns:
+        (最高相似度, (起始词下标, 结束词下标))，没有相似度大于0的窗口时返回 (0, None)
+    """
+    user_len = len(user_clean)
+    # 用户句子中每个字符出现的次数：窗口中第一次出现某字符时，匹配数增加该次数
+    user_counts = {}
+    for char in user_clean:
+        user_counts[char] = user_counts.get(char, 0) + 1
+    
+    total_words = len(clean_words)
+    best_score = 0
+    best_key = None
+    best_window = None
+    
+    for start_offset in start_offsets:
+        start_idx = current_idx + start_offset
+        if start_idx < 0:
+            continue
+        last_end = min(start_idx + max_window, total_words)
+        if start_idx + min_window > last_end:
+            continue
+        
+        window_counts = {}
+        matches = 0
+        window_len = 0
+        for end_idx in range(start_idx + 1, last_end + 1):
+            word = clean_words[end_idx - 1]
+            window_len += len(word)
+            for char in word:
+                weight = user_counts.get(char)
+                if weight is None:
+                    continue
+                seen = window_counts.get(char, 0)
+                if seen == 0:
+                    matches += weight
+                window_counts[char] = seen + 1
+            
+            window_size = end_idx - start_idx
+            if window_size < min_window or window_len == 0:
+                continue
+            
+            similarity = matches / max(user_len, window_len)
+            key = (window_size, start_offset)
+            if similarity > best_score or (similarity == best_score and best_key is not None and key < best_key):
+                best_score = similarity
+                best_key = key
+                best_window = (start_idx, end_idx)
+    
+    return best_score, best_window
+
+
 def align_user_text_with_timestamps(user_sentences: List[str], words_with_time: List[Dict]) -> List[Dict]:
     """
     将用户提供的文本与带时间戳的识别词对齐（基于滑动窗口匹配）
@@ -519,6 +1504,9 @@ def align_user_text_with_timestamps(user_sentences: List[str], words_with_time:
     print(f"   - 音频时长: {audio_duration:.1f} 秒")
     print(f"🔍 开始滑动窗口匹配...")
     
+    # 每个词只清洗一次（窗口滑动时直接复用）
+    clean_words = [remove_punctuation(word["word"]) for word in words_with_time]
+    
     # 当前在词列表中的起始位置
     current_word_idx = 0
     
@@ -537,39 +1525,19 @@ def align_user_text_with_timestamps(user_sentences: List[str], words_with_time:
         # 估算这个句子需要多少个词（中文平均一个词2-3个字）
         estimated_words = max(5, int(user_len / 2.5))
         
-        best_match_score = 0
         best_start_idx = current_word_idx
         best_end_idx = min(current_word_idx + estimated_words, total_words)
         
         # 滑动窗口查找最佳匹配
-        # 窗口大小范围：estimated_words的50% 到 200%
+        # 窗口大小范围：estimated_words的50% 到 200%，起始位置允许向前或向后微调3个词
         min_window = max(3, int(estimated_words * 0.5))
         max_window = min(int(estimated_words * 2), total_words - current_word_idx)
         
-        for window_size in range(min_window, max_window + 1):
-            # 尝试不同的起始位置（允许向前或向后微调）
-            for start_offset in range(-3, 4):
-                start_idx = current_word_idx + start_offset
-                end_idx = start_idx + window_size
-                
-                if start_idx < 0 or end_idx > total_words:
-                    continue
-                
-                # 提取这个窗口内的文本
-                window_text = ""
-                for i in range(start_idx, end_idx):
-                    word = words_with_time[i]["word"].strip()
-                    clean_word = ''.join([c for c in word if c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
-                    window_text += clean_word
-                
-                # 计算相似度
-                similarity = calculate_similarity(user_sentence, window_text)
-                
-                # 如果相似度更高，更新最佳匹配
-                if similarity > best_match_score:
-                    best_match_score = similarity
-                    best_start_idx = start_idx
-                    best_end_idx = end_idx
+        best_match_score, best_window = _best_word_window(
+            user_clean, clean_words, current_word_idx, min_window, max_window
+        )
+        if best_window is not None:
+            best_start_idx, best_end_idx = best_window
         
         # 使用最佳匹配的时间戳
         if best_start_idx < total_words and best_end_idx > best_start_idx:
@@ -617,30 +1585,63 @@ def align_text_by_segments(whisper_segments: List[Dict], user_sentences: List[st
     """
     当没有词级时间戳时，使用段落级对齐
     
+    把段落当作语音区间，句子按字符数比例分配到各段落上（段落之间的静音不分配文字）
+    
     Args:
-        whisper_segments: Whisper识别的段落
+        whisper_segments: Whisper识别的段落（或任何语音区间）
         user_sentences: 用户文本句子
     
     Returns:
         对齐后的段落列表
     """
-    aligned_segments = []
+    from txt2srt_vad import distribute_sentences
     
-    # 简单策略：平均分配时间
     if not whisper_segments:
-        return aligned_segments
+        return []
     
-    total_duration = whisper_segments[-1]["end"]
-    sentence_duration = total_duration / len(user_sentences)
+    regions = [(segment["start"], segment["end"]) for segment in whisper_segments if segment["end"] > segment["start"]]
+    return distribute_sentences(user_sentences, regions)
+
+
+def align_audio_text_draft(audio_path: str, text: str, max_chars: int = 30, report: AlignmentReport = None) -> List[Dict]:
+    """
+    草稿模式：不运行任何识别模型，只用语音活动检测分配字幕时间
     
-    for i, sentence in enumerate(user_sentences):
-        if sentence.strip():
-            aligned_segments.append({
-                "start": i * sentence_duration,
-                "end": (i + 1) * sentence_duration,
-                "text": sentence.strip()
-            })
+    句子按字符数比例铺到语音区间上，边界附近有停顿时对齐到停顿处。
+    时间精度远低于完整模式，但几秒钟就能出结果，适合粗剪预览。
     
+    Args:
+        audio_path: 音频文件路径
+        text: 用户提供的准确文本
+        max_chars: 每行最大字符数
+        report: 分阶段指标（可选，记录 split / vad / postprocess 阶段）
+    
+    Returns:
+        包含时间戳的文本段落列表
+    """
+    from txt2srt_vad import draft_align
+    
+    print(f"正在处理音频文件: {audio_path}")
+    print("🎯 草稿模式: 只检测语音区间，不加载识别模型...")
+    
+    with stage(report, "split"):
+        user_sentences = split_text_into_segments(text, max_chars=max_chars)
+    print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
+    if report is not None:
+        report.user_sentences = len(user_sentences)
+        report.user_chars = len(remove_punctuation(''.join(user_sentences)))
+    
+    with stage(report, "vad"):
+        aligned_segments = draft_align(audio_path, user_sentences)
+    
+    # 与完整模式相同的后处理
+    with stage(report, "postprocess"):
+        aligned_segments = fix_overlapping_timestamps(aligned_segments)
+        aligned_segments = optimize_subtitle_duration(aligned_segments)
+    
+    print(f"\n✅ 草稿完成！生成了 {len(aligned_segments)} 个字幕段落（时间为估算值）")
+    if report is not None:
+        report.finish(aligned_segments)
     return aligned_segments
 
 
@@ -648,29 +1649,158 @@ def generate_srt(segments: List[Dict], output_path: str):
     """
     生成SRT字幕文件
     
+    先写入同目录下的临时文件再改名，其他进程/用户不会读到写了一半的字幕
+    
     Args:
         segments: 包含时间戳的文本段落列表
         output_path: 输出SRT文件路径
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         for i, segment in enumerate(segments, 1):
-            # 写入序号
-            f.write(f"{i}\n")
-            # 写入时间戳
-            start_time = format_timestamp(segment["start"])
-            end_time = format_timestamp(segment["end"])
-            f.write(f"{start_time} --> {end_time}\n")
-            # 写入文本
-            f.write(f"{segment['text']}\n")
-            # 空行分隔
-            f.write("\n")
+            f.write(_format_srt_cue(i, segment))
+    os.replace(tmp_path, output_path)
+    
+    print(f"SRT字幕文件已生成: {output_path}")
+
+
+def generate_srt_streaming(segments: Iterable[Dict], output_path: str) -> int:
+    """
+    流式生成SRT字幕文件：每得到一个字幕就写入并刷新到磁盘
+    
+    长音频处理过程中即可用播放器预览已生成的部分；中途出错时已写入的字幕也会保留。
+    
+    Args:
+        segments: 包含时间戳的文本段落（可以是生成器）
+        output_path: 输出SRT文件路径
+    
+    Returns:
+        写入的字幕数量
+    """
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for count, segment in enumerate(segments, 1):
+            f.write(_format_srt_cue(count, segment))
+            f.flush()
     
     print(f"SRT字幕文件已生成: {output_path}")
+    return count
+
+
+def _format_srt_cue(index: int, segment: Dict) -> str:
+    """
+    格式化单个SRT字幕块（序号、时间戳、文本、空行）
+    """
+    start_time = format_timestamp(segment["start"])
+    end_time = format_timestamp(segment["end"])
+    return f"{index}\n{start_time} --> {end_time}\n{segment['text']}\n\n"
+
+
+def iter_match_user_text_streaming(recognized_chunks: Iterable[List[Dict]], user_sentences: List[str], engine: str = "anchor",
+                                   holdback_seconds: float = 30.0) -> Iterator[Dict]:
+    """
+    match_user_text_to_timestamps 的流式版本：每识别完一块音频就对齐并产出已确定的句子
+    
+    策略：
+    1. 累积尚未消费的识别段落，用大致等长的一段用户句子与之对齐
+    2. 距离识别前沿 holdback_seconds 以内的句子可能还会随下一块音频变化，暂不产出
+    3. 只有完全在已产出句子之前结束的识别段落才被丢弃（句子边界与识别段落不对齐，
+       跨越边界的段落里还有下一句的开头），内存占用与音频总时长无关
+    4. 窗口开头未匹配的字符不早于窗口的开始时间（上一句的结束），不会被插值到 0 秒附近
+    
+    Args:
+        recognized_chunks: 按时间顺序产出的识别段落列表（如 iter_transcribe_long_audio）
+        user_sentences: 用户提供的正确句子列表
+        engine: 字符匹配引擎，见 match_user_text_to_timestamps
+        holdback_seconds: 识别前沿之前暂缓产出的时长（秒）
+    
+    Yields:
+        对齐后的句子（按时间顺序）
+    """
+    def char_count(text):
+        return len([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
+    
+    # 窗口只包含有有效字符的句子：每个句子恰好对应一条对齐结果，按位置（而不是按文本）对应回句子
+    content = [i for i, sentence in enumerate(user_sentences) if remove_punctuation(sentence)]
+    
+    pending = []       # 尚未消费的识别段落
+    position = 0       # 下一个待产出的句子在 content 中的位置
+    last_end = 0.0
+    
+    def punctuation_after(k, cursor):
+        """content[k] 之后、下一个有效句子之前的纯标点句子（与整段对齐一样接在前一句后面，各 0.5 秒）"""
+        stop = content[k + 1] if k + 1 < len(content) else len(user_sentences)
+        for sentence in user_sentences[content[k] + 1:stop]:
+            if sentence.strip():
+                yield {"start": cursor, "end": cursor + 0.5, "text": sentence.strip()}
+                cursor += 0.5
+    
+    for chunk in recognized_chunks:
+        pending.extend(chunk)
+        if not pending or position >= len(content):
+            continue
+        
+        # 取与识别文本大致等长的一段用户句子（略多一些，容许识别漏字）
+        budget = int(sum(char_count(seg["text"]) for seg in pending) * 1.2) + 20
+        window_end = position
+        used = 0
+        while window_end < len(content) and used < budget:
+            used += char_count(user_sentences[content[window_end]])
+            window_end += 1
+        window = [user_sentences[i] for i in content[position:window_end]]
+        
+        aligned = match_user_text_to_timestamps(pending, window, engine=engine,
+                                                start_time=max(last_end, pending[0]["start"]))
+        frontier = pending[-1]["end"] - holdback_seconds
+        
+        # 第 k 条对齐结果对应窗口中的第 k 个句子，产出前沿之前的部分
+        for segment in aligned:
+            if segment["end"] > frontier:
+                break
+            last_end = segment["end"]
+            yield segment
+            yield from punctuation_after(position, last_end)
+            position += 1
+        
+        # 丢弃已经完全在已产出句子之前结束的识别段落
+        pending = [seg for seg in pending if seg["end"] > last_end]
+    
+    # 音频识别完毕：对齐剩余的全部句子
+    if position >= len(content):
+        return
+    remaining = user_sentences[content[position]:]
+    if pending:
+        yield from match_user_text_to_timestamps(pending, remaining, engine=engine,
+                                                 start_time=max(last_end, pending[0]["start"]))
+        return
+    
+    print(f"   ⚠️ {len(remaining)} 个句子没有剩余的识别文本，使用估算时长")
+    for sentence in remaining:
+        if not sentence.strip():
+            continue
+        duration = max(0.5, char_count(sentence) * 0.15)
+        yield {"start": last_end, "end": last_end + duration, "text": sentence.strip()}
+        last_end += duration
 
 
 def main():
+    # 批量模式: txt2srt.py batch <目录或清单> [...]
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from txt2srt_batch import batch_main
+        batch_main(sys.argv[2:])
+        return
+    
+    # 缓存管理: txt2srt.py cache list|prune|clear
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        from txt2srt_asrcache import cache_main
+        cache_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
-        description="音频-文本对齐工具，生成SRT字幕文件"
+        description="音频-文本对齐工具，生成SRT字幕文件",
+        epilog="批量处理: txt2srt.py batch <目录或清单.csv/.jsonl> [-h]\n"
+               "识别缓存: txt2srt.py cache {list,prune,clear} [-h]",
+        formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument(
         "audio",
@@ -696,8 +1826,77 @@ def main():
         help="语言代码 (zh: 中文, en: 英文, None: 自动检测)",
         default="zh"
     )
+    parser.add_argument(
+        "-e", "--engine",
+        help="字符匹配引擎 (banded: 带状DTW, full: 完整DTW, anchor: 锚点分治, lcs: 稀疏LCS, forced: 不识别，直接强制对齐用户文本, draft: 只检测语音区间的草稿模式)",
+        default="banded",
+        choices=["banded", "full", "anchor", "lcs", "forced", "draft"]
+    )
+    parser.add_argument(
+        "--anchor-workers",
+        help="anchor 引擎并行处理锚点空隙的进程数（默认: 1；流式模式按小窗口对齐，不使用）",
+        type=int,
+        default=1
+    )
+    parser.add_argument(
+        "--long-audio",
+        help="长音频模式：按静音分块识别（内存占用恒定，中断后可续跑）",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--chunk-seconds",
+        help="长音频/流式模式下每块的目标时长（秒，默认: 长音频 600，流式 60）",
+        type=float,
+        default=None
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        help="长音频/流式模式的检查点目录（指定后任务完成也会保留）",
+        default=None
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="不使用识别结果磁盘缓存（强制重新识别）",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--incremental",
+        help="增量对齐：保存对齐状态（<输出文件>.align.json），修改文稿后再次运行只重新对齐改动部分",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--stream",
+        help="流式模式：边识别边写入SRT（字幕逐条追加，可在处理过程中预览）",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--report",
+        help="完成后打印分阶段耗时/内存汇总表",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--report-json",
+        help="把分阶段指标写入 <输出文件>.report.json",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--profile",
+        help="性能剖析：cProfile 剖析整个任务（all）或单个阶段，并记录分句/匹配阶段的内存分配",
+        nargs="?",
+        const="all",
+        default=None,
+        choices=("all",) + STAGE_NAMES
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="剖析结果根目录（每个任务一个子目录，默认: 环境变量 TXT2SRT_PROFILE_DIR 或 ./profiles）",
+        default=None
+    )
     
     args = parser.parse_args()
+    if args.stream and args.profile not in (None, "all"):
+        # 流式模式逐块边识别边写字幕，没有分阶段指标，单阶段剖析和内存快照都不会触发
+        parser.error("--stream 模式只支持剖析整个任务（--profile 或 --profile all）")
     
     # 检查音频文件是否存在
     if not os.path.exists(args.audio):
@@ -720,25 +1919,66 @@ def main():
     else:
         output_path = args.output
     
+    profiler = None
+    if args.profile:
+        from txt2srt_profile import RunProfiler
+        profiler = RunProfiler.for_job(args.audio, cpu_stage=args.profile, root=args.profile_dir,
+                                       meta={"engine": args.engine, "model": args.model, "stream": args.stream})
+    
     # 执行对齐
     print("\n开始音频-文本对齐...")
-    segments = align_audio_text(args.audio, text_content, args.model)
-    
-    # 生成SRT文件
-    generate_srt(segments, output_path)
+    if args.stream:
+        with profiler or contextlib.nullcontext():
+            count = align_audio_text_streaming(
+                args.audio,
+                text_content,
+                output_path,
+                args.model,
+                engine=args.engine,
+                chunk_seconds=args.chunk_seconds or 60.0,
+                checkpoint_dir=args.checkpoint_dir
+            )
+        print(f"\n✅ 完成！共生成 {count} 个字幕段落")
+        if profiler is not None:
+            print(f"🔬 剖析结果已保存: {profiler.job_dir}")
+        return
+    
+    report = None
+    if args.report or args.report_json or profiler is not None:
+        report = AlignmentReport(args.audio, engine=args.engine, model=args.model, profiler=profiler)
+    with profiler or contextlib.nullcontext():
+        segments = align_audio_text(
+            args.audio,
+            text_content,
+            args.model,
+            engine=args.engine,
+            long_audio=args.long_audio,
+            chunk_seconds=args.chunk_seconds or 600.0,
+            checkpoint_dir=args.checkpoint_dir,
+            use_cache=not args.no_cache,
+            state_path=output_path + ".align.json" if args.incremental else None,
+            report=report,
+            workers=args.anchor_workers
+        )
+        
+        # 生成SRT文件
+        with stage(report, "write_srt"):
+            generate_srt(segments, output_path)
     
     print(f"\n✅ 完成！共生成 {len(segments)} 个字幕段落")
-
-
-if __name__ == "__main__":
-    main()
+    write_report(report, output_path, show=args.report, save_json=args.report_json)
+    if profiler is not None:
+        profiler.save_report(report)
+        print(f"🔬 剖析结果已保存: {profiler.job_dir}")
 
 
 
-def fix_overlapping_timestamps(segments: List[Dict]) -> List[Dict]:
+def fix_overlapping_timestamps(segments: Union[CueList, List[Dict]]) -> CueList:
     """
     修复重叠的时间戳，确保字幕段落严格按时间顺序排列且不重叠
     
+    与 iter_fix_overlapping_timestamps 的逐句规则完全相同，但在 starts/ends 数组上整体计算
+    
     Args:
         segments: 初始对齐的段落列表（可能有重叠）
     
@@ -748,106 +1988,201 @@ def fix_overlapping_timestamps(segments: List[Dict]) -> List[Dict]:
     if len(segments) == 0:
         return segments
     
-    # 按开始时间排序
-    segments = sorted(segments, key=lambda x: x["start"])
-    
-    fixed_segments = []
-    duration_fixed = 0  # 记录修复了多少个超长时长
-    
-    for i, segment in enumerate(segments):
-        start = segment["start"]
-        end = segment["end"]
-        text = segment["text"]
-        
-        # 计算文本的有效字符数（用于估算合理时长）
-        text_chars = len([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
-        
-        # 计算合理的最大时长（每个字最多0.25秒，加上1秒基础时间）
-        # 中文语速约3-4字/秒，0.25秒/字已经是较慢的语速
-        max_duration = max(3.0, 1.0 + text_chars * 0.25)
-        
-        # 计算合理的最小时长（每个字至少0.15秒，加上0.5秒基础时间）
-        min_duration = max(1.0, 0.5 + text_chars * 0.15)
-        
-        # 如果不是第一个段落，检查与前一个字幕的关系
-        if i > 0:
-            prev_end = fixed_segments[-1]["end"]
-            
-            # 仅处理重叠，不在此处做大范围的空隙填补
-            if start < prev_end:
-                # 重叠了，调整开始时间为上一个段落结束时间
-                start = prev_end
-        
-        # 检查时长是否合理
+    # 按开始时间排序（不修改输入）
+    cues = CueList.from_segments(segments).sorted_by_start().copy()
+    original_ends = cues.ends
+    text_chars = cues.char_counts()
+    
+    # 计算合理的最大时长（每个字最多0.25秒，加上1秒基础时间）
+    max_duration = np.maximum(3.0, 1.0 + text_chars * 0.25)
+    # 计算合理的最小时长（每个字至少0.15秒，加上0.5秒基础时间）
+    min_duration = np.maximum(1.0, 0.5 + text_chars * 0.15)
+    # 下一个字幕的（原始）开始时间，最后一个字幕没有
+    next_starts = np.append(cues.starts[1:], np.inf)
+    
+    def compute_ends(starts, index):
+        start = starts[index]
+        end = original_ends[index]
         duration = end - start
-        
-        # 修复超长时长（防止"吞字"问题）
-        if duration > max_duration:
-            end = start + max_duration
-            duration_fixed += 1
-        
-        # 修复过短时长
-        if duration < min_duration:
-            end = start + min_duration
-        
+        # 修复超长时长（防止"吞字"问题）/ 过短时长
+        end = np.where(duration > max_duration[index], start + max_duration[index], end)
+        end = np.where(duration < min_duration[index], start + min_duration[index], end)
         # 确保结束时间晚于开始时间
-        if end <= start:
-            # 此时start可能被推迟了，end保持原样可能导致end<=start
-            # 强制给一个最短持续时间
-            estimated_duration = max(1.0, text_chars * 0.15)
-            end = start + estimated_duration
-        
-        # 再次检查是否与下一个字幕冲突（确保基础的无重叠）
-        if i + 1 < len(segments):
-            next_start = segments[i + 1]["start"]
-            if end > next_start:
-                # 缩短到下一个字幕开始前（严格不重叠）
-                end = next_start
-        
+        end = np.where(end <= start, start + np.maximum(1.0, text_chars[index] * 0.15), end)
+        # 缩短到下一个字幕开始前（严格不重叠）
+        end = np.minimum(end, next_starts[index])
         # 最终安全检查：如果修正后end还是<=start，强制0.5秒
-        if end <= start:
-             end = start + 0.5 
+        return np.where(end <= start, start + 0.5, end)
+    
+    # 开始时间不早于上一个字幕的结束时间（递推约束）
+    starts = cues.starts
+    ends = settle_starts(starts, compute_ends)
+    
+    duration_fixed = int(np.count_nonzero(original_ends - starts > max_duration))
+    if duration_fixed > 0:
+        print(f"   (基础修正) 修复了 {duration_fixed} 处超长时长")
+    
+    return CueList(starts, ends, cues.texts)
 
-        fixed_segments.append({
-            "start": start,
-            "end": end,
-            "text": text
-        })
+
+def iter_fix_overlapping_timestamps(segments: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    fix_overlapping_timestamps 的流式版本：只需要向后看一个字幕
+    
+    输入需已按开始时间排序（对齐结果本身就是按时间顺序产生的）。
+    
+    Args:
+        segments: 按开始时间排序的段落（可以是生成器）
+    
+    Yields:
+        修复后的段落（无重叠）
+    """
+    duration_fixed = 0  # 记录修复了多少个超长时长
+    prev_end = None
+    current = None
+    
+    for next_segment in segments:
+        if current is not None:
+            fixed, overlong = _fix_segment(current, prev_end, next_segment["start"])
+            duration_fixed += overlong
+            prev_end = fixed["end"]
+            yield fixed
+        current = next_segment
+    
+    if current is not None:
+        fixed, overlong = _fix_segment(current, prev_end, None)
+        duration_fixed += overlong
+        yield fixed
     
     if duration_fixed > 0:
         print(f"   (基础修正) 修复了 {duration_fixed} 处超长时长")
+
+
+def _fix_segment(segment: Dict, prev_end, next_start) -> Tuple[Dict, bool]:
+    """
+    修复单个字幕的时间戳
+    
+    Args:
+        segment: 当前段落
+        prev_end: 上一个（已修复）字幕的结束时间，第一个字幕为 None
+        next_start: 下一个字幕的开始时间，最后一个字幕为 None
     
-    return fixed_segments
+    Returns:
+        (修复后的段落, 是否修复了超长时长)
+    """
+    start = segment["start"]
+    end = segment["end"]
+    text = segment["text"]
+    overlong = False
+    
+    # 计算文本的有效字符数（用于估算合理时长）
+    text_chars = len([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
+    
+    # 计算合理的最大时长（每个字最多0.25秒，加上1秒基础时间）
+    # 中文语速约3-4字/秒，0.25秒/字已经是较慢的语速
+    max_duration = max(3.0, 1.0 + text_chars * 0.25)
+    
+    # 计算合理的最小时长（每个字至少0.15秒，加上0.5秒基础时间）
+    min_duration = max(1.0, 0.5 + text_chars * 0.15)
+    
+    # 如果不是第一个段落，检查与前一个字幕的关系
+    if prev_end is not None:
+        # 仅处理重叠，不在此处做大范围的空隙填补
+        if start < prev_end:
+            # 重叠了，调整开始时间为上一个段落结束时间
+            start = prev_end
+    
+    # 检查时长是否合理
+    duration = end - start
+    
+    # 修复超长时长（防止"吞字"问题）
+    if duration > max_duration:
+        end = start + max_duration
+        overlong = True
+    
+    # 修复过短时长
+    if duration < min_duration:
+        end = start + min_duration
+    
+    # 确保结束时间晚于开始时间
+    if end <= start:
+        # 此时start可能被推迟了，end保持原样可能导致end<=start
+        # 强制给一个最短持续时间
+        estimated_duration = max(1.0, text_chars * 0.15)
+        end = start + estimated_duration
+    
+    # 再次检查是否与下一个字幕冲突（确保基础的无重叠）
+    if next_start is not None:
+        if end > next_start:
+            # 缩短到下一个字幕开始前（严格不重叠）
+            end = next_start
+    
+    # 最终安全检查：如果修正后end还是<=start，强制0.5秒
+    if end <= start:
+        end = start + 0.5
 
+    return {
+        "start": start,
+        "end": end,
+        "text": text
+    }, overlong
 
-def optimize_subtitle_duration(segments: List[Dict], max_extension: float = 0.5) -> List[Dict]:
+
+def optimize_subtitle_duration(segments: Union[CueList, List[Dict]], max_extension: float = 0.5) -> Union[CueList, List[Dict]]:
     """
     优化字幕持续时间：填补句间空隙，提升观感
     args:
-        segments: 包含 {"start": float, "end": float, "text": str} 的列表
+        segments: CueList 或包含 {"start": float, "end": float, "text": str} 的列表（原地修改）
         max_extension: 最大自动延长时间（秒），建议 0.5
     """
-    if not segments:
+    if not len(segments):
         return segments
+    
+    cues = CueList.from_segments(segments)
+    starts, ends = cues.starts, cues.ends
+    
+    # 计算两句之间的空隙
+    gap = starts[1:] - ends[:-1]
+    # 策略：填补空隙，但保留 0.1s 间隔，且不超过最大延长阈值
+    extend_by = np.minimum(max_extension, gap - 0.1)
+    # 只有当确实能延长时才操作 (extend_by可能为负，如果gap<0.1)
+    ends[:-1] += np.where((gap > 0) & (extend_by > 0), extend_by, 0.0)
+    
+    # 特殊处理最后一句：总是延长 0.5s，防止结束太快
+    ends[-1] += 0.5
+    
+    if cues is not segments:
+        # 普通 dict 列表：写回每个段落
+        for segment, end in zip(segments, ends.tolist()):
+            segment["end"] = end
+    return segments
 
-    # 遍历（除了最后一句）
-    for i in range(len(segments) - 1):
-        curr_seg = segments[i]
-        next_seg = segments[i+1]
-        
-        # 计算两句之间的空隙
-        gap = next_seg["start"] - curr_seg["end"]
-        
-        if gap > 0:
-            # 策略：填补空隙，但保留 0.1s 间隔，且不超过最大延长阈值
-            extend_by = min(max_extension, gap - 0.1)
+
+def iter_optimize_subtitle_duration(segments: Iterable[Dict], max_extension: float = 0.5) -> Iterator[Dict]:
+    """
+    optimize_subtitle_duration 的流式版本：只需要向后看一个字幕
+    """
+    curr_seg = None
+    for next_seg in segments:
+        if curr_seg is not None:
+            # 计算两句之间的空隙
+            gap = next_seg["start"] - curr_seg["end"]
             
-            # 只有当确实能延长时才操作 (extend_by可能为负，如果gap<0.1)
-            if extend_by > 0:
-                curr_seg["end"] += extend_by
+            if gap > 0:
+                # 策略：填补空隙，但保留 0.1s 间隔，且不超过最大延长阈值
+                extend_by = min(max_extension, gap - 0.1)
                 
-    # 特殊处理最后一句：总是延长 0.5s，防止结束太快
-    if segments:
-        segments[-1]["end"] += 0.5
+                # 只有当确实能延长时才操作 (extend_by可能为负，如果gap<0.1)
+                if extend_by > 0:
+                    curr_seg["end"] += extend_by
+            yield curr_seg
+        curr_seg = next_seg
     
-    return segments
+    # 特殊处理最后一句：总是延长 0.5s，防止结束太快
+    if curr_seg is not None:
+        curr_seg["end"] += 0.5
+        yield curr_seg
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+识别结果磁盘缓存：同一段录音反复修改文稿时，无需重新运行 Whisper
+
+特点：
+1. 按内容寻址：缓存键 = 音频内容哈希 + 模型名 + 计算精度 + 识别参数（语言、beam_size、VAD 参数等）
+2. 命中时直接返回识别段落（含词级时间戳），跳过模型加载和识别
+3. 按总大小淘汰最久未使用的条目
+4. 可放在多台机器共享的网络文件系统上：写入先写临时文件再原子重命名，
+   读到损坏或写到一半的文件视为未命中，并发删除/淘汰互不影响
+
+环境变量：
+    TXT2SRT_ASR_CACHE_DIR   缓存目录（默认 ~/.cache/txt2srt/asr）
+    TXT2SRT_ASR_CACHE_MB    缓存大小上限（MB，默认 2048，0 表示不限制）
+
+命令行：
+    python txt2srt.py cache list             # 列出缓存条目
+    python txt2srt.py cache prune [--max-mb N | --older-than-days D]
+    python txt2srt.py cache clear            # 删除全部缓存
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import argparse
+from typing import List, Dict, Optional
+
+
+CACHE_VERSION = 1
+
+# 进程内的音频哈希缓存：(绝对路径, 大小, 修改时间) -> sha256
+_audio_hashes = {}
+
+
+def hash_audio(audio_path: str) -> str:
+    """
+    计算音频文件内容的 SHA-256（按块读取，内存占用恒定）
+    """
+    stat = os.stat(audio_path)
+    identity = (os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns)
+    cached = _audio_hashes.get(identity)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    _audio_hashes[identity] = digest.hexdigest()
+    return _audio_hashes[identity]
+
+
+def make_cache_key(audio_hash: str, model_name: str, compute_type: str, options: Dict) -> str:
+    """
+    由音频哈希和所有影响识别结果的参数生成缓存键
+    """
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "audio": audio_hash,
+            "model": model_name,
+            "compute_type": compute_type,
+            "options": options,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ASRCache:
+    """
+    识别结果缓存（每个条目一个 JSON 文件: <目录>/<键前2位>/<键>.json）
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[float] = None):
+        """
+        Args:
+            cache_dir: 缓存目录，None 表示读取环境变量
+            max_mb: 缓存大小上限（MB），None 表示读取环境变量，0 表示不限制
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get("TXT2SRT_ASR_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "txt2srt", "asr")
+        if max_mb is None:
+            max_mb = float(os.environ.get("TXT2SRT_ASR_CACHE_MB", 2048))
+
+        self.cache_dir = cache_dir
+        self.max_mb = max_mb
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        读取缓存的识别段落，未命中（或文件损坏）时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # 其他节点写到一半或文件损坏，按未命中处理（下次写入会原子覆盖）
+            return None
+
+        if entry.get("key") != key:
+            return None
+
+        # 更新访问时间，供 LRU 淘汰使用（只读文件系统上忽略）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["segments"]
+
+    def put(self, key: str, segments: List[Dict], meta: Optional[Dict] = None) -> bool:
+        """
+        写入识别段落，返回是否写入成功（缓存不可写时只打印警告，不影响对齐）
+        """
+        path = self._path(key)
+        entry = {
+            "key": key,
+            "created": time.time(),
+            "meta": meta or {},
+            "segments": segments,
+        }
+        # 临时文件名带上进程号和随机后缀，多个节点同时写同一个键也不会互相覆盖半成品
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ 识别结果缓存写入失败（{e}），本次不缓存")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        if self.max_mb > 0:
+            self.prune(max_mb=self.max_mb)
+        return True
+
+    def entries(self) -> List[Dict]:
+        """
+        列出所有缓存条目（按最近使用时间从新到旧）
+        """
+        result = []
+        if not os.path.isdir(self.cache_dir):
+            return result
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # 被其他进程淘汰了
+                    continue
+                result.append({
+                    "key": name[:-len(".json")],
+                    "path": path,
+                    "size": stat.st_size,
+                    "last_used": stat.st_mtime,
+                })
+        result.sort(key=lambda entry: entry["last_used"], reverse=True)
+        return result
+
+    def read_meta(self, entry: Dict) -> Dict:
+        """
+        读取条目的元信息（音频文件名、模型、段落数等）
+        """
+        try:
+            with open(entry["path"], "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        meta = dict(data.get("meta", {}))
+        meta["segments"] = len(data.get("segments", []))
+        return meta
+
+    def prune(self, max_mb: Optional[float] = None, older_than_seconds: Optional[float] = None) -> int:
+        """
+        删除超出大小上限（最久未使用的先删）或超过指定时间未使用的条目，返回删除数量
+        """
+        entries = self.entries()
+        removed = 0
+        now = time.time()
+
+        # 清理异常退出遗留的临时文件（超过1小时）
+        self._remove_stale_tmp(now - 3600)
+
+        if older_than_seconds is not None:
+            keep = []
+            for entry in entries:
+                if now - entry["last_used"] > older_than_seconds:
+                    removed += self._remove(entry["path"])
+                else:
+                    keep.append(entry)
+            entries = keep
+
+        if max_mb is not None and max_mb > 0:
+            budget = max_mb * 1024 * 1024
+            used = sum(entry["size"] for entry in entries)
+            while entries and used > budget:
+                entry = entries.pop()
+                used -= entry["size"]
+                removed += self._remove(entry["path"])
+
+        return removed
+
+    def clear(self) -> int:
+        """
+        删除全部缓存条目，返回删除数量
+        """
+        return sum(self._remove(entry["path"]) for entry in self.entries())
+
+    def _remove(self, path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"⚠️ 无法删除缓存文件 {path}: {e}")
+            return 0
+
+    def _remove_stale_tmp(self, before: float):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith(".tmp"):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    if os.stat(path).st_mtime < before:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+def cache_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="txt2srt.py cache",
+        description="管理识别结果磁盘缓存"
+    )
+    parser.add_argument(
+        "--dir",
+        help="缓存目录（默认: 环境变量 TXT2SRT_ASR_CACHE_DIR 或 ~/.cache/txt2srt/asr）",
+        default=None
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="列出缓存条目")
+    prune_parser = subparsers.add_parser("prune", help="按大小上限或未使用时间清理缓存")
+    prune_parser.add_argument(
+        "--max-mb",
+        help="保留的最大总大小（MB，默认: TXT2SRT_ASR_CACHE_MB）",
+        type=float,
+        default=None
+    )
+    prune_parser.add_argument(
+        "--older-than-days",
+        help="删除超过指定天数未使用的条目",
+        type=float,
+        default=None
+    )
+    subparsers.add_parser("clear", help="删除全部缓存")
+
+    args = parser.parse_args(argv)
+    cache = ASRCache(args.dir)
+
+    if args.command == "list":
+        entries = cache.entries()
+        total = sum(entry["size"] for entry in entries)
+        print(f"缓存目录: {cache.cache_dir}")
+        print(f"共 {len(entries)} 个条目, {total / 1024 / 1024:.1f} MB（上限 {cache.max_mb:.0f} MB）")
+        for entry in entries:
+            meta = cache.read_meta(entry)
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+            print(f"   {entry['key'][:12]}  {last_used}  {entry['size'] / 1024:8.1f} KB  "
+                  f"{meta.get('model', '?')}  {meta.get('segments', 0)} 段  {meta.get('audio_name', '')}")
+    elif args.command == "prune":
+        max_mb = args.max_mb if args.max_mb is not None else cache.max_mb
+        older_than = args.older_than_days * 86400 if args.older_than_days is not None else None
+        removed = cache.prune(max_mb=max_mb, older_than_seconds=older_than)
+        print(f"已删除 {removed} 个缓存条目")
+    elif args.command == "clear":
+        removed = cache.clear()
+        print(f"已删除 {removed} 个缓存条目")
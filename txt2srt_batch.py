@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量对齐：一次加载模型，处理整个目录或清单中的所有音频/文本对
+
+用法：
+    python txt2srt.py batch 目录/              # 按文件名（不含扩展名）配对 音频 + .txt
+    python txt2srt.py batch manifest.csv       # CSV 清单: audio,text[,output]
+    python txt2srt.py batch manifest.jsonl     # JSONL 清单: {"audio": ..., "text": ..., "output": ...}
+"""
+
+import os
+import csv
+import json
+import time
+import wave
+import argparse
+import contextlib
+from collections import deque
+from typing import List, Dict, Optional
+
+
+AUDIO_EXTENSIONS = (
+    ".mp3", ".wav", ".m4a", ".flac", ".ogg", ".aac", ".wma", ".opus", ".amr", ".aiff", ".aif",
+    ".mp4", ".avi", ".mkv", ".mov", ".flv", ".webm",
+)
+
+
+def probe_audio_duration(audio_path: str, estimate: bool = True) -> float:
+    """
+    低成本地获取音频时长（秒），用于任务调度和吞吐统计
+
+    优先级：
+    1. WAV 文件直接读取文件头
+    2. 使用 pydub 调用 ffprobe 读取元数据
+    3. 都失败时按 128kbps 码率用文件大小估算（estimate=False 时抛出 RuntimeError，
+       需要准确时长的调用方不能拿估算值当真）
+    """
+    if audio_path.lower().endswith(".wav"):
+        try:
+            with wave.open(audio_path, "rb") as f:
+                return f.getnframes() / float(f.getframerate())
+        except (wave.Error, EOFError, OSError):
+            pass
+
+    try:
+        from pydub.utils import mediainfo
+        duration = float(mediainfo(audio_path).get("duration", 0))
+        if duration > 0:
+            return duration
+    except Exception:
+        pass
+
+    if not estimate:
+        raise RuntimeError(f"无法读取音频时长（需要 ffprobe，请先安装 ffmpeg 并加入 PATH）: {audio_path}")
+    return os.path.getsize(audio_path) * 8 / 128000.0
+
+
+def discover_pairs(directory: str, output_dir: Optional[str] = None) -> List[Dict]:
+    """
+    在目录中按文件名（不含扩展名）匹配 音频文件 + 同名 .txt 文本
+    """
+    files = sorted(os.listdir(directory))
+    texts = {os.path.splitext(name)[0]: name for name in files if name.lower().endswith(".txt")}
+
+    jobs = []
+    for name in files:
+        base_name, ext = os.path.splitext(name)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        if base_name not in texts:
+            print(f"⚠️ 跳过 {name}：找不到同名文本文件 {base_name}.txt")
+            continue
+        jobs.append({
+            "audio": os.path.join(directory, name),
+            "text": os.path.join(directory, texts[base_name]),
+            "output": os.path.join(output_dir or directory, base_name + ".srt"),
+        })
+    return jobs
+
+
+def load_manifest(manifest_path: str, output_dir: Optional[str] = None) -> List[Dict]:
+    """
+    读取 CSV（表头 audio,text[,output]）或 JSONL 清单，相对路径以清单所在目录为基准
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        if manifest_path.lower().endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    jobs = []
+    for row in rows:
+        audio = os.path.join(base_dir, row["audio"])
+        text = row["text"]
+        if os.path.exists(os.path.join(base_dir, text)):
+            text = os.path.join(base_dir, text)
+        output = row.get("output")
+        if output:
+            output = os.path.join(base_dir, output)
+        else:
+            base_name = os.path.splitext(os.path.basename(audio))[0]
+            output = os.path.join(output_dir or os.path.dirname(audio), base_name + ".srt")
+        jobs.append({"audio": audio, "text": text, "output": output})
+    return jobs
+
+
+def collect_jobs(source: str, output_dir: Optional[str] = None) -> List[Dict]:
+    """
+    从目录或清单收集任务，并按音频时长从长到短排序（长任务先跑，减少尾部等待）
+    """
+    if os.path.isdir(source):
+        jobs = discover_pairs(source, output_dir)
+    else:
+        jobs = load_manifest(source, output_dir)
+
+    for job in jobs:
+        job["duration"] = probe_audio_duration(job["audio"]) if os.path.exists(job["audio"]) else 0.0
+
+    jobs.sort(key=lambda job: job["duration"], reverse=True)
+    return jobs
+
+
+def read_job_text(job: Dict) -> str:
+    """
+    读取任务文本（text 字段既可以是文件路径，也可以是直接的文本内容）
+    """
+    if os.path.exists(job["text"]):
+        with open(job["text"], "r", encoding="utf-8") as f:
+            return f.read()
+    return job["text"]
+
+
+def process_job(job: Dict, model_name: str, use_gpu: bool, max_chars: int, engine: str) -> Dict:
+    """
+    处理单个任务，返回结果（失败时记录错误，不抛出异常）
+    """
+    from txt2srt import align_audio_text, generate_srt
+    from txt2srt_report import AlignmentReport
+
+    start = time.perf_counter()
+    try:
+        if not os.path.exists(job["audio"]):
+            raise FileNotFoundError(f"音频文件不存在: {job['audio']}")
+        report = AlignmentReport(job["audio"], engine=engine, model=model_name)
+        report.audio_seconds = job.get("duration")
+        segments = align_audio_text(
+            job["audio"],
+            read_job_text(job),
+            model_name=model_name,
+            use_gpu=use_gpu,
+            max_chars=max_chars,
+            engine=engine,
+            report=report
+        )
+        output_dir = os.path.dirname(job["output"])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        generate_srt(segments, job["output"])
+        return {**job, "ok": True, "segments": len(segments), "seconds": time.perf_counter() - start,
+                "report": report.to_dict()}
+    except Exception as e:
+        return {**job, "ok": False, "error": str(e), "seconds": time.perf_counter() - start}
+
+
+def run_batch(jobs: List[Dict], model_name: str = "base", use_gpu: bool = True, max_chars: int = 30, engine: str = "banded") -> List[Dict]:
+    """
+    依次处理所有任务（模型由进程级缓存保证只加载一次）
+    """
+    results = []
+    for i, job in enumerate(jobs, 1):
+        print(f"\n[{i}/{len(jobs)}] {os.path.basename(job['audio'])} ({job['duration']:.1f}s)")
+        result = process_job(job, model_name, use_gpu, max_chars, engine)
+        if not result["ok"]:
+            print(f"❌ 处理失败: {result['error']}")
+        results.append(result)
+    return results
+
+
+def resolve_thread_budget(workers: int, threads: int = 0) -> int:
+    """
+    计算每个工作进程的线程数，保证 进程数 × 线程数 不超过CPU核数
+    """
+    cores = os.cpu_count() or 1
+    if workers > cores:
+        print(f"⚠️ 工作进程数 {workers} 超过CPU核数 {cores}")
+    max_threads = max(1, cores // workers)
+    if threads <= 0:
+        return max_threads
+    if threads > max_threads:
+        print(f"⚠️ {workers} 个进程 × {threads} 线程超过CPU核数 {cores}，每个进程降为 {max_threads} 线程")
+        return max_threads
+    return threads
+
+
+# 限制计算线程数的环境变量（BLAS/OpenMP 在库加载时读取，之后再改不生效）
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TXT2SRT_CPU_THREADS")
+
+
+def _init_worker(threads: int):
+    """
+    工作进程初始化：限制进程内的计算线程数（必须在导入 torch/ctranslate2 之前设置）
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+@contextlib.contextmanager
+def _thread_env(threads: int):
+    """
+    创建工作进程期间临时设置线程数环境变量，新进程启动时就带着这些设置
+    """
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_batch_parallel(jobs: List[Dict], workers: int, threads: int, model_name: str = "base", use_gpu: bool = False, max_chars: int = 30, engine: str = "banded") -> List[Dict]:
+    """
+    使用多进程并行处理任务
+
+    - 每个工作进程只加载一次模型（进程级模型缓存），并有独立的线程预算
+    - 任务按时长从长到短提交，空闲的工作进程领取下一个任务
+    - 单个文件失败只记录错误，不影响其他任务
+    - 工作进程崩溃（内存不足被系统杀掉、段错误）时重建进程池继续处理：
+      崩溃时正在处理的任务逐个单独重试，单独运行仍然崩溃的任务才记为失败
+
+    工作进程用 spawn 方式启动，线程数环境变量在启动前就已设置
+    （fork 出的进程会继承父进程已经导入的 numpy/torch，再设置环境变量不生效）。
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+
+    print(f"启动 {workers} 个工作进程，每个进程 {threads} 个计算线程")
+
+    context = multiprocessing.get_context("spawn")
+    pending = deque(jobs)
+    # 进程池崩溃时正在处理的任务，逐个单独重试以找出真正导致崩溃的任务
+    suspects = deque()
+    isolated = None
+    in_flight = {}
+    executor = None
+    results = []
+
+    def record(job, result):
+        status = "✅" if result["ok"] else f"❌ {result['error']}"
+        print(f"[{len(results) + 1}/{len(jobs)}] {os.path.basename(job['audio'])}: {status} ({result['seconds']:.1f}s)")
+        results.append(result)
+
+    with _thread_env(threads):
+        try:
+            while pending or suspects or in_flight:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                   initializer=_init_worker, initargs=(threads,))
+                # 同时提交的任务不超过进程数：进程池崩溃时只影响正在处理的任务
+                if isolated is None:
+                    if suspects:
+                        if not in_flight:
+                            isolated = suspects.popleft()
+                            in_flight[executor.submit(process_job, isolated, model_name, use_gpu, max_chars, engine)] = isolated
+                    else:
+                        while pending and len(in_flight) < workers:
+                            job = pending.popleft()
+                            in_flight[executor.submit(process_job, job, model_name, use_gpu, max_chars, engine)] = job
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                crashed = []
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        record(job, future.result())
+                    except BrokenProcessPool:
+                        crashed.append(job)
+                if not crashed:
+                    if not in_flight:
+                        isolated = None
+                    continue
+
+                # 进程池已损坏：其余任务也会很快以 BrokenProcessPool 结束（崩溃前已完成的照常记录）
+                for future in wait(in_flight).done:
+                    job = in_flight.pop(future)
+                    try:
+                        record(job, future.result())
+                    except BrokenProcessPool:
+                        crashed.append(job)
+                executor.shutdown(wait=True)
+                executor = None
+
+                if isolated is not None:
+                    record(isolated, {**isolated, "ok": False, "seconds": 0.0,
+                                      "error": "工作进程异常退出（可能内存不足被系统终止）"})
+                    isolated = None
+                else:
+                    suspects.extend(crashed)
+                    print(f"⚠️ 工作进程异常退出，重建进程池；{len(crashed)} 个任务将逐个单独重试")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+    return results
+
+
+def print_summary(results: List[Dict], wall_seconds: float):
+    """
+    打印批量处理的汇总吞吐量
+    """
+    succeeded = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    audio_seconds = sum(r["duration"] for r in succeeded)
+
+    files_per_minute = len(succeeded) / (wall_seconds / 60) if wall_seconds > 0 else 0.0
+    rtf = wall_seconds / audio_seconds if audio_seconds > 0 else 0.0
+
+    print("\n" + "=" * 60)
+    print("📊 批量处理汇总")
+    print("=" * 60)
+    print(f"   成功: {len(succeeded)} 个文件, 失败: {len(failed)} 个文件")
+    print(f"   音频总时长: {audio_seconds:.1f} 秒, 总耗时: {wall_seconds:.1f} 秒")
+    print(f"   吞吐量: {files_per_minute:.2f} 文件/分钟")
+    if rtf > 0:
+        print(f"   实时率 (RTF): {rtf:.3f}（即 {1 / rtf:.1f}× 实时速度）")
+    for r in failed:
+        print(f"   ❌ {r['audio']}: {r['error']}")
+
+
+def batch_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="txt2srt.py batch",
+        description="批量音频-文本对齐：一次加载模型，处理目录或清单中的所有文件"
+    )
+    parser.add_argument(
+        "source",
+        help="输入目录（按文件名匹配音频和.txt）或清单文件（.csv / .jsonl）"
+    )
+    parser.add_argument(
+        "-o", "--output-dir",
+        help="SRT输出目录（默认: 与音频文件相同目录）",
+        default=None
+    )
+    parser.add_argument(
+        "-m", "--model",
+        help="Whisper模型大小 (tiny, base, small, medium, large)",
+        default="base",
+        choices=["tiny", "base", "small", "medium", "large"]
+    )
+    parser.add_argument(
+        "-c", "--max-chars",
+        help="每行最大字符数",
+        type=int,
+        default=30
+    )
+    parser.add_argument(
+        "-e", "--engine",
+        help="字符匹配引擎 (banded, full, anchor, lcs, forced, draft)",
+        default="banded",
+        choices=["banded", "full", "anchor", "lcs", "forced", "draft"]
+    )
+    parser.add_argument(
+        "--cpu",
+        help="强制使用CPU",
+        action="store_true"
+    )
+    parser.add_argument(
+        "-j", "--workers",
+        help="并行工作进程数（默认: 1，CPU节点上建议设置为 核数/线程数）",
+        type=int,
+        default=1
+    )
+    parser.add_argument(
+        "-t", "--threads",
+        help="每个工作进程的计算线程数（默认: CPU核数/进程数）",
+        type=int,
+        default=0
+    )
+
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        print(f"错误: 输入不存在: {args.source}")
+        raise SystemExit(1)
+
+    jobs = collect_jobs(args.source, args.output_dir)
+    if not jobs:
+        print("错误: 没有找到可处理的音频/文本对")
+        raise SystemExit(1)
+
+    total_duration = sum(job["duration"] for job in jobs)
+    print(f"共 {len(jobs)} 个任务，音频总时长约 {total_duration:.1f} 秒（按时长从长到短处理）")
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        if not args.cpu:
+            print("⚠️ 多进程模式下每个进程都会加载一份模型，GPU显存不足时请加 --cpu")
+        threads = resolve_thread_budget(args.workers, args.threads)
+        results = run_batch_parallel(jobs, args.workers, threads, args.model, not args.cpu, args.max_chars, args.engine)
+    else:
+        if args.threads > 0:
+            _init_worker(resolve_thread_budget(1, args.threads))
+        results = run_batch(jobs, args.model, not args.cpu, args.max_chars, args.engine)
+    print_summary(results, time.perf_counter() - start)
+
+    if any(not r["ok"] for r in results):
+        raise SystemExit(1)
@@ -0,0 +1,1012 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文本算法基准测试（不需要模型，离线运行）
+
+用合成语料（中文 / 英文 / 中英混合，1千 ~ 10万字）和按指定错误率生成的"识别结果"，
+测量纯 Python/NumPy 部分的耗时和峰值内存：分句、字符匹配、时间修正、SRT 写出。
+不导入 torch / whisper，不访问网络。
+
+用法：
+    python txt2srt_bench.py                                  # 默认规模，结果打印到终端
+    python txt2srt_bench.py --sizes 1000,10000 -o result.json
+    python txt2srt_bench.py --baseline baseline.json         # 与基线比较，变慢超过阈值时返回 1
+    python txt2srt_bench.py --baseline baseline.json --update-baseline
+    python txt2srt_bench.py e2e --durations 60,600,10800     # 端到端：模拟识别后端 + 完整对齐流程
+    python txt2srt_bench.py window                           # 滑动窗口匹配：逐窗口计算 vs 增量计数
+    python txt2srt_bench.py dtw                              # 带状DTW与完整矩阵DTW的路径是否一致（缺段/多段/重复段落）
+    python txt2srt_bench.py startup                          # 冷启动：导入耗时和 --help 耗时是否在预算内
+
+e2e 用 txt2srt_stubasr 的模拟识别后端代替 Whisper / WhisperX：由已知文稿生成带错误和时间抖动的识别结果，
+在生成的音调/静音测试音频上跑完整流程，报告各阶段耗时、峰值内存增量和与真实时间的误差；
+有字幕与文稿配不上或顺序错误时返回 1。
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import platform
+import bisect
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+from typing import Callable, List, Dict, Optional, Tuple
+
+import numpy as np
+
+import txt2srt
+from txt2srt_timeline import PUNCTUATION
+from txt2srt_stubasr import tokenize, join_tokens
+from txt2srt_report import AlignmentReport
+
+
+# 合成语料用的常用汉字
+COMMON_HANZI = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+    "十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+)
+
+# 合成语料用的常用英文单词
+ENGLISH_WORDS = (
+    "the of and to in is you that it he was for on are as with his they at be this have from or one had by word but not what "
+    "all were we when your can said there use an each which she do how their if will up other about out many then them these so "
+    "some her would make like him into time has look two more write go see number no way could people my than first water been "
+    "call who oil its now find long down day did get come made may part model audio text subtitle align speech python server"
+).split()
+
+CORPUS_KINDS = ("zh", "en", "mixed")
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_ENGINES = ("banded", "anchor")
+
+
+def make_chinese_text(n_chars: int, seed: int = 0, sentence_chars=(8, 30)) -> List[str]:
+    """
+    生成合成中文句子（总字数约 n_chars）
+    """
+    rng = random.Random(seed)
+    sentences = []
+    total = 0
+    while total < n_chars:
+        length = rng.randint(*sentence_chars)
+        sentences.append(''.join(rng.choice(COMMON_HANZI) for _ in range(length)) + rng.choice("。，！？"))
+        total += length
+    return sentences
+
+
+def make_corpus(kind: str, n_chars: int, seed: int = 0) -> str:
+    """
+    生成合成文稿（约 n_chars 个字符，含标点和换行分段）
+
+    Args:
+        kind: "zh" 中文 / "en" 英文 / "mixed" 中文夹杂英文单词和数字
+        n_chars: 目标字符数
+        seed: 随机种子（相同参数生成相同文本）
+    """
+    if kind not in CORPUS_KINDS:
+        raise ValueError(f"未知的语料类型: {kind}")
+    rng = random.Random(seed)
+
+    def clause():
+        if kind == "en":
+            return ' '.join(rng.choice(ENGLISH_WORDS) for _ in range(rng.randint(3, 12)))
+        chars = [rng.choice(COMMON_HANZI) for _ in range(rng.randint(4, 16))]
+        if kind == "mixed" and rng.random() < 0.5:
+            extra = rng.choice(ENGLISH_WORDS) if rng.random() < 0.7 else str(rng.randint(1, 2025))
+            chars.insert(rng.randint(0, len(chars)), f" {extra} ")
+        return ''.join(chars)
+
+    comma, ends = (", ", ". ! ?".split()) if kind == "en" else ("，", "。！？")
+    paragraphs, sentences, size = [], [], 0
+    while size < n_chars:
+        sentence = comma.join(clause() for _ in range(rng.randint(1, 4))) + rng.choice(ends)
+        sentences.append(sentence)
+        size += len(sentence)
+        if rng.random() < 0.15:
+            paragraphs.append((" " if kind == "en" else "").join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append((" " if kind == "en" else "").join(sentences))
+    return '\n'.join(paragraphs)
+
+
+def make_recognized(sentences: List[str], error_rate: float = 0.05, seed: int = 1,
+                    seconds_per_char: float = 0.2) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    由用户句子生成模拟的识别结果
+
+    每个词按 error_rate 随机替换（同类词）、丢弃或在其后插入一个词，
+    时间按字符数均匀推进，句间留 0.4 秒停顿。
+
+    Returns:
+        (识别段落 [{"start", "end", "text"}],
+         词级时间戳 [{"word", "start", "end"}],
+         每个用户句子的真实时间 [{"start", "end", "text"}])
+    """
+    rng = random.Random(seed)
+
+    def random_like(token):
+        if token[0].isdigit():
+            return str(rng.randint(0, 9999))
+        if token[0].isascii():
+            return rng.choice(ENGLISH_WORDS)
+        return rng.choice(COMMON_HANZI)
+
+    segments, words, truth = [], [], []
+    cursor = 0.0
+    for sentence in sentences:
+        tokens = tokenize(sentence)
+        if not tokens:
+            continue
+        sentence_start = cursor
+        recognized = []
+        for token in tokens:
+            roll = rng.random()
+            if roll < error_rate / 3:
+                recognized.append(random_like(token))
+            elif roll < error_rate * 2 / 3:
+                pass
+            elif roll < error_rate:
+                recognized.extend([token, random_like(token)])
+            else:
+                recognized.append(token)
+
+        # 中文按 1-3 个字组成一个词，英文一个单词一个词
+        pos = 0
+        sentence_words = []
+        while pos < len(recognized):
+            size = 1 if recognized[pos][0].isascii() else rng.randint(1, 3)
+            group = recognized[pos:pos + size]
+            if any(token[0].isascii() for token in group):
+                group = recognized[pos:pos + 1]
+            word = join_tokens(group)
+            duration = max(1, len(word.replace(" ", ""))) * seconds_per_char
+            sentence_words.append({"word": word, "start": cursor, "end": cursor + duration})
+            cursor += duration
+            pos += len(group)
+
+        # 每个识别段落 5-20 个词
+        pos = 0
+        while pos < len(sentence_words):
+            chunk = sentence_words[pos:pos + rng.randint(5, 20)]
+            segments.append({
+                "start": chunk[0]["start"],
+                "end": chunk[-1]["end"],
+                "text": join_tokens([word["word"] for word in chunk]),
+            })
+            pos += len(chunk)
+
+        words.extend(sentence_words)
+        truth.append({"start": sentence_start, "end": max(cursor, sentence_start), "text": sentence.strip()})
+        cursor += 0.4
+    return segments, words, truth
+
+
+def make_recognized_words(sentences: List[str], error_rate: float = 0.05, seed: int = 1, seconds_per_char: float = 0.25) -> List[Dict]:
+    """
+    由用户句子生成模拟的 Whisper 词级结果：按 1-4 个字切词，并按 error_rate 随机替换、丢弃或插入字符
+    """
+    rng = random.Random(seed)
+    words = []
+    time_cursor = 0.0
+    for sentence in sentences:
+        chars = []
+        for char in txt2srt.remove_punctuation(sentence):
+            roll = rng.random()
+            if roll < error_rate / 3:
+                chars.append(rng.choice(COMMON_HANZI))  # 替换
+            elif roll < error_rate * 2 / 3:
+                continue  # 丢弃
+            elif roll < error_rate:
+                chars.extend([char, rng.choice(COMMON_HANZI)])  # 插入
+            else:
+                chars.append(char)
+        pos = 0
+        while pos < len(chars):
+            size = rng.randint(1, 4)
+            word = ''.join(chars[pos:pos + size])
+            duration = len(word) * seconds_per_char
+            words.append({"word": word, "start": time_cursor, "end": time_cursor + duration})
+            time_cursor += duration
+            pos += size
+        time_cursor += 0.4
+    return words
+
+
+# ---------------------------------------------------------------------------
+# 基准测试套件
+# ---------------------------------------------------------------------------
+
+def measure(func: Callable, make_args: Callable[[], tuple], repeat: int = 3) -> Dict:
+    """
+    测量函数耗时（repeat 次取最小值）和峰值内存（单独运行一次，tracemalloc 统计）
+
+    每次运行前重新调用 make_args 准备参数（参数准备不计时），函数的打印输出被丢弃。
+    """
+    times = []
+    for _ in range(max(1, repeat)):
+        args = make_args()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+
+    args = make_args()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(times),
+        "seconds_all": times,
+        "peak_kb": (peak - baseline) / 1024,
+    }
+
+
+def build_cases(kind: str, n_chars: int, error_rate: float, engines, max_chars: int = 30, seed: int = 0):
+    """
+    为一种语料和规模生成所有测试用例 [(名称, 函数, 参数生成函数), ...]
+    """
+    text = make_corpus(kind, n_chars, seed=seed)
+    sentences = txt2srt.split_text_into_segments(text, max_chars)
+    segments, words, _ = make_recognized(sentences, error_rate=error_rate, seed=seed + 1)
+    # 没有句末标点的长句（测试逗号切分）和没有任何标点的长句（测试按字数切分）
+    long_sentence = re.sub(r"[。！？；.!?;\n]", "，", text)
+    unpunctuated = re.sub(r"[%s\n]" % re.escape(PUNCTUATION), "", text)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cues = txt2srt.match_user_text_to_timestamps(segments, sentences, engine=engines[0] if engines else "banded")
+    cue_dicts = cues.to_dicts()
+
+    srt_dir = tempfile.mkdtemp(prefix="txt2srt_bench_")
+    srt_path = os.path.join(srt_dir, "bench.srt")
+
+    cases = [
+        ("split_text_into_segments", txt2srt.split_text_into_segments, lambda: (text, max_chars)),
+        ("_split_long_sentence", txt2srt._split_long_sentence, lambda: (long_sentence, max_chars)),
+        ("_force_split_by_chars", txt2srt._force_split_by_chars, lambda: (unpunctuated, max_chars)),
+    ]
+    for engine in engines:
+        cases.append((
+            f"match_user_text_to_timestamps[{engine}]",
+            txt2srt.match_user_text_to_timestamps,
+            lambda engine=engine: (segments, sentences, engine),
+        ))
+    cases += [
+        ("align_user_text_with_timestamps", txt2srt.align_user_text_with_timestamps, lambda: (sentences, words)),
+        ("fix_overlapping_timestamps", txt2srt.fix_overlapping_timestamps, lambda: (cues.copy(),)),
+        ("optimize_subtitle_duration", txt2srt.optimize_subtitle_duration, lambda: (cues.copy(),)),
+        ("optimize_subtitle_duration[dicts]", txt2srt.optimize_subtitle_duration, lambda: ([dict(cue) for cue in cue_dicts],)),
+        ("generate_srt", txt2srt.generate_srt, lambda: (cues, srt_path)),
+    ]
+    return cases, srt_dir
+
+
+def run_suite(kinds=CORPUS_KINDS, sizes=DEFAULT_SIZES, engines=DEFAULT_ENGINES, error_rate: float = 0.05,
+              repeat: int = 3, only: Optional[str] = None, progress: bool = True) -> Dict:
+    """
+    运行整个基准测试套件
+
+    Args:
+        kinds: 语料类型
+        sizes: 语料规模（字符数）
+        engines: 参与测试的字符匹配引擎
+        error_rate: 模拟识别结果的错误率
+        repeat: 每个用例的计时次数（取最小值）
+        only: 只运行名称包含该字符串的用例
+
+    Returns:
+        {"meta": {...}, "results": [{"key", "name", "corpus", "chars", "seconds", "seconds_all", "peak_kb"}, ...]}
+    """
+    results = []
+    for kind in kinds:
+        for n_chars in sizes:
+            cases, srt_dir = build_cases(kind, n_chars, error_rate, list(engines))
+            try:
+                for name, func, make_args in cases:
+                    if only and only not in name:
+                        continue
+                    key = f"{name}/{kind}/{n_chars}"
+                    result = measure(func, make_args, repeat)
+                    result.update({"key": key, "name": name, "corpus": kind, "chars": n_chars})
+                    results.append(result)
+                    if progress:
+                        print(f"   {key:<56} {result['seconds'] * 1000:10.2f} ms {result['peak_kb']:10.1f} KB", file=sys.stderr)
+            finally:
+                for name in os.listdir(srt_dir):
+                    os.remove(os.path.join(srt_dir, name))
+                os.rmdir(srt_dir)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "error_rate": error_rate,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float = 0.25,
+                        min_seconds: float = 0.001, min_kb: float = 64.0) -> List[Dict]:
+    """
+    与基线比较，返回每个用例的比较结果
+
+    耗时或峰值内存超过基线的 (1 + tolerance) 倍记为退化；
+    差值小于 min_seconds / min_kb 的波动不计（避免计时噪声误报）。
+    端到端结果还比较开始时间误差（增加超过 50ms 且超过 tolerance 记为退化），
+    有配对不上或顺序错误的字幕时无论基线如何都记为退化（缺少或多出的字幕不计入误差）。
+    """
+    previous = {result["key"]: result for result in baseline.get("results", [])}
+    comparisons = []
+    for result in report["results"]:
+        old = previous.get(result["key"])
+        if old is None:
+            continue
+        time_ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        memory_ratio = result["peak_kb"] / old["peak_kb"] if old["peak_kb"] > 0 else float("inf")
+        slower = time_ratio > 1 + tolerance and result["seconds"] - old["seconds"] > min_seconds
+        bigger = memory_ratio > 1 + tolerance and result["peak_kb"] - old["peak_kb"] > min_kb
+        less_accurate = False
+        if "start_mae" in result and "start_mae" in old:
+            less_accurate = result["start_mae"] > old["start_mae"] * (1 + tolerance) and result["start_mae"] - old["start_mae"] > 0.05
+        comparisons.append({
+            "key": result["key"],
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "misaligned": misaligned(result),
+            "regressed": slower or bigger or less_accurate or misaligned(result) > 0,
+        })
+    return comparisons
+
+
+def print_report(report: Dict, comparisons: Optional[List[Dict]] = None):
+    by_key = {comparison["key"]: comparison for comparison in comparisons or []}
+    header = f"{'用例':<56} {'耗时(ms)':>10} {'峰值(KB)':>10}"
+    if comparisons is not None:
+        header += f" {'耗时比':>8} {'内存比':>8}"
+    print(header)
+    for result in report["results"]:
+        line = f"{result['key']:<56} {result['seconds'] * 1000:10.2f} {result['peak_kb']:10.1f}"
+        comparison = by_key.get(result["key"])
+        if comparison is not None:
+            mark = "  ❌" if comparison["regressed"] else ""
+            line += f" {comparison['time_ratio']:7.2f}x {comparison['memory_ratio']:7.2f}x{mark}"
+        elif comparisons is not None:
+            line += f" {'(新)':>8}"
+        print(line)
+
+
+# ---------------------------------------------------------------------------
+# 滑动窗口匹配：原始实现 vs 增量计数
+# ---------------------------------------------------------------------------
+
+def _reference_best_word_window(user_sentence: str, words_with_time: List[Dict], current_idx: int,
+                                min_window: int, max_window: int) -> Tuple[float, Optional[Tuple[int, int]]]:
+    """
+    原始实现：每个窗口重新拼接文本并调用 calculate_similarity（用于校验结果和对比耗时）
+    """
+    total_words = len(words_with_time)
+    best_score = 0
+    best_window = None
+    for window_size in range(min_window, max_window + 1):
+        for start_offset in range(-3, 4):
+            start_idx = current_idx + start_offset
+            end_idx = start_idx + window_size
+            if start_idx < 0 or end_idx > total_words:
+                continue
+            window_text = ""
+            for i in range(start_idx, end_idx):
+                window_text += txt2srt.remove_punctuation(words_with_time[i]["word"].strip())
+            similarity = txt2srt.calculate_similarity(user_sentence, window_text)
+            if similarity > best_score:
+                best_score = similarity
+                best_window = (start_idx, end_idx)
+    return best_score, best_window
+
+
+def _window_queries(sentences: List[str], words: List[Dict]):
+    """
+    按 align_user_text_with_timestamps 的方式为每个句子生成窗口查询
+    （为了让两种实现看到同样的查询，这里按字数比例推进当前词位置）
+    """
+    total_chars = sum(len(txt2srt.remove_punctuation(sentence)) for sentence in sentences)
+    consumed = 0
+    for sentence in sentences:
+        user_clean = txt2srt.remove_punctuation(sentence)
+        if not user_clean:
+            continue
+        current_idx = min(len(words) - 1, consumed * len(words) // total_chars)
+        consumed += len(user_clean)
+        estimated_words = max(5, int(len(user_clean) / 2.5))
+        min_window = max(3, int(estimated_words * 0.5))
+        max_window = min(int(estimated_words * 2), len(words) - current_idx)
+        yield sentence, user_clean, current_idx, min_window, max_window
+
+
+def bench_sliding_window(n_chars: int = 5000, sentence_chars=(8, 60), error_rate: float = 0.05) -> Dict:
+    """
+    对比滑动窗口匹配的两种实现：原始逐窗口计算 vs 增量字符计数（_best_word_window）
+
+    Returns:
+        {"chars", "sentences", "reference_seconds", "incremental_seconds", "speedup", "mismatches"}
+    """
+    sentences = make_chinese_text(n_chars, sentence_chars=sentence_chars)
+    words = make_recognized_words(sentences, error_rate=error_rate)
+    clean_words = [txt2srt.remove_punctuation(word["word"]) for word in words]
+    queries = list(_window_queries(sentences, words))
+
+    start = time.perf_counter()
+    reference = [
+        _reference_best_word_window(sentence, words, current_idx, min_window, max_window)
+        for sentence, _, current_idx, min_window, max_window in queries
+    ]
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    incremental = [
+        txt2srt._best_word_window(user_clean, clean_words, current_idx, min_window, max_window)
+        for _, user_clean, current_idx, min_window, max_window in queries
+    ]
+    incremental_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for old, new in zip(reference, incremental) if old != new)
+    return {
+        "chars": n_chars,
+        "sentences": len(queries),
+        "reference_seconds": reference_seconds,
+        "incremental_seconds": incremental_seconds,
+        "speedup": reference_seconds / incremental_seconds if incremental_seconds > 0 else float("inf"),
+        "mismatches": mismatches,
+    }
+
+
+# ---------------------------------------------------------------------------
+# DTW 回归检查：带状DTW与完整矩阵DTW（dtw-python）的路径是否一致
+# ---------------------------------------------------------------------------
+
+DTW_CASE_KINDS = ("drop", "insert", "drop+insert", "chorus")
+
+
+def make_dtw_case(kind: str, n_chars: int, seed: int = 0, error_rate: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成最优路径远离对角线的用户/识别字符序列
+
+    - drop: 识别结果缺了一整段（50-400 字，如讲者跳过了一段文稿）
+    - insert: 识别结果多出一段文稿里没有的内容
+    - drop+insert: 两者都有
+    - chorus: 文稿中同一段落重复出现（如歌词副歌），锚点很少，再缺一段
+    """
+    rng = random.Random(seed)
+    user = list(txt2srt.remove_punctuation(make_corpus("zh", n_chars, seed=seed)))
+    if kind == "chorus":
+        user = user[:n_chars // 3] * 3
+
+    recognized = [rng.choice(COMMON_HANZI) if rng.random() < error_rate else char for char in user]
+    if kind in ("drop", "drop+insert", "chorus"):
+        length = rng.randint(50, min(400, len(recognized) // 3))
+        start = rng.randint(0, len(recognized) - length)
+        del recognized[start:start + length]
+    if kind in ("insert", "drop+insert"):
+        position = rng.randint(0, len(recognized))
+        recognized[position:position] = [rng.choice(COMMON_HANZI) for _ in range(rng.randint(20, 300))]
+    return txt2srt.text_to_codes(''.join(user)), txt2srt.text_to_codes(''.join(recognized))
+
+
+def check_dtw(n_chars: int = 3000, trials: int = 4, seed: int = 0) -> Dict:
+    """
+    在每类用例上比较带状DTW和完整矩阵DTW的路径与代价（完整矩阵占用 O(n·m) 内存，n_chars 不宜过大）
+
+    Returns:
+        {"cases": [{"kind", "seed", "user_chars", "recognized_chars", "banded_cost", "full_cost",
+                    "same_path", "banded_seconds", "full_seconds"}, ...], "mismatches"}
+    """
+    from dtw import dtw
+
+    cases = []
+    for kind in DTW_CASE_KINDS:
+        for trial in range(trials):
+            case_seed = seed + trial
+            user, recognized = make_dtw_case(kind, n_chars, seed=case_seed)
+            total = len(user) + len(recognized)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                index1, index2, banded_distance = txt2srt.banded_dtw(user, recognized)
+            banded_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            alignment = dtw((user[:, None] != recognized[None, :]).astype(np.float64))
+            full_seconds = time.perf_counter() - start
+
+            cases.append({
+                "kind": kind,
+                "seed": case_seed,
+                "user_chars": len(user),
+                "recognized_chars": len(recognized),
+                "banded_cost": round(banded_distance * total),
+                "full_cost": round(alignment.normalizedDistance * total),
+                "same_path": bool(np.array_equal(index1, alignment.index1) and np.array_equal(index2, alignment.index2)),
+                "banded_seconds": banded_seconds,
+                "full_seconds": full_seconds,
+            })
+    mismatches = sum(1 for case in cases if not case["same_path"] or case["banded_cost"] != case["full_cost"])
+    return {"cases": cases, "mismatches": mismatches}
+
+
+# ---------------------------------------------------------------------------
+# 端到端基准测试：模拟识别后端 + 完整对齐流程
+# ---------------------------------------------------------------------------
+
+DEFAULT_DURATIONS = (60, 600, 3600)
+E2E_PIPELINES = ("banded", "anchor", "lcs", "full", "forced", "draft", "whisperx", "whisperx-noasr")
+DEFAULT_PIPELINES = ("banded", "anchor", "forced", "whisperx", "whisperx-noasr")
+
+
+def timing_errors(cues, truth: List[Dict]) -> Dict:
+    """
+    对比字幕与真实句子时间：按文本配对（同一文本第 k 次出现的字幕对应第 k 次出现的句子），
+    统计开始/结束时间的平均绝对误差和 95 分位误差
+
+    配对不上的句子和多出的字幕记为 unmatched；字幕顺序与文稿不一致时，
+    需要移动位置的最少字幕数（配对数 - 最长递增子序列长度）记为 out_of_order。
+    误差按所有配对的字幕统计，包括顺序错误的字幕。
+    """
+    cues = [dict(cue) for cue in cues]
+    positions = {}
+    for index, sentence in enumerate(truth):
+        positions.setdefault(sentence["text"], []).append(index)
+    start_errors, end_errors, order = [], [], []
+    for cue in cues:
+        queue = positions.get(cue["text"])
+        if not queue:
+            continue
+        index = queue.pop(0)
+        start_errors.append(abs(cue["start"] - truth[index]["start"]))
+        end_errors.append(abs(cue["end"] - truth[index]["end"]))
+        order.append(index)
+    # 最长递增子序列（按字幕顺序的句子下标）
+    tails = []
+    for index in order:
+        k = bisect.bisect_left(tails, index)
+        tails[k:k + 1] = [index]
+    result = {
+        "matched": len(order),
+        "sentences": len(truth),
+        "unmatched": (len(truth) - len(order)) + (len(cues) - len(order)),
+        "out_of_order": len(order) - len(tails),
+    }
+    if start_errors:
+        result.update({
+            "start_mae": float(np.mean(start_errors)),
+            "start_p95": float(np.percentile(start_errors, 95)),
+            "end_mae": float(np.mean(end_errors)),
+        })
+    return result
+
+
+def misaligned(result: Dict) -> int:
+    """
+    端到端结果中配对不上或顺序错误的字幕数（文本算法用例为 0）
+    """
+    return result.get("unmatched", 0) + result.get("out_of_order", 0)
+
+
+def _run_e2e_case(case: Dict) -> Dict:
+    """
+    在独立的子进程中运行一次完整对齐（峰值内存互不影响）
+    """
+    from txt2srt_stubasr import StubASR
+
+    asr = StubASR(error_rate=case["error_rate"], jitter=case["jitter"], seed=case["seed"])
+    asr.add(case["audio"], case["script"])
+    pipeline = case["pipeline"]
+    report = AlignmentReport(case["audio"], engine=pipeline, model="stub")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if pipeline.startswith("whisperx"):
+            import txt2srt_whisperx
+            from txt2srt_stubasr import StubWhisperXBackend
+
+            aligner = txt2srt_whisperx.WhisperXAligner(use_gpu=False, backend=StubWhisperXBackend(asr))
+            cues = txt2srt_whisperx.align_audio_text_whisperx(
+                case["audio"], case["text"], max_chars=case["max_chars"], aligner=aligner,
+                skip_asr=pipeline == "whisperx-noasr", report=report
+            )
+            module = txt2srt_whisperx
+        else:
+            from txt2srt_models import register_asr_backend
+
+            register_asr_backend("stub", lambda device, compute_type: asr)
+            cues = txt2srt.align_audio_text(
+                case["audio"], case["text"], model_name="stub", use_gpu=False, max_chars=case["max_chars"],
+                engine=pipeline, use_cache=False, report=report
+            )
+            module = txt2srt
+        with report.stage("write_srt"):
+            module.generate_srt(cues, case["srt"])
+    report.finish(cues)
+
+    result = {
+        "seconds": report.wall_seconds,
+        "cpu_seconds": report.cpu_seconds,
+        "stages": {stage["name"]: stage["wall_seconds"] for stage in report.stages},
+        "peak_rss_mb": report.peak_rss_mb,
+        "peak_kb": (report.to_dict()["rss_growth_mb"] or 0.0) * 1024,
+        "cues": len(cues),
+        "match_rate": report.match_rate,
+    }
+    result.update(timing_errors(cues, case["script"].sentences))
+    return result
+
+
+def run_e2e(durations=DEFAULT_DURATIONS, pipelines=DEFAULT_PIPELINES, kind: str = "zh", error_rate: float = 0.05,
+            jitter: float = 0.05, max_chars: int = 30, workdir: Optional[str] = None, seed: int = 0) -> Dict:
+    """
+    端到端基准测试：生成测试音频和文稿，用模拟识别后端跑完整对齐流程
+
+    每个用例在单独的子进程中运行，报告总耗时、各阶段耗时、峰值内存增量和时间戳误差。
+
+    Args:
+        durations: 音频时长（秒）
+        pipelines: 对齐流程（txt2srt.py 的匹配引擎名，或 whisperx / whisperx-noasr）
+        kind: 语料类型
+        error_rate / jitter: 模拟识别结果的错误率和时间抖动（秒）
+        workdir: 测试音频和输出字幕的目录（默认临时目录，结束后删除）
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import shutil
+    from txt2srt_stubasr import SpeechScript, write_tone_wav
+
+
+    keep_workdir = workdir is not None
+    workdir = workdir or tempfile.mkdtemp(prefix="txt2srt_e2e_")
+    os.makedirs(workdir, exist_ok=True)
+
+    # 估算每秒音频对应的字符数，使生成的音频接近目标时长
+    probe = make_corpus(kind, 2000, seed=seed)
+    probe_script = SpeechScript.build(txt2srt.split_text_into_segments(probe, max_chars), seed=seed)
+    chars_per_second = len(probe) / probe_script.duration
+
+    results = []
+    try:
+        for duration in durations:
+            text = make_corpus(kind, int(duration * chars_per_second), seed=seed)
+            script = SpeechScript.build(txt2srt.split_text_into_segments(text, max_chars), seed=seed)
+            name = f"e2e_{kind}_{duration}"
+            audio_path = os.path.join(workdir, name + ".wav")
+            write_tone_wav(script, audio_path)
+            print(f"   🎵 {audio_path}: {script.duration / 60:.1f} 分钟, {len(text)} 字, {len(script.sentences)} 句", file=sys.stderr)
+
+            for pipeline in pipelines:
+                case = {
+                    "pipeline": pipeline, "audio": audio_path, "text": text, "script": script,
+                    "srt": os.path.join(workdir, f"{name}.{pipeline}.srt"), "max_chars": max_chars,
+                    "error_rate": error_rate, "jitter": jitter, "seed": seed,
+                }
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    try:
+                        result = executor.submit(_run_e2e_case, case).result()
+                    except Exception as e:
+                        print(f"   ❌ {pipeline}/{duration}: {e}", file=sys.stderr)
+                        continue
+                result.update({
+                    "key": f"e2e/{pipeline}/{kind}/{duration}",
+                    "pipeline": pipeline,
+                    "corpus": kind,
+                    "audio_seconds": script.duration,
+                    "rtf": result["seconds"] / script.duration,
+                })
+                results.append(result)
+                print(f"   {result['key']:<40} {result['seconds']:8.2f} s  误差 {result.get('start_mae', float('nan')) * 1000:6.0f} ms", file=sys.stderr)
+    finally:
+        if not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "error_rate": error_rate,
+            "jitter": jitter,
+        },
+        "results": results,
+    }
+
+
+def print_e2e_report(report: Dict, comparisons: Optional[List[Dict]] = None):
+    by_key = {comparison["key"]: comparison for comparison in comparisons or []}
+    stage_names = []
+    for result in report["results"]:
+        stage_names += [stage for stage in result["stages"] if stage not in stage_names]
+
+    header = (f"{'用例':<36} {'音频(分)':>8} {'总耗时(s)':>9} {'RTF':>8} {'内存+(MB)':>9} {'开始误差(ms)':>12} {'P95(ms)':>8}"
+              f" {'未配对':>6} {'乱序':>6}")
+    header += "".join(f" {stage:>12}" for stage in stage_names)
+    print(header)
+    for result in report["results"]:
+        line = (f"{result['key']:<36} {result['audio_seconds'] / 60:8.1f} {result['seconds']:9.2f} {result['rtf']:8.4f} "
+                f"{result['peak_kb'] / 1024:9.1f} {result.get('start_mae', float('nan')) * 1000:12.0f} "
+                f"{result.get('start_p95', float('nan')) * 1000:8.0f} {result.get('unmatched', 0):6d} {result.get('out_of_order', 0):6d}")
+        line += "".join(f" {result['stages'].get(stage, 0.0):12.3f}" for stage in stage_names)
+        comparison = by_key.get(result["key"])
+        if comparison is not None:
+            line += f"  {comparison['time_ratio']:.2f}x" + ("  ❌" if comparison["regressed"] else "")
+        print(line)
+
+
+# ---------------------------------------------------------------------------
+# 冷启动：python -X importtime
+# ---------------------------------------------------------------------------
+
+STARTUP_MODULES = ("txt2srt", "txt2srt_whisperx")
+STARTUP_COMMANDS = (("txt2srt.py", "--help"), ("txt2srt_whisperx.py", "--help"))
+# 这些模块只能在对应的引擎真正运行时导入（导入模块或 --help 时不应出现）
+HEAVY_MODULES = ("dtw", "scipy", "torch", "whisper", "stable_whisper", "whisperx", "faster_whisper",
+                 "ctranslate2", "transformers", "gradio")
+DEFAULT_IMPORT_BUDGET_MS = 250.0
+DEFAULT_COMMAND_BUDGET_MS = 600.0
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    解析 -X importtime 的输出，返回 [(模块名, 层级, 自身耗时us, 累计耗时us), ...]
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((match.group(4), len(match.group(3)) // 2, int(match.group(1)), int(match.group(2))))
+    return entries
+
+
+def measure_import(module: str, repeat: int = 5) -> Dict:
+    """
+    在全新的子进程中导入模块，返回累计导入耗时（多次取最小值）、最慢的子模块和导入的重量级模块
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=here, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+        entries = parse_importtime(completed.stderr)
+        total = next((cumulative for name, level, _, cumulative in entries if name == module and level == 0), 0)
+        if best is None or total < best["total_us"]:
+            best = {"total_us": total, "entries": entries}
+
+    # 被导入模块的直接依赖中耗时最多的几个
+    children = [(name, cumulative) for name, level, _, cumulative in best["entries"] if level == 1]
+    children.sort(key=lambda item: item[1], reverse=True)
+    loaded = {name.split(".")[0] for name, _, _, _ in best["entries"]}
+    return {
+        "module": module,
+        "ms": best["total_us"] / 1000,
+        "top": [{"module": name, "ms": cumulative / 1000} for name, cumulative in children[:5]],
+        "heavy": sorted(loaded & set(HEAVY_MODULES)),
+    }
+
+
+def measure_command(script: str, *args: str, repeat: int = 5) -> Dict:
+    """
+    运行命令行（如 txt2srt.py --help）的墙钟时间，多次取最小值
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, script, *args], cwd=here, capture_output=True)
+        timings.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            return {"command": " ".join((script,) + args), "error": completed.stderr.decode(errors="replace").strip()[-200:]}
+    return {"command": " ".join((script,) + args), "ms": min(timings) * 1000}
+
+
+def startup_main(args) -> int:
+    """
+    冷启动检查：导入耗时和命令行 --help 耗时超过预算、或过早导入重量级模块时返回 1
+    """
+    failures = 0
+    print(f"🏁 冷启动检查（导入预算 {args.import_budget:.0f} ms，命令预算 {args.command_budget:.0f} ms）")
+    results = {"imports": [], "commands": []}
+    for module in STARTUP_MODULES:
+        result = measure_import(module, repeat=args.repeat)
+        results["imports"].append(result)
+        if "error" in result:
+            print(f"   ❌ import {module}: {result['error']}")
+            failures += 1
+            continue
+        ok = result["ms"] <= args.import_budget and not result["heavy"]
+        failures += not ok
+        top = ", ".join(f"{item['module']} {item['ms']:.0f}" for item in result["top"])
+        print(f"   {'✅' if ok else '❌'} import {module:<20} {result['ms']:7.1f} ms   ({top})")
+        if result["heavy"]:
+            print(f"      导入了重量级模块: {', '.join(result['heavy'])}")
+    for command in STARTUP_COMMANDS:
+        result = measure_command(*command, repeat=args.repeat)
+        results["commands"].append(result)
+        if "error" in result:
+            print(f"   ❌ {result['command']}: {result['error']}")
+            failures += 1
+            continue
+        ok = result["ms"] <= args.command_budget
+        failures += not ok
+        print(f"   {'✅' if ok else '❌'} {result['command']:<27} {result['ms']:7.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"📄 结果已保存: {args.output}")
+    return 1 if failures else 0
+
+
+def window_main(args) -> int:
+    result = bench_sliding_window(args.chars, sentence_chars=(8, args.max_sentence_chars))
+    print(f"滑动窗口匹配（{result['chars']} 字, {result['sentences']} 句）")
+    print(f"   原始实现:     {result['reference_seconds'] * 1000:9.1f} ms")
+    print(f"   增量计数实现: {result['incremental_seconds'] * 1000:9.1f} ms")
+    print(f"   加速比:       {result['speedup']:9.1f}x")
+    if result["mismatches"]:
+        print(f"❌ {result['mismatches']} 个句子的最佳窗口与原始实现不一致")
+        return 1
+    print("✅ 所有句子的最佳窗口与原始实现一致")
+    return 0
+
+
+def dtw_main(args) -> int:
+    print(f"🏁 DTW 回归检查: 每类 {args.trials} 个用例，约 {args.chars} 字（对照: dtw-python 完整矩阵）")
+    result = check_dtw(args.chars, trials=args.trials)
+    for case in result["cases"]:
+        ok = case["same_path"] and case["banded_cost"] == case["full_cost"]
+        print(f"   {'✅' if ok else '❌'} {case['kind']:<12} seed={case['seed']:<3} "
+              f"{case['user_chars']:>5}×{case['recognized_chars']:<5} 代价 {case['banded_cost']:>5} / {case['full_cost']:<5} "
+              f"带状 {case['banded_seconds'] * 1000:7.1f} ms, 完整 {case['full_seconds'] * 1000:7.1f} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"📄 结果已保存: {args.output}")
+    if result["mismatches"]:
+        print(f"❌ {result['mismatches']} 个用例的带状DTW路径与完整矩阵DTW不一致")
+        return 1
+    print("✅ 所有用例的带状DTW路径与完整矩阵DTW一致")
+    return 0
+
+
+def suite_main(args) -> int:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    kinds = args.corpus.split(",")
+    engines = args.engines.split(",")
+    print(f"🏁 基准测试: 语料 {kinds}, 规模 {sizes}, 引擎 {engines}", file=sys.stderr)
+    report = run_suite(kinds, sizes, engines, error_rate=args.error_rate, repeat=args.repeat, only=args.only)
+    return _finish(report, args, print_report)
+
+
+def e2e_main(args) -> int:
+    durations = [int(duration) for duration in args.durations.split(",")]
+    pipelines = args.pipelines.split(",")
+    for pipeline in pipelines:
+        if pipeline not in E2E_PIPELINES:
+            print(f"❌ 未知的对齐流程: {pipeline}（可选: {', '.join(E2E_PIPELINES)}）")
+            return 2
+    kind = args.corpus.split(",")[0]
+    print(f"🏁 端到端基准测试: 语料 {kind}, 时长 {durations} 秒, 流程 {pipelines}", file=sys.stderr)
+    report = run_e2e(durations, pipelines, kind, error_rate=args.error_rate, jitter=args.jitter, workdir=args.workdir)
+    return _finish(report, args, print_e2e_report)
+
+
+def _finish(report: Dict, args, printer) -> int:
+    """
+    打印结果、保存 JSON、与基线比较（suite 和 e2e 共用）
+    """
+    comparisons = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            comparisons = compare_to_baseline(report, json.load(f), tolerance=args.tolerance)
+
+    printer(report, comparisons)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 结果已保存: {args.output}")
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 基线已更新: {args.baseline}")
+
+    # 字幕配对不上或顺序错误时误差不能反映全部字幕，不需要基线也算失败
+    broken = [result for result in report["results"] if misaligned(result)]
+    for result in broken:
+        print(f"❌ {result['key']}: {result.get('unmatched', 0)} 条字幕与文稿配不上，{result.get('out_of_order', 0)} 条顺序错误")
+
+    if comparisons:
+        regressed = [comparison for comparison in comparisons if comparison["regressed"] and not comparison["misaligned"]]
+        if regressed:
+            print(f"❌ {len(regressed)} 个用例比基线慢/占用内存多/误差大超过 {args.tolerance:.0%}")
+        if regressed or broken:
+            return 1
+        print(f"✅ 所有用例都在基线的 {args.tolerance:.0%} 以内")
+    return 1 if broken else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="文本算法基准测试（不需要模型）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="python txt2srt_bench.py e2e     用模拟识别后端跑完整对齐流程（测量流程开销和时间戳误差）\n"
+               "python txt2srt_bench.py window  对比滑动窗口匹配的原始实现和增量计数实现\n"
+               "python txt2srt_bench.py dtw     检查带状DTW的路径与完整矩阵DTW一致（缺段/多段/重复段落）\n"
+               "python txt2srt_bench.py startup 检查冷启动（导入耗时、--help 耗时、重量级模块是否延迟导入）"
+    )
+    parser.add_argument("command", nargs="?", choices=["suite", "e2e", "window", "dtw", "startup"], default="suite",
+                        help="suite: 文本算法测试套件（默认）; e2e: 端到端测试; window: 滑动窗口匹配对比; "
+                             "dtw: 带状DTW回归检查; startup: 冷启动检查")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="语料规模（字符数，逗号分隔，默认: 1000,10000,100000）")
+    parser.add_argument("--corpus", default=None,
+                        help="语料类型（逗号分隔，默认: zh,en,mixed；e2e 只用第一个，默认 zh）")
+    parser.add_argument("--engines", default=",".join(DEFAULT_ENGINES),
+                        help="参与测试的匹配引擎（逗号分隔，默认: banded,anchor）")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="模拟识别结果的错误率（默认: 0.05）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例计时次数，取最小值（默认: 3）")
+    parser.add_argument("--only", default=None, help="只运行名称包含该字符串的用例")
+    parser.add_argument("-o", "--output", default=None, help="结果 JSON 输出路径")
+    parser.add_argument("--baseline", default=None, help="基线 JSON 路径（存在时与之比较）")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入 --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的退化比例（默认: 0.25，即慢 25%%）")
+    parser.add_argument("--durations", default=",".join(str(duration) for duration in DEFAULT_DURATIONS),
+                        help="e2e: 测试音频时长（秒，逗号分隔，默认: 60,600,3600；3小时为 10800）")
+    parser.add_argument("--pipelines", default=",".join(DEFAULT_PIPELINES),
+                        help=f"e2e: 对齐流程（逗号分隔，可选: {', '.join(E2E_PIPELINES)}）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="e2e: 模拟识别时间戳的抖动（秒，默认: 0.05）")
+    parser.add_argument("--workdir", default=None, help="e2e: 保存测试音频和输出字幕的目录（默认用完即删的临时目录）")
+    parser.add_argument("--chars", type=int, default=None, help="window / dtw: 合成文本的字数（默认: 5000 / 3000）")
+    parser.add_argument("--trials", type=int, default=4, help="dtw: 每类用例的数量（默认: 4）")
+    parser.add_argument("--max-sentence-chars", type=int, default=60, help="window: 合成句子的最大字数（默认: 60）")
+    parser.add_argument("--import-budget", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help=f"startup: 导入 txt2srt 等模块的耗时预算（毫秒，默认: {DEFAULT_IMPORT_BUDGET_MS:.0f}）")
+    parser.add_argument("--command-budget", type=float, default=DEFAULT_COMMAND_BUDGET_MS,
+                        help=f"startup: 运行 --help 的耗时预算（毫秒，含解释器启动，默认: {DEFAULT_COMMAND_BUDGET_MS:.0f}）")
+    args = parser.parse_args(argv)
+
+    if args.command == "window":
+        args.chars = args.chars or 5000
+        return window_main(args)
+    if args.command == "dtw":
+        args.chars = args.chars or 3000
+        return dtw_main(args)
+    if args.command == "startup":
+        return startup_main(args)
+    if args.command == "e2e":
+        args.corpus = args.corpus or "zh"
+        return e2e_main(args)
+    args.corpus = args.corpus or ",".join(CORPUS_KINDS)
+    return suite_main(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
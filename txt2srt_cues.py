@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+字幕段落容器：开始/结束时间存成 NumPy 数组，文本存成列表
+
+两个对齐引擎共用：
+- 时间修正（去重叠、调整时长、填补空隙）直接在 starts / ends 数组上向量化计算
+- 切片不复制时间数组（NumPy 视图）
+- 下标访问返回与 dict 兼容的视图，UI 和脚本里的 seg['start'] / seg['text'] 写法不用改
+"""
+
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Union
+
+import numpy as np
+
+from txt2srt_timeline import remove_punctuation
+
+
+CUE_KEYS = ("start", "end", "text")
+
+
+class Cue(Mapping):
+    """
+    CueList 中单个字幕的 dict 兼容视图（读写直接作用于所属的 CueList）
+    """
+
+    __slots__ = ("_cues", "_index")
+
+    def __init__(self, cues: "CueList", index: int):
+        self._cues = cues
+        self._index = index
+
+    def __getitem__(self, key: str):
+        if key == "start":
+            return float(self._cues.starts[self._index])
+        if key == "end":
+            return float(self._cues.ends[self._index])
+        if key == "text":
+            return self._cues.texts[self._index]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key == "start":
+            self._cues.starts[self._index] = value
+        elif key == "end":
+            self._cues.ends[self._index] = value
+        elif key == "text":
+            self._cues.texts[self._index] = value
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(CUE_KEYS)
+
+    def __len__(self) -> int:
+        return len(CUE_KEYS)
+
+    def to_dict(self) -> Dict:
+        return {"start": self["start"], "end": self["end"], "text": self["text"]}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class CueList:
+    """
+    字幕段落列表
+
+    Attributes:
+        starts: 开始时间（秒，float64）
+        ends: 结束时间（秒，float64）
+        texts: 字幕文本
+    """
+
+    __slots__ = ("starts", "ends", "texts")
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, texts: List[str]):
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+
+    @classmethod
+    def from_segments(cls, segments: Union["CueList", Iterable[Dict]]) -> "CueList":
+        """
+        由 [{"start", "end", "text"}, ...] 构建（已经是 CueList 时直接返回）
+        """
+        if isinstance(segments, CueList):
+            return segments
+        segments = list(segments)
+        return cls(
+            np.array([segment["start"] for segment in segments], dtype=np.float64),
+            np.array([segment["end"] for segment in segments], dtype=np.float64),
+            [segment["text"] for segment in segments],
+        )
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        转换为普通的 dict 列表（用于 JSON 序列化等）
+        """
+        return [
+            {"start": start, "end": end, "text": text}
+            for start, end, text in zip(self.starts.tolist(), self.ends.tolist(), self.texts)
+        ]
+
+    def copy(self) -> "CueList":
+        return CueList(self.starts.copy(), self.ends.copy(), list(self.texts))
+
+    def sorted_by_start(self) -> "CueList":
+        """
+        按开始时间稳定排序（已有序时不复制）
+        """
+        if len(self) < 2 or np.all(self.starts[1:] >= self.starts[:-1]):
+            return self
+        order = np.argsort(self.starts, kind="stable")
+        return CueList(self.starts[order], self.ends[order], [self.texts[i] for i in order])
+
+    def char_counts(self) -> np.ndarray:
+        """
+        每个字幕的有效字符数（去除标点和空白）
+        """
+        return np.array([len(remove_punctuation(text)) for text in self.texts], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # 时间数组为视图，不复制
+            return CueList(self.starts[index], self.ends[index], self.texts[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("字幕下标超出范围")
+        return Cue(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Cue(self, index)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CueList):
+            other = other.to_dicts()
+        if not isinstance(other, list):
+            return NotImplemented
+        return self.to_dicts() == [dict(segment) for segment in other]
+
+    def __repr__(self) -> str:
+        return f"CueList({self.to_dicts()!r})"
+
+
+def settle_starts(starts: np.ndarray, compute_ends: Callable[[np.ndarray, slice], np.ndarray]) -> np.ndarray:
+    """
+    求解 "每个字幕不早于上一个字幕结束" 的开始时间
+
+    约束是递推的：start[i] = max(原始 start[i], end[i-1])，而 end[i] 又由 start[i] 算出。
+    先整体向量化计算，再只对开始时间发生变化的后缀重新计算，直到不再变化；
+    连锁推迟过长时（字幕大量堆叠在同一时间）改为逐个计算。
+
+    Args:
+        starts: 原始开始时间（已按开始时间排序）
+        compute_ends: compute_ends(当前开始时间, 下标范围) → 该范围内每个字幕的结束时间
+
+    Returns:
+        修正后的结束时间（starts 原地更新为修正后的开始时间）
+    """
+    original = starts.copy()
+    n = len(starts)
+    ends = compute_ends(starts, slice(0, n))
+    lo = 0
+    for _ in range(64):
+        pushed = np.maximum(original[lo + 1:], ends[lo:n - 1])
+        changed = np.flatnonzero(pushed != starts[lo + 1:])
+        if len(changed) == 0:
+            return ends
+        lo = lo + 1 + int(changed[0])
+        starts[lo:] = np.maximum(original[lo:], np.concatenate(([ends[lo - 1]], ends[lo:n - 1])))
+        ends[lo:] = compute_ends(starts, slice(lo, n))
+
+    for i in range(lo, n):
+        starts[i] = max(original[i], ends[i - 1]) if i > 0 else original[i]
+        ends[i] = compute_ends(starts, slice(i, i + 1))[0]
+    return ends
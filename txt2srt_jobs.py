@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+有界任务队列：Web 界面的多个用户共用一组工作线程
+
+- 同时运行的任务数由 workers 决定（模型常驻在进程内，见 txt2srt_models）
+- 排队的任务超过 max_pending 时拒绝新任务，避免请求无限堆积
+- 每个任务可以随时查询排队位置，界面据此显示 "前面还有 N 个任务"
+
+环境变量：
+    TXT2SRT_UI_WORKERS      同时处理的任务数（默认 1）
+    TXT2SRT_UI_QUEUE_SIZE   最多排队的任务数（默认 16）
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class QueueFull(Exception):
+    """
+    排队任务数已达上限
+    """
+
+
+class Job:
+    """
+    队列中的一个任务
+
+    Attributes:
+        id: 任务ID
+        status: queued / running / done / failed / cancelled
+        result: 函数返回值（status 为 done 时）
+        error: 函数抛出的异常（status 为 failed 时）
+    """
+
+    def __init__(self, func: Callable, args: tuple, kwargs: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待任务结束，返回是否已结束
+        """
+        return self._done.wait(timeout)
+
+    def get(self):
+        """
+        等待任务结束并返回结果（任务失败时重新抛出异常）
+        """
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _run(self):
+        self.status = "running"
+        self.started = time.time()
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+            self.status = "done"
+        except BaseException as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            self.finished = time.time()
+            self.func = self.args = self.kwargs = None
+            self._done.set()
+
+    def __repr__(self) -> str:
+        return f"Job({self.id}, {self.status})"
+
+
+class JobQueue:
+    """
+    先进先出的有界任务队列 + 固定数量的工作线程（线程在第一次提交任务时启动）
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 16):
+        """
+        Args:
+            workers: 同时运行的任务数
+            max_pending: 最多排队（尚未开始）的任务数
+        """
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self._pending = deque()
+        self._running = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            workers=int(os.environ.get("TXT2SRT_UI_WORKERS", 1)),
+            max_pending=int(os.environ.get("TXT2SRT_UI_QUEUE_SIZE", 16)),
+        )
+
+    def submit(self, func: Callable, *args, **kwargs) -> Job:
+        """
+        提交任务，排队已满时抛出 QueueFull
+        """
+        job = Job(func, args, kwargs)
+        with self._condition:
+            # 空闲的工作线程会立即取走任务，不占排队名额
+            if len(self._pending) >= self.max_pending + self.workers - self._running:
+                self.rejected += 1
+                raise QueueFull(f"排队任务已达上限（{self.max_pending} 个）")
+            self._pending.append(job)
+            self._start_workers()
+            self._condition.notify()
+        return job
+
+    def position(self, job: Job) -> int:
+        """
+        排队位置：1 表示下一个开始，0 表示已开始或已结束
+        """
+        with self._condition:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def cancel(self, job: Job) -> bool:
+        """
+        取消尚未开始的任务（例如用户关闭了页面），返回是否取消成功
+        """
+        with self._condition:
+            try:
+                self._pending.remove(job)
+            except ValueError:
+                return False
+        job.status = "cancelled"
+        job._done.set()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def _start_workers(self):
+        """
+        启动工作线程（调用方需持有锁；守护线程，不阻止进程退出）
+        """
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"txt2srt-worker-{len(self._threads) + 1}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                job = self._pending.popleft()
+                self._running += 1
+            try:
+                job._run()
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    if job.status == "done":
+                        self.completed += 1
+                    else:
+                        self.failed += 1
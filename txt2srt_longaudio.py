@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+长音频分块识别：内存占用与音频总时长无关，并支持断点续跑
+
+流程：
+1. 在目标切分点附近解码一小段音频，用 VAD 找到静音处作为切分点
+2. 每块单独用 ffmpeg 解码（带少量重叠）并识别，识别完成后立即写入检查点文件
+   （最后一块一直解码到文件末尾，探测到的时长偏短时也不会漏掉结尾）
+3. 按全局偏移拼接各块的段落时间轴，重叠区只保留中点落在本块范围内的段落
+4. 任务中断后重新运行，会跳过已有检查点的块
+"""
+
+import os
+import re
+import json
+import subprocess
+from typing import List, Dict, Iterator, Optional
+
+import numpy as np
+
+from txt2srt_models import acquire_inference
+from txt2srt_report import stage
+
+
+SAMPLE_RATE = 16000
+
+# 本模块在检查点目录中写入的文件（清理时只删除这些，目录可能是用户指定的）
+CHECKPOINT_FILE_PATTERN = re.compile(r"^(plan|chunk_\d+)\.json(\.tmp)?$")
+
+
+def load_audio_range(audio_path: str, start: float, duration: Optional[float]) -> np.ndarray:
+    """
+    用 ffmpeg 只解码 [start, start + duration) 这一段音频（16kHz 单声道 float32）
+
+    duration 为 None 时解码到文件末尾
+    """
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-ss", f"{max(0.0, start):.3f}"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-i", audio_path, "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError("解码音频需要 ffmpeg，请先安装并加入 PATH")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg 解码失败: {e.stderr.decode(errors='ignore')}")
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def find_silence(samples: np.ndarray) -> float:
+    """
+    在一段音频中找到最适合切分的静音位置，返回相对于这段音频开头的秒数
+
+    优先使用 faster-whisper 自带的 Silero VAD（选最长的静音段中点），
+    不可用时退化为 NumPy 能量检测（选能量最低的 100ms 帧）。
+    """
+    if len(samples) == 0:
+        return 0.0
+
+    try:
+        from faster_whisper.vad import get_speech_timestamps, VadOptions
+        speech = get_speech_timestamps(samples, VadOptions(min_silence_duration_ms=300))
+        # 语音段之间（以及两端）的静音
+        gaps = []
+        prev_end = 0
+        for ts in speech:
+            gaps.append((ts["start"] - prev_end, prev_end, ts["start"]))
+            prev_end = ts["end"]
+        gaps.append((len(samples) - prev_end, prev_end, len(samples)))
+        length, gap_start, gap_end = max(gaps)
+        if length > 0:
+            return (gap_start + gap_end) / 2 / SAMPLE_RATE
+    except ImportError:
+        pass
+
+    frame = SAMPLE_RATE // 10
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return len(samples) / 2 / SAMPLE_RATE
+    energy = np.square(samples[:n_frames * frame].reshape(n_frames, frame)).mean(axis=1)
+    return (int(np.argmin(energy)) + 0.5) * frame / SAMPLE_RATE
+
+
+def plan_chunks(audio_path: str, total_duration: float, chunk_seconds: float = 600.0, search_seconds: float = 30.0) -> List[float]:
+    """
+    规划切分点：在每个目标切分点前后 search_seconds/2 的范围内寻找静音
+
+    Returns:
+        切分点列表 [0, c1, c2, ..., total_duration]
+    """
+    search_seconds = min(search_seconds, chunk_seconds / 4)
+    cuts = [0.0]
+    target = chunk_seconds
+    while target < total_duration - search_seconds:
+        window_start = target - search_seconds / 2
+        samples = load_audio_range(audio_path, window_start, search_seconds)
+        cut = window_start + find_silence(samples)
+        cuts.append(max(cut, cuts[-1] + 1.0))
+        target = cuts[-1] + chunk_seconds
+    cuts.append(total_duration)
+    return cuts
+
+
+def _audio_identity(audio_path: str) -> Dict:
+    """
+    用于判断检查点是否属于同一个音频文件
+    """
+    stat = os.stat(audio_path)
+    return {"path": os.path.abspath(audio_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def _remove_checkpoints(checkpoint_dir: str, remove_dir: bool = False):
+    """
+    删除检查点目录中本模块写入的文件；remove_dir 为 True 时目录变空后一并删除
+    """
+    for name in os.listdir(checkpoint_dir):
+        if CHECKPOINT_FILE_PATTERN.match(name):
+            try:
+                os.remove(os.path.join(checkpoint_dir, name))
+            except FileNotFoundError:
+                pass
+    if remove_dir:
+        try:
+            os.rmdir(checkpoint_dir)
+        except OSError:
+            pass
+
+
+def _write_json_atomic(path: str, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def transcribe_long_audio(
+    model,
+    audio_path: str,
+    transcribe_options: Dict,
+    chunk_seconds: float = 600.0,
+    overlap: float = 2.0,
+    checkpoint_dir: Optional[str] = None,
+    report=None
+) -> List[Dict]:
+    """
+    分块识别长音频，返回全局时间轴上的段落列表 [{"start", "end", "text"}, ...]
+
+    参数含义见 iter_transcribe_long_audio
+    """
+    segments = []
+    for chunk_segments in iter_transcribe_long_audio(model, audio_path, transcribe_options, chunk_seconds, overlap, checkpoint_dir,
+                                                         report):
+        segments.extend(chunk_segments)
+    return segments
+
+
+def iter_transcribe_long_audio(
+    model,
+    audio_path: str,
+    transcribe_options: Dict,
+    chunk_seconds: float = 600.0,
+    overlap: float = 2.0,
+    checkpoint_dir: Optional[str] = None,
+    report=None
+) -> Iterator[List[Dict]]:
+    """
+    分块识别长音频，每识别完一块就产出该块的段落列表（全局时间轴）
+
+    Args:
+        model: stable-ts 模型（transcribe 接受 16kHz numpy 音频）
+        audio_path: 音频文件路径
+        transcribe_options: 传给 model.transcribe 的参数
+        chunk_seconds: 每块的目标时长（秒）
+        overlap: 相邻块之间的重叠时长（秒）
+        checkpoint_dir: 检查点目录（默认: 音频文件旁的 <文件名>.txt2srt_chunks/，成功后自动删除；
+                        指定目录时只会删除/覆盖其中的 plan.json 和 chunk_*.json）
+        report: 分阶段指标（可选，逐块累加 decode / queue_wait / transcribe 阶段）
+
+    Yields:
+        每块识别出的段落列表
+    """
+    from txt2srt_batch import probe_audio_duration
+
+    keep_checkpoints = checkpoint_dir is not None
+    if checkpoint_dir is None:
+        checkpoint_dir = os.path.splitext(audio_path)[0] + ".txt2srt_chunks"
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    # 读取或生成切分计划（音频或参数变化时重新规划）
+    plan_path = os.path.join(checkpoint_dir, "plan.json")
+    identity = _audio_identity(audio_path)
+    options_key = json.dumps(transcribe_options, sort_keys=True, default=str)
+    plan = None
+    if os.path.exists(plan_path):
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        settings = (plan.get("audio"), plan.get("options"), plan.get("overlap"), plan.get("chunk_seconds"))
+        if settings != (identity, options_key, overlap, chunk_seconds):
+            print("   检查点与当前音频/参数不一致，重新开始")
+            _remove_checkpoints(checkpoint_dir)
+            plan = None
+
+    if plan is None:
+        # 时长决定切分计划，探测失败时直接报错，不按文件大小猜
+        total_duration = probe_audio_duration(audio_path, estimate=False)
+        cuts = plan_chunks(audio_path, total_duration, chunk_seconds)
+        plan = {"audio": identity, "options": options_key, "overlap": overlap, "chunk_seconds": chunk_seconds, "cuts": cuts}
+        _write_json_atomic(plan_path, plan)
+
+    cuts = plan["cuts"]
+    n_chunks = len(cuts) - 1
+    print(f"   长音频模式: {cuts[-1]:.0f} 秒音频分成 {n_chunks} 块（检查点目录: {checkpoint_dir}）")
+
+    for k in range(n_chunks):
+        chunk_path = os.path.join(checkpoint_dir, f"chunk_{k:04d}.json")
+        if os.path.exists(chunk_path):
+            with open(chunk_path, "r", encoding="utf-8") as f:
+                chunk_segments = json.load(f)
+            print(f"   [{k + 1}/{n_chunks}] 使用检查点，跳过识别")
+        else:
+            nominal_start, nominal_end = cuts[k], cuts[k + 1]
+            decode_start = max(0.0, nominal_start - overlap)
+            # 最后一块解码到文件末尾（元数据里的时长可能偏短）
+            decode_duration = None if k == n_chunks - 1 else nominal_end + overlap - decode_start
+            print(f"   [{k + 1}/{n_chunks}] 识别 {nominal_start:.1f}s - {nominal_end:.1f}s ...")
+
+            with stage(report, "decode"):
+                audio = load_audio_range(audio_path, decode_start, decode_duration)
+            with acquire_inference(model, report), stage(report, "transcribe"):
+                result = model.transcribe(audio, **transcribe_options)
+            del audio
+
+            # 平移到全局时间轴；重叠区只保留中点落在本块范围内的段落
+            chunk_segments = []
+            for segment in result.segments:
+                start = segment.start + decode_start
+                end = segment.end + decode_start
+                middle = (start + end) / 2
+                if nominal_start <= middle < nominal_end or (k == n_chunks - 1 and middle >= nominal_end):
+                    chunk_segments.append({
+                        "start": start,
+                        "end": end,
+                        "text": segment.text.strip(),
+                        "words": [
+                            {"start": word.start + decode_start, "end": word.end + decode_start, "word": word.word}
+                            for word in (segment.words or [])
+                        ]
+                    })
+            del result
+
+            _write_json_atomic(chunk_path, chunk_segments)
+
+        yield chunk_segments
+
+    if not keep_checkpoints:
+        _remove_checkpoints(checkpoint_dir, remove_dir=True)
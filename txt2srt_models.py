@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+进程级模型缓存：避免每次对齐都重新加载 Whisper 模型
+
+特点：
+1. 按 (模型名, 设备, 计算精度) 缓存已加载的模型，重复调用直接返回热模型
+2. 内存预算 + LRU 淘汰：超出预算时卸载最久未使用的模型
+3. 空闲超时卸载：长时间运行的UI不会一直占着 large 模型的内存
+4. 统计命中/未命中次数和加载耗时
+5. 每个模型一把推理锁：多个任务并发时同一模型同时只跑一个推理
+6. 租用（registry.lease）：从取出模型到推理结束，模型不会被预算淘汰或空闲卸载
+
+环境变量：
+    TXT2SRT_MODEL_CACHE_MB      模型缓存内存预算（MB，默认 4096）
+    TXT2SRT_MODEL_IDLE_SECONDS  空闲多少秒后卸载模型（默认 600，0 表示不超时）
+    TXT2SRT_CPU_THREADS         CPU推理线程数（默认 0，由 faster-whisper 自动决定）
+"""
+
+import os
+import gc
+import time
+import threading
+import weakref
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+from txt2srt_report import stage
+
+
+# 各模型 float16 权重的大致大小（MB），与 README 中的磁盘空间一致
+MODEL_SIZES_MB = {
+    "tiny": 75,
+    "base": 140,
+    "small": 460,
+    "medium": 1500,
+    "large": 2900,
+}
+
+# 计算精度对内存占用的缩放系数
+COMPUTE_TYPE_SCALE = {
+    "int8": 0.5,
+    "int8_float16": 0.5,
+    "float16": 1.0,
+    "float32": 2.0,
+}
+
+
+def estimate_model_size_mb(model_name: str, compute_type: str = "float16") -> float:
+    """
+    估算模型加载后的内存占用（MB）
+    """
+    base_name = model_name.split("-")[0].split(".")[0]
+    size = MODEL_SIZES_MB.get(base_name, MODEL_SIZES_MB["large"])
+    return size * COMPUTE_TYPE_SCALE.get(compute_type, 1.0)
+
+
+class ModelRegistry:
+    """
+    线程安全的模型缓存（LRU + 内存预算 + 空闲超时）
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None, idle_timeout: Optional[float] = None):
+        """
+        Args:
+            budget_mb: 内存预算（MB），None 表示读取环境变量
+            idle_timeout: 空闲卸载时间（秒），None 表示读取环境变量，0 表示不超时
+        """
+        if budget_mb is None:
+            budget_mb = float(os.environ.get("TXT2SRT_MODEL_CACHE_MB", 4096))
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get("TXT2SRT_MODEL_IDLE_SECONDS", 600))
+
+        self.budget_mb = budget_mb
+        self.idle_timeout = idle_timeout
+
+        # key -> {"model", "size_mb", "last_used", "device", "leases"}
+        self._entries = OrderedDict()
+        # 正在加载的模型：key -> [Future, size_mb, 等待中的租用数]，同一模型的并发请求等待同一次加载
+        self._loading: Dict[Hashable, list] = {}
+        self._lock = threading.RLock()
+        self._janitor = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def get(self, key: Hashable, loader: Callable[[], Any], size_mb: float = 0.0, device: str = "cpu") -> Any:
+        """
+        获取缓存中的模型，不存在时调用 loader() 加载
+
+        返回后模型随时可能被淘汰；要用它推理时请用 lease()
+
+        加载在锁外进行：加载一个大模型的几秒钟里，其他已缓存模型的请求不受影响；
+        同一模型的并发请求只加载一次，其余请求等待这次加载的结果。
+
+        Args:
+            key: 缓存键，例如 ("faster-whisper", "small", "cuda", "float16")
+            loader: 无参数的加载函数
+            size_mb: 模型估算内存占用（MB）
+            device: 模型所在设备（卸载CUDA模型时会清理显存缓存）
+
+        Returns:
+            已加载的模型
+        """
+        return self._acquire(key, loader, size_mb, device, lease=False)
+
+    @contextlib.contextmanager
+    def lease(self, key: Hashable, loader: Callable[[], Any], size_mb: float = 0.0, device: str = "cpu") -> Iterator[Any]:
+        """
+        with registry.lease(...) as model: ...  —— 参数同 get()
+
+        取出模型时（与缓存查找在同一把锁内）就标记为占用，直到 with 结束：
+        期间其他模型加载需要腾空间、或空闲超时时，都不会卸载这个模型。
+        """
+        model = self._acquire(key, loader, size_mb, device, lease=True)
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["model"] is model:
+                    entry["leases"] -= 1
+                    entry["last_used"] = time.monotonic()
+
+    def _acquire(self, key: Hashable, loader: Callable[[], Any], size_mb: float, device: str, lease: bool) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry["last_used"] = time.monotonic()
+                entry["leases"] += lease
+                self._entries.move_to_end(key)
+                return entry["model"]
+
+            pending = self._loading.get(key)
+            if pending is None:
+                self.misses += 1
+                future = Future()
+                loading = self._loading[key] = [future, size_mb, int(lease)]
+                # 先腾出空间，避免新旧模型同时占用内存（正在加载的模型也计入预算）
+                self._evict_for(size_mb, loading_key=key)
+            else:
+                self.hits += 1
+                # 租用数记在加载记录上，模型入缓存时一并生效，中间不会被淘汰
+                pending[2] += lease
+
+        if pending is not None:
+            return pending[0].result()
+
+        start = time.perf_counter()
+        try:
+            model = loader()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            future.set_exception(e)
+            raise
+        elapsed = time.perf_counter() - start
+        print(f"   模型已加载并缓存 ({elapsed:.1f}s): {key}")
+
+        with self._lock:
+            self.load_seconds += elapsed
+            self._loading.pop(key, None)
+            self._entries[key] = {
+                "model": model,
+                "size_mb": size_mb,
+                "last_used": time.monotonic(),
+                "device": device,
+                "leases": loading[2],
+            }
+            self._start_janitor()
+        future.set_result(model)
+        return model
+
+    def unload(self, key: Hashable) -> bool:
+        """
+        卸载指定模型，返回是否确实卸载了
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._release(entry)
+        return True
+
+    def clear(self):
+        """
+        卸载全部模型
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._release(entry)
+
+    def evict_idle(self) -> int:
+        """
+        卸载超过空闲时间的模型，返回卸载数量
+        """
+        if self.idle_timeout <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, entry in self._entries.items()
+                if now - entry["last_used"] > self.idle_timeout and not _in_use(entry)
+            ]
+            entries = [self._entries.pop(key) for key in expired]
+            self.evictions += len(entries)
+        for key, entry in zip(expired, entries):
+            print(f"   模型空闲超过 {self.idle_timeout:.0f}s，已卸载: {key}")
+            self._release(entry)
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        返回缓存统计信息
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 3),
+                "loaded": [str(key) for key in self._entries],
+                "loading": [str(key) for key in self._loading],
+                "used_mb": sum(entry["size_mb"] for entry in self._entries.values()),
+                "budget_mb": self.budget_mb,
+            }
+
+    def _evict_for(self, size_mb: float, loading_key: Optional[Hashable] = None):
+        """
+        按 LRU 顺序卸载模型，直到能容纳 size_mb（调用方需持有锁）
+
+        其他线程正在加载的模型也计入已用内存（loading_key 为本次加载的模型，不重复计算）
+        """
+        used = sum(entry["size_mb"] for entry in self._entries.values())
+        used += sum(pending[1] for key, pending in self._loading.items() if key != loading_key)
+        # 正在使用的模型卸载了也释放不了内存（调用方仍持有引用），只会导致下次重新加载
+        candidates = [key for key, entry in self._entries.items() if not _in_use(entry)]
+        while candidates and used + size_mb > self.budget_mb:
+            key = candidates.pop(0)
+            entry = self._entries.pop(key)
+            used -= entry["size_mb"]
+            self.evictions += 1
+            print(f"   模型缓存超出预算 ({self.budget_mb:.0f}MB)，卸载最久未使用的模型: {key}")
+            self._release(entry)
+
+    def _release(self, entry: Dict):
+        """
+        释放模型引用，并尽量归还内存/显存
+        """
+        device = entry["device"]
+        entry.clear()
+        gc.collect()
+        if device == "cuda":
+            try:
+                import torch
+                torch.cuda.empty_cache()
+            except Exception:
+                pass
+
+    def _start_janitor(self):
+        """
+        启动后台线程，定期卸载空闲模型（守护线程，不阻止进程退出）
+        """
+        if self.idle_timeout <= 0 or self._janitor is not None:
+            return
+
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        self._janitor = threading.Thread(target=run, name="txt2srt-model-janitor", daemon=True)
+        self._janitor.start()
+
+
+# 模型对象 -> 推理锁（模型被回收时锁自动删除）
+_inference_locks = weakref.WeakKeyDictionary()
+# 不支持弱引用的模型对象按 id 存放
+_inference_locks_by_id: Dict[int, threading.Lock] = {}
+_inference_locks_guard = threading.Lock()
+
+
+def inference_lock(model) -> threading.Lock:
+    """
+    获取模型的推理锁：同一个模型对象同一时刻只运行一个推理
+
+    CTranslate2 / PyTorch 模型不保证多线程同时推理是安全的，并发推理还会让显存占用成倍增加。
+    不同模型之间互不影响，可以并行推理。
+    """
+    with _inference_locks_guard:
+        try:
+            lock = _inference_locks.get(model)
+            if lock is None:
+                lock = _inference_locks[model] = threading.Lock()
+        except TypeError:
+            lock = _inference_locks_by_id.setdefault(id(model), threading.Lock())
+        return lock
+
+
+def is_busy(model) -> bool:
+    """
+    模型是否正在推理（持有推理锁）
+    """
+    with _inference_locks_guard:
+        try:
+            lock = _inference_locks.get(model)
+        except TypeError:
+            lock = _inference_locks_by_id.get(id(model))
+    return lock is not None and lock.locked()
+
+
+@contextlib.contextmanager
+def acquire_inference(model, report=None) -> Iterator[None]:
+    """
+    with acquire_inference(model, report): ...  —— 持有模型的推理锁
+
+    等锁的时间记入 report 的 queue_wait 阶段，不算进随后的 transcribe / forced_align 阶段。
+    """
+    lock = inference_lock(model)
+    with stage(report, "queue_wait"):
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _in_use(entry: Dict) -> bool:
+    """
+    缓存条目是否被租用或正在推理（调用方需持有 registry 的锁）
+    """
+    return entry["leases"] > 0 or is_busy(entry["model"])
+
+
+# 进程级默认缓存（两个UI和命令行共用）
+registry = ModelRegistry()
+
+
+# 自定义识别后端：模型名 -> loader(device, compute_type)
+# 返回的对象需提供与 stable-ts 模型相同的 transcribe / align 接口（例如基准测试用的模拟识别后端）
+_asr_backends: Dict[str, Callable[[str, str], Any]] = {}
+
+
+def register_asr_backend(model_name: str, loader: Optional[Callable[[str, str], Any]]):
+    """
+    注册（loader 为 None 时注销）自定义识别后端，之后用该模型名对齐时不再加载 faster-whisper
+    """
+    # 卸载之前用同名后端加载的模型
+    with registry._lock:
+        stale = [key for key in registry._entries if key[:2] == ("backend", model_name)]
+    for key in stale:
+        registry.unload(key)
+    if loader is None:
+        _asr_backends.pop(model_name, None)
+    else:
+        _asr_backends[model_name] = loader
+
+
+def get_faster_whisper_model(model_name: str, device: str, compute_type: str):
+    """
+    获取 stable-ts 封装的 faster-whisper 模型（带缓存）
+    """
+    return registry.get(**_faster_whisper_spec(model_name, device, compute_type))
+
+
+def lease_faster_whisper_model(model_name: str, device: str, compute_type: str):
+    """
+    租用 faster-whisper 模型：with lease_faster_whisper_model(...) as model: ...（见 ModelRegistry.lease）
+    """
+    return registry.lease(**_faster_whisper_spec(model_name, device, compute_type))
+
+
+def _faster_whisper_spec(model_name: str, device: str, compute_type: str) -> Dict[str, Any]:
+    """
+    faster-whisper 模型（或自定义识别后端）的缓存键、加载函数和估算大小
+    """
+    backend = _asr_backends.get(model_name)
+    if backend is not None:
+        return dict(
+            key=("backend", model_name, device, compute_type),
+            loader=lambda: backend(device, compute_type),
+            size_mb=0,
+            device=device,
+        )
+
+    cpu_threads = int(os.environ.get("TXT2SRT_CPU_THREADS", 0))
+
+    def loader():
+        import stable_whisper
+        kwargs = {"cpu_threads": cpu_threads} if cpu_threads > 0 else {}
+        return stable_whisper.load_faster_whisper(model_name, device=device, compute_type=compute_type, **kwargs)
+
+    return dict(
+        key=("faster-whisper", model_name, device, compute_type, cpu_threads),
+        loader=loader,
+        size_mb=estimate_model_size_mb(model_name, compute_type),
+        device=device,
+    )
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按任务开启的性能剖析（cProfile + tracemalloc）
+
+- CPU：cProfile 剖析整个任务，或只剖析某一个阶段（阶段名见 txt2srt_report.STAGE_NAMES）
+- 内存：在分句（split_text_into_segments）和字符匹配（match_user_text_to_timestamps）
+  阶段前后用 tracemalloc 记录分配最多的 N 个代码位置
+
+每个任务一个目录，文件名固定，便于在不同版本之间直接 diff：
+
+    <剖析根目录>/<音频名>-<时间>-<进程号>/
+        meta.json               任务信息（音频、引擎、模型、剖析范围、Python 版本、命令行）
+        report.json             分阶段指标（同 --report-json）
+        cprofile.prof           cProfile 原始数据（python -m pstats / snakeviz 打开）
+        cprofile.txt            按累计耗时排序的前 N 个函数
+        tracemalloc_split.txt   分句阶段分配最多的 N 个代码位置
+        tracemalloc_match.txt   字符匹配阶段分配最多的 N 个代码位置
+
+命令行: txt2srt.py ... --profile [阶段名]
+界面:   环境变量 TXT2SRT_PROFILE=all 或阶段名（剖析根目录 TXT2SRT_PROFILE_DIR，默认 ./profiles）
+
+cProfile（Python 3.12 起同一时刻只能有一个剖析器）和 tracemalloc 都是进程级的，
+多个任务同时运行时（TXT2SRT_UI_WORKERS > 1）被剖析的任务依次进行，互不干扰。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import platform
+import threading
+import contextlib
+import tracemalloc
+from typing import Optional, Tuple
+
+
+DEFAULT_PROFILE_DIR = "profiles"
+MEMORY_STAGES = ("split", "match")
+
+# 同一时刻只剖析一个任务（with RunProfiler 期间持有）
+_profile_lock = threading.Lock()
+# tracemalloc 使用计数：第一个使用者启动、最后一个使用者停止（外部已启动的不由本模块停止）
+_tracemalloc_guard = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+class RunProfiler:
+    """
+    一个任务的剖析器
+
+    用法：
+        profiler = RunProfiler.for_job(audio_path, cpu_stage="match")
+        report = AlignmentReport(audio_path, profiler=profiler)
+        with profiler:
+            segments = align_audio_text(audio_path, text, report=report)
+        profiler.save_report(report)
+    """
+
+    def __init__(self, job_dir: str, cpu_stage: str = "all", memory_stages: Tuple[str, ...] = MEMORY_STAGES,
+                 top_n: int = 30, meta: Optional[dict] = None):
+        """
+        Args:
+            job_dir: 本任务的输出目录
+            cpu_stage: "all" 剖析整个任务，阶段名则只剖析该阶段，None 不做 CPU 剖析
+            memory_stages: 做 tracemalloc 快照的阶段
+            top_n: 文本报告中保留的条目数
+            meta: 写入 meta.json 的额外信息
+        """
+        self.job_dir = job_dir
+        self.cpu_stage = cpu_stage
+        self.memory_stages = tuple(memory_stages)
+        self.top_n = top_n
+        self.meta = dict(meta or {})
+        self._profile = cProfile.Profile() if cpu_stage else None
+        self._cpu_calls = 0
+        self._cpu_active = False
+        self._memory = {}
+        os.makedirs(job_dir, exist_ok=True)
+
+    @classmethod
+    def for_job(cls, audio_path: str, cpu_stage: str = "all", root: Optional[str] = None, **kwargs) -> "RunProfiler":
+        """
+        在剖析根目录下为任务创建目录：<音频名>-<YYYYmmdd-HHMMSS>-<进程号>
+        """
+        root = root or os.environ.get("TXT2SRT_PROFILE_DIR") or DEFAULT_PROFILE_DIR
+        name = os.path.splitext(os.path.basename(audio_path))[0] or "job"
+        job_dir = base = os.path.join(root, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        # 同一秒内的多个任务（界面连续提交）依次加序号
+        suffix = 1
+        while os.path.exists(job_dir):
+            suffix += 1
+            job_dir = f"{base}-{suffix}"
+        meta = dict(kwargs.pop("meta", None) or {}, audio=os.path.basename(audio_path))
+        return cls(job_dir, cpu_stage=cpu_stage, meta=meta, **kwargs)
+
+    # ---- 整个任务 ----
+
+    def __enter__(self):
+        if not _profile_lock.acquire(blocking=False):
+            print("   ⏳ 另一个任务正在剖析，等待其完成（剖析模式下任务依次运行）...")
+            wait_start = time.perf_counter()
+            _profile_lock.acquire()
+            self.meta["profile_wait_seconds"] = round(time.perf_counter() - wait_start, 3)
+        self.meta["started"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        if self.cpu_stage == "all":
+            self._enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.cpu_stage == "all":
+                self._disable()
+            self.meta["failed"] = exc_type is not None
+            self.save()
+        finally:
+            _profile_lock.release()
+        return False
+
+    # ---- 单个阶段（由 AlignmentReport.stage 调用） ----
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        with contextlib.ExitStack() as stack:
+            if name == self.cpu_stage:
+                self._enable()
+                stack.callback(self._disable)
+            if name in self.memory_stages:
+                stack.enter_context(self._trace_memory(name))
+            yield
+
+    def _enable(self):
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            # Python 3.12+: 其他剖析器（不在 with RunProfiler 内使用的、调试器等）正在运行
+            print(f"   ⚠️ 无法开启 cProfile，跳过 CPU 剖析: {e}")
+            self.meta["cpu_skipped"] = str(e)
+            return
+        self._cpu_active = True
+        self._cpu_calls += 1
+
+    def _disable(self):
+        if self._cpu_active:
+            self._profile.disable()
+            self._cpu_active = False
+
+    @contextlib.contextmanager
+    def _trace_memory(self, name: str):
+        exclusive = _tracemalloc_acquire()
+        try:
+            before = tracemalloc.take_snapshot()
+            try:
+                yield
+            finally:
+                after = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                self._memory.setdefault(name, []).append((before, after, peak, exclusive))
+        finally:
+            _tracemalloc_release()
+
+    # ---- 输出 ----
+
+    def save(self):
+        """
+        写入 meta.json、cprofile.*、tracemalloc_*.txt
+        """
+        self.meta.update({
+            "cpu_stage": self.cpu_stage,
+            "memory_stages": list(self.memory_stages),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "argv": sys.argv,
+        })
+        _write_text(os.path.join(self.job_dir, "meta.json"), json.dumps(self.meta, ensure_ascii=False, indent=2))
+
+        if self._profile is not None and self._cpu_calls:
+            self._profile.dump_stats(os.path.join(self.job_dir, "cprofile.prof"))
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(self.top_n)
+            _write_text(os.path.join(self.job_dir, "cprofile.txt"), stream.getvalue())
+
+        for name, snapshots in self._memory.items():
+            _write_text(os.path.join(self.job_dir, f"tracemalloc_{name}.txt"), self._format_memory(name, snapshots))
+
+    def save_report(self, report):
+        """
+        把分阶段指标写入 report.json
+        """
+        report.finish()
+        report.write_json(os.path.join(self.job_dir, "report.json"))
+
+    def _format_memory(self, name: str, snapshots) -> str:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        lines = []
+        for call, (before, after, peak, exclusive) in enumerate(snapshots, 1):
+            stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+            growth = sum(stat.size_diff for stat in stats)
+            note = "" if exclusive else "（与其他追踪同时进行，峰值和净增包含其他线程的分配，仅供参考）"
+            lines.append(f"# {name} 第 {call} 次: 峰值 {peak / 1024:.1f} KiB, 净增 {growth / 1024:.1f} KiB{note}")
+            for stat in stats[:self.top_n]:
+                frame = stat.traceback[0]
+                lines.append(f"{stat.size_diff / 1024:10.1f} KiB {stat.count_diff:+8d} 块  "
+                             f"{_short_path(frame.filename)}:{frame.lineno}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"RunProfiler({self.job_dir!r}, cpu_stage={self.cpu_stage!r})"
+
+
+def profiler_from_env(audio_path: str, **meta) -> Optional[RunProfiler]:
+    """
+    界面使用：环境变量 TXT2SRT_PROFILE 为 all 或阶段名时返回剖析器，否则返回 None
+    """
+    cpu_stage = os.environ.get("TXT2SRT_PROFILE", "").strip()
+    if not cpu_stage or cpu_stage.lower() in ("0", "off", "false", "no"):
+        return None
+    if cpu_stage.lower() in ("1", "on", "true", "yes"):
+        cpu_stage = "all"
+    return RunProfiler.for_job(audio_path, cpu_stage=cpu_stage, meta=meta)
+
+
+def _tracemalloc_acquire() -> bool:
+    """
+    开始使用 tracemalloc，返回是否是唯一的使用者
+
+    只有唯一使用者才重置峰值（reset_peak 是进程级的，会清掉其他使用者正在记录的峰值），
+    否则记录到的峰值是从上次重置以来整个进程的峰值，只能作参考。
+    """
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_guard:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+        exclusive = _tracemalloc_users == 1
+        if exclusive:
+            tracemalloc.reset_peak()
+        return exclusive
+
+
+def _tracemalloc_release():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_guard:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _short_path(filename: str) -> str:
+    """
+    代码位置去掉 site-packages / 项目目录 / 标准库目录前缀（不同机器之间可直接 diff）
+    """
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    for root in (os.path.dirname(os.path.abspath(__file__)), os.path.dirname(os.__file__)):
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def _write_text(path: str, content: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
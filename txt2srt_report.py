@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+对齐任务的分阶段耗时与内存报告
+
+一次对齐分成若干阶段（模型加载、等待推理锁、音频解码/识别、VAD、字符匹配、后处理……），
+每个阶段记录：
+- 墙钟时间和 CPU 时间
+- 峰值常驻内存（RSS）的增量：该阶段把进程内存峰值推高了多少
+
+整个任务另外记录音频时长、实时率（处理耗时 / 音频时长）、字符数和字符匹配率。
+
+用法：
+    report = AlignmentReport(audio_path, engine="banded", model="small")
+    segments = align_audio_text(audio_path, text, report=report)
+    print(report.format_summary())
+    report.write_json(output_path + ".report.json")
+"""
+
+import os
+import sys
+import json
+import time
+import contextlib
+import unicodedata
+from typing import Dict, List, Optional
+
+
+REPORT_VERSION = 1
+
+# 两个对齐引擎使用的阶段名（--profile 可以只剖析其中一个阶段）
+# queue_wait 是等待模型推理锁的时间（其他任务正在用同一个模型），不计入 transcribe / forced_align
+STAGE_NAMES = ("asr_cache", "model_load", "queue_wait", "decode", "transcribe", "vad", "align_model_load",
+               "forced_align", "split", "match", "postprocess", "write_srt")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    当前进程的峰值常驻内存（MB），无法获取时返回 None
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+
+
+class AlignmentReport:
+    """
+    一次对齐任务的指标
+
+    Attributes:
+        stages: 各阶段指标 [{"name", "wall_seconds", "cpu_seconds", "rss_delta_mb", "calls"}]，按首次出现的顺序
+        audio_seconds: 音频时长（秒）
+        user_chars / recognized_chars: 用户文本 / 识别文本的有效字符数
+        user_sentences: 用户文本切分出的句子数
+        match_rate: 字符匹配率（0-1，None 表示该模式没有字符匹配）
+        cues: 生成的字幕条数
+        cache_hit: 是否命中识别结果缓存
+        profiler: 各阶段开始/结束时通知的剖析器（见 txt2srt_profile.RunProfiler，可选）
+    """
+
+    def __init__(self, audio_path: Optional[str] = None, engine: Optional[str] = None, model: Optional[str] = None,
+                 profiler=None):
+        self.audio_path = audio_path
+        self.engine = engine
+        self.model = model
+        self.profiler = profiler
+        self.stages: List[Dict] = []
+        self.audio_seconds: Optional[float] = None
+        self.user_chars: Optional[int] = None
+        self.recognized_chars: Optional[int] = None
+        self.user_sentences: Optional[int] = None
+        self.match_rate: Optional[float] = None
+        self.cues: Optional[int] = None
+        self.cache_hit: Optional[bool] = None
+        self.wall_seconds: Optional[float] = None
+        self.cpu_seconds: Optional[float] = None
+        self.peak_rss_mb: Optional[float] = None
+
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._start_rss = peak_rss_mb()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        记录一个阶段（同名阶段多次出现时累加，例如长音频的逐块识别）
+        """
+        rss_before = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            if self.profiler is None:
+                yield
+            else:
+                with self.profiler.stage(name):
+                    yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_after = peak_rss_mb()
+            rss_delta = rss_after - rss_before if rss_after is not None and rss_before is not None else None
+
+            entry = next((entry for entry in self.stages if entry["name"] == name), None)
+            if entry is None:
+                self.stages.append({"name": name, "wall_seconds": wall, "cpu_seconds": cpu, "rss_delta_mb": rss_delta, "calls": 1})
+            else:
+                entry["wall_seconds"] += wall
+                entry["cpu_seconds"] += cpu
+                if rss_delta is not None:
+                    entry["rss_delta_mb"] = (entry["rss_delta_mb"] or 0.0) + rss_delta
+                entry["calls"] += 1
+
+    def finish(self, cues=None):
+        """
+        任务结束：记录总耗时、峰值内存、字幕条数，并在未知时探测音频时长
+        """
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+        self.peak_rss_mb = peak_rss_mb()
+        if cues is not None:
+            self.cues = len(cues)
+        if self.audio_seconds is None and self.audio_path and os.path.exists(self.audio_path):
+            try:
+                from txt2srt_batch import probe_audio_duration
+                self.audio_seconds = probe_audio_duration(self.audio_path)
+            except Exception:
+                pass
+        return self
+
+    @property
+    def rtf(self) -> Optional[float]:
+        """
+        实时率：处理耗时 / 音频时长（越小越快，0.1 表示 1 小时音频 6 分钟处理完）
+        """
+        if not self.wall_seconds or not self.audio_seconds:
+            return None
+        return self.wall_seconds / self.audio_seconds
+
+    def to_dict(self) -> Dict:
+        rss_growth = None
+        if self.peak_rss_mb is not None and self._start_rss is not None:
+            rss_growth = self.peak_rss_mb - self._start_rss
+        return {
+            "version": REPORT_VERSION,
+            "audio": os.path.basename(self.audio_path) if self.audio_path else None,
+            "engine": self.engine,
+            "model": self.model,
+            "audio_seconds": self.audio_seconds,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "rtf": self.rtf,
+            "peak_rss_mb": self.peak_rss_mb,
+            "rss_growth_mb": rss_growth,
+            "user_chars": self.user_chars,
+            "recognized_chars": self.recognized_chars,
+            "user_sentences": self.user_sentences,
+            "match_rate": self.match_rate,
+            "cues": self.cues,
+            "cache_hit": self.cache_hit,
+            "stages": self.stages,
+        }
+
+    def write_json(self, path: str):
+        """
+        写入 JSON（先写临时文件再重命名）
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def format_summary(self) -> str:
+        """
+        紧凑的汇总表（命令行 --report 输出）
+        """
+        total = self.wall_seconds or sum(stage["wall_seconds"] for stage in self.stages) or 1e-9
+        lines = [_pad("阶段", 18) + _pad("耗时(s)", 9, right=True) + _pad("CPU(s)", 9, right=True)
+                 + _pad("占比", 7, right=True) + _pad("内存+(MB)", 11, right=True)]
+        for stage in self.stages:
+            rss = f"{stage['rss_delta_mb']:11.1f}" if stage["rss_delta_mb"] is not None else f"{'-':>11}"
+            name = stage["name"] if stage["calls"] == 1 else f"{stage['name']} x{stage['calls']}"
+            lines.append(f"{name:<18}{stage['wall_seconds']:9.2f}{stage['cpu_seconds']:9.2f}"
+                         f"{stage['wall_seconds'] / total:7.0%}{rss}")
+        lines.append(_pad("合计", 18) + f"{total:9.2f}{(self.cpu_seconds or 0.0):9.2f}")
+
+        facts = []
+        if self.audio_seconds:
+            facts.append(f"音频 {self.audio_seconds / 60:.1f} 分钟")
+        if self.rtf is not None:
+            facts.append(f"实时率 {self.rtf:.4f}")
+        if self.user_chars is not None:
+            facts.append(f"文稿 {self.user_chars} 字")
+        if self.recognized_chars is not None:
+            facts.append(f"识别 {self.recognized_chars} 字")
+        if self.match_rate is not None:
+            facts.append(f"匹配率 {self.match_rate * 100:.1f}%")
+        if self.cache_hit:
+            facts.append("命中识别缓存")
+        if self.peak_rss_mb is not None:
+            facts.append(f"峰值内存 {self.peak_rss_mb:.0f}MB")
+        if facts:
+            lines.append("   " + " | ".join(facts))
+        return "\n".join(lines)
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """
+    按显示宽度补齐（中文字符占两列）
+    """
+    display = sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+    padding = " " * max(0, width - display)
+    return padding + text if right else text + padding
+
+
+def stage(report: Optional[AlignmentReport], name: str):
+    """
+    report 为 None 时不做任何记录（各函数的 report 参数都是可选的）
+    """
+    if report is None:
+        return contextlib.nullcontext()
+    return report.stage(name)
+
+
+def write_report(report: Optional[AlignmentReport], output_path: str, show: bool = True, save_json: bool = False):
+    """
+    命令行 --report / --report-json：打印汇总表，并把指标写入 SRT 旁的 <输出文件>.report.json
+    """
+    if report is None:
+        return
+    report.finish()
+    if show:
+        print("\n📊 分阶段指标:")
+        print(report.format_summary())
+    if save_json:
+        report.write_json(output_path + ".report.json")
+        print(f"📊 指标已保存: {output_path}.report.json")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+模拟识别后端：不加载任何模型，由已知文稿生成确定性的识别结果（用于端到端基准测试）
+
+- SpeechScript: 文稿的"真实"时间轴（每个词和每个句子的开始/结束时间）
+- write_tone_wav: 按真实时间轴生成测试音频（说话处为音调，停顿处为静音）
+- StubASR: 与 stable-ts 模型接口相同（transcribe / align），
+  用 txt2srt_models.register_asr_backend 注册后即可替代 faster-whisper
+- StubWhisperXBackend: 与 whisperx 模块接口相同（load_model / load_align_model / load_audio / align），
+  传给 WhisperXAligner(backend=...) 即可替代 WhisperX
+
+识别结果 = 真实词序列按错误率随机替换、丢弃、插入，时间戳加上随机抖动；相同种子得到相同结果。
+强制对齐（align）按顺序把文本中的词匹配到真实词上，匹配不上的词在前后词之间插值。
+"""
+
+import os
+import re
+import wave
+import random
+from types import SimpleNamespace
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from txt2srt_timeline import PUNCTUATION
+
+
+SAMPLE_RATE = 16000
+
+# 一个"词"：一个英文单词、一串数字或一个其他字符（汉字）
+_TOKEN_RE = re.compile(r"[A-Za-z']+|\d+|\S")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分成词（英文单词、数字、单个汉字），去除标点
+    """
+    return [token for token in _TOKEN_RE.findall(text) if token not in PUNCTUATION]
+
+
+def join_tokens(tokens: List[str]) -> str:
+    """
+    拼接词：英文单词/数字之间加空格，汉字之间不加
+    """
+    text = ""
+    for token in tokens:
+        if text and (token[0].isascii() or text[-1].isascii()):
+            text += " "
+        text += token
+    return text
+
+
+class SpeechScript:
+    """
+    文稿的真实时间轴
+
+    Attributes:
+        tokens: 词序列
+        starts / ends: 每个词的开始/结束时间（秒）
+        sentences: 每个句子的真实时间 [{"start", "end", "text"}]
+        duration: 音频总时长（秒）
+    """
+
+    def __init__(self, tokens: List[str], starts: np.ndarray, ends: np.ndarray, sentences: List[Dict], duration: float):
+        self.tokens = tokens
+        self.starts = starts
+        self.ends = ends
+        self.sentences = sentences
+        self.duration = duration
+
+    @classmethod
+    def build(cls, sentences: List[str], seconds_per_char: float = 0.22, pause=(0.3, 0.8),
+              lead_in: float = 0.5, seed: int = 0) -> "SpeechScript":
+        """
+        为句子生成朗读时间轴：汉字每字 seconds_per_char 秒，英文单词按字母数折算，句间随机停顿
+        """
+        rng = random.Random(seed)
+        tokens, starts, ends, truth = [], [], [], []
+        cursor = lead_in
+        for sentence in sentences:
+            sentence_tokens = tokenize(sentence)
+            if not sentence_tokens:
+                continue
+            sentence_start = cursor
+            for token in sentence_tokens:
+                if token[0].isascii():
+                    seconds = seconds_per_char * (0.5 + 0.3 * len(token))
+                else:
+                    seconds = seconds_per_char
+                tokens.append(token)
+                starts.append(cursor)
+                cursor += seconds
+                ends.append(cursor)
+            truth.append({"start": sentence_start, "end": cursor, "text": sentence.strip()})
+            cursor += rng.uniform(*pause)
+        return cls(tokens, np.array(starts), np.array(ends), truth, cursor + lead_in)
+
+
+def write_tone_wav(script: SpeechScript, path: str, frequency: float = 220.0, amplitude: float = 0.3):
+    """
+    生成测试音频（16kHz 单声道 16bit）：每个句子的时间范围内为音调，其余为静音
+
+    逐句写入，3小时的音频也只占用几秒音频的内存。
+    能量 VAD 检测到的语音区间与句子时间一致（Silero VAD 可能不把纯音调当作语音）。
+    """
+    tone = (amplitude * 32767 * np.sin(2 * np.pi * frequency * np.arange(SAMPLE_RATE) / SAMPLE_RATE)).astype("<i2")
+
+    def tone_samples(n):
+        return np.tile(tone, n // SAMPLE_RATE + 1)[:n]
+
+    written = 0
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        for sentence in script.sentences:
+            start = int(sentence["start"] * SAMPLE_RATE)
+            end = int(sentence["end"] * SAMPLE_RATE)
+            f.writeframes(np.zeros(max(0, start - written), dtype="<i2").tobytes())
+            f.writeframes(tone_samples(end - max(start, written)).tobytes())
+            written = end
+        f.writeframes(np.zeros(max(0, int(script.duration * SAMPLE_RATE) - written), dtype="<i2").tobytes())
+
+
+def read_wav(path: str) -> np.ndarray:
+    """
+    读取 write_tone_wav 生成的音频，返回 float32 数组（与 whisperx.load_audio 相同的格式）
+    """
+    with wave.open(path, "rb") as f:
+        frames = f.readframes(f.getnframes())
+    return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class StubASR:
+    """
+    模拟的 stable-ts 模型（transcribe / align 接口）
+    """
+
+    def __init__(self, error_rate: float = 0.05, jitter: float = 0.05, seed: int = 0):
+        """
+        Args:
+            error_rate: 每个词被替换、丢弃或在其后插入多余词的概率（三者各占三分之一）
+            jitter: 时间戳随机抖动的标准差（秒）
+            seed: 随机种子
+        """
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.seed = seed
+        self._scripts = {}
+
+    def add(self, audio_path: str, script: SpeechScript):
+        """
+        登记音频文件对应的真实时间轴
+        """
+        self._scripts[os.path.abspath(audio_path)] = script
+
+    def script_for(self, audio) -> SpeechScript:
+        if not isinstance(audio, str):
+            raise ValueError("模拟识别后端只支持音频文件路径（不支持长音频分块模式）")
+        script = self._scripts.get(os.path.abspath(audio))
+        if script is None:
+            raise ValueError(f"模拟识别后端没有登记该音频: {audio}")
+        return script
+
+    def recognize(self, script: SpeechScript) -> List[Dict]:
+        """
+        生成模拟的词级识别结果 [{"word", "start", "end"}, ...]
+        """
+        rng = random.Random(self.seed)
+        ascii_pool = [token for token in script.tokens if token[0].isascii()] or ["the"]
+        other_pool = [token for token in script.tokens if not token[0].isascii()] or ["的"]
+
+        def random_like(token):
+            return rng.choice(ascii_pool if token[0].isascii() else other_pool)
+
+        words = []
+        for token, start, end in zip(script.tokens, script.starts.tolist(), script.ends.tolist()):
+            roll = rng.random()
+            if roll < self.error_rate / 3:
+                words.append([random_like(token), start, end])
+            elif roll < self.error_rate * 2 / 3:
+                continue
+            elif roll < self.error_rate:
+                middle = (start + end) / 2
+                words.append([token, start, middle])
+                words.append([random_like(token), middle, end])
+            else:
+                words.append([token, start, end])
+        return self._jittered(words, rng)
+
+    def _jittered(self, words: List[list], rng: random.Random) -> List[Dict]:
+        result = []
+        previous_start = 0.0
+        for word, start, end in words:
+            if self.jitter > 0:
+                start = max(previous_start, start + rng.gauss(0, self.jitter))
+                end = max(start + 0.02, end + rng.gauss(0, self.jitter))
+            result.append({"word": word, "start": start, "end": end})
+            previous_start = start
+        return result
+
+    def force_align(self, script: SpeechScript, tokens: List[str], window: Tuple[float, float] = (0.0, float("inf"))) -> List[Dict]:
+        """
+        把已知文本的词按顺序匹配到真实时间轴上（模拟强制对齐）
+
+        每个词在真实词序列中向后最多查找 20 个词；匹配不上的词在前后已匹配的词之间插值。
+        """
+        # 分段开始时间带有抖动，向前放宽 0.5 秒再开始匹配
+        cursor = int(np.searchsorted(script.ends, window[0] - 0.5))
+        rng = random.Random(hash((self.seed, cursor)))
+        n = len(script.tokens)
+        positions = np.full(len(tokens), -1, dtype=np.int64)
+        for i, token in enumerate(tokens):
+            for q in range(cursor, min(n, cursor + 20)):
+                if script.tokens[q] == token and script.starts[q] <= window[1]:
+                    positions[i] = q
+                    cursor = q + 1
+                    break
+
+        matched = positions >= 0
+        if not tokens:
+            return []
+        index = np.arange(len(tokens))
+        if matched.any():
+            starts = np.interp(index, index[matched], script.starts[positions[matched]])
+            ends = np.interp(index, index[matched], script.ends[positions[matched]])
+        else:
+            lo = max(window[0], 0.0)
+            hi = min(window[1], script.duration)
+            starts = lo + (hi - lo) * index / len(tokens)
+            ends = starts + (hi - lo) / len(tokens)
+        words = [[token, start, end] for token, start, end in zip(tokens, starts.tolist(), ends.tolist())]
+        return self._jittered(words, rng)
+
+    # ---- stable-ts 模型接口 ----
+
+    def transcribe(self, audio, **options):
+        """
+        模拟 model.transcribe：返回带 .segments（含 .words）的结果对象
+        """
+        return _to_result(group_segments(self.recognize(self.script_for(audio))))
+
+    def align(self, audio, text: str, language: Optional[str] = None, verbose: bool = False, **options):
+        """
+        模拟 model.align（teacher forcing）：返回带 .segments（含 .words）的结果对象
+        """
+        words = self.force_align(self.script_for(audio), tokenize(text))
+        return _to_result(group_segments(words))
+
+
+def group_segments(words: List[Dict], max_words: int = 20, max_gap: float = 0.5) -> List[Dict]:
+    """
+    把词合并成识别段落：停顿超过 max_gap 秒或达到 max_words 个词时另起一段
+    """
+    segments = []
+    for word in words:
+        if segments and len(segments[-1]["words"]) < max_words and word["start"] - segments[-1]["end"] <= max_gap:
+            segments[-1]["words"].append(word)
+            segments[-1]["end"] = word["end"]
+        else:
+            segments.append({"start": word["start"], "end": word["end"], "words": [word]})
+    for segment in segments:
+        segment["text"] = join_tokens([word["word"] for word in segment["words"]])
+    return segments
+
+
+def _to_result(segments: List[Dict]):
+    return SimpleNamespace(segments=[
+        SimpleNamespace(
+            start=segment["start"],
+            end=segment["end"],
+            text=segment["text"],
+            words=[SimpleNamespace(start=word["start"], end=word["end"], word=word["word"]) for word in segment["words"]],
+        )
+        for segment in segments
+    ])
+
+
+class StubWhisperXBackend:
+    """
+    模拟的 whisperx 模块（WhisperXAligner 的 backend）
+
+    load_audio 记住当前处理的音频，之后的 transcribe / align 都针对该音频
+    （WhisperXAligner 每次对齐都先调用 load_audio）。
+    """
+
+    def __init__(self, asr: StubASR):
+        self.asr = asr
+        self._script = None
+
+    def load_audio(self, path: str) -> np.ndarray:
+        self._script = self.asr.script_for(path)
+        return read_wav(path)
+
+    def load_model(self, model_name: str, device: str, compute_type: Optional[str] = None, **options):
+        backend = self
+
+        class _Model:
+            def transcribe(self, audio, batch_size: int = 16, language: Optional[str] = None, **options):
+                return backend.transcribe(audio, batch_size=batch_size, language=language)
+
+        return _Model()
+
+    def transcribe(self, audio, batch_size: int = 16, language: Optional[str] = None) -> Dict:
+        segments = group_segments(self.asr.recognize(self._script))
+        return {"segments": [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in segments]}
+
+    def load_align_model(self, language_code: str, device: str, **options):
+        return None, {"language": language_code}
+
+    def align(self, segments: List[Dict], model, metadata: Dict, audio, device: str,
+              return_char_alignments: bool = False, **options) -> Dict:
+        aligned = []
+        for segment in segments:
+            words = self.asr.force_align(self._script, tokenize(segment["text"]), (segment["start"], segment["end"]))
+            aligned.append({"start": segment["start"], "end": segment["end"], "text": segment["text"], "words": words})
+        return {"segments": aligned}
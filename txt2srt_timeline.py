@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+字符时间轴：用 NumPy 数组保存每个有效字符的码点、所属段落和时间
+
+两个对齐引擎共用：
+- txt2srt.py 由识别段落构建（段落内按字符位置线性插值）
+- txt2srt_whisperx.py 由词级时间戳构建（词内按字符位置线性插值）
+
+2万字的文本只占几百KB（每个字符 4 + 4 + 8 字节），
+而每个字符一个 dict 的写法需要几十MB。
+"""
+
+from typing import List, Dict
+
+import numpy as np
+
+
+# 对齐时忽略的标点和空白
+PUNCTUATION = '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'
+
+
+def remove_punctuation(text: str) -> str:
+    """
+    移除标点符号和空白（对齐只比较有效字符）
+    """
+    return ''.join([c for c in text if c.strip() and c not in PUNCTUATION])
+
+
+def text_to_codes(text: str) -> np.ndarray:
+    """
+    将字符串转换为Unicode码点数组（用于向量化的字符比较）
+    """
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+class CharTimeline:
+    """
+    字符时间轴（只包含有效字符，标点和空白已去除）
+
+    Attributes:
+        codes: 每个字符的Unicode码点 (uint32)
+        segment_index: 每个字符所属的段落/词下标 (int32)
+        times: 每个字符的时间戳（秒，float64）
+    """
+
+    __slots__ = ("codes", "segment_index", "times")
+
+    def __init__(self, codes: np.ndarray, segment_index: np.ndarray, times: np.ndarray):
+        self.codes = codes
+        self.segment_index = segment_index
+        self.times = times
+
+    @classmethod
+    def from_segments(cls, segments: List[Dict]) -> "CharTimeline":
+        """
+        由段落列表构建：字符时间 = 段落开始 + (段内位置 / 段内字符数) × 段落时长
+        """
+        codes, segment_index, times = [], [], []
+        for seg_idx, segment in enumerate(segments):
+            seg_codes = text_to_codes(remove_punctuation(segment["text"]))
+            total_chars = len(seg_codes)
+            if total_chars == 0:
+                continue
+            duration = segment["end"] - segment["start"]
+            codes.append(seg_codes)
+            segment_index.append(np.full(total_chars, seg_idx, dtype=np.int32))
+            times.append(segment["start"] + np.arange(total_chars) / total_chars * duration)
+        return cls._concatenate(codes, segment_index, times)
+
+    @classmethod
+    def from_words(cls, words: List[Dict]) -> "CharTimeline":
+        """
+        由词级时间戳构建：字符时间 = 词开始 + (词内位置 / 词长) × 词时长
+
+        词内位置按原始词文本（含空格和标点）计算，之后再去掉标点和空白
+        """
+        codes, segment_index, times = [], [], []
+        for word_idx, word in enumerate(words):
+            word_text = word["word"]
+            if not word_text:
+                continue
+            positions = [i for i, char in enumerate(word_text) if char.strip() and char not in PUNCTUATION]
+            if not positions:
+                continue
+            duration = word["end"] - word["start"]
+            codes.append(text_to_codes(''.join(word_text[i] for i in positions)))
+            segment_index.append(np.full(len(positions), word_idx, dtype=np.int32))
+            times.append(word["start"] + np.array(positions) / len(word_text) * duration)
+        return cls._concatenate(codes, segment_index, times)
+
+    @classmethod
+    def _concatenate(cls, codes, segment_index, times) -> "CharTimeline":
+        if not codes:
+            return cls(np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64))
+        return cls(
+            np.concatenate(codes).astype(np.uint32, copy=False),
+            np.concatenate(segment_index),
+            np.concatenate(times).astype(np.float64, copy=False),
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def text(self) -> str:
+        """
+        时间轴上的字符组成的字符串
+        """
+        return self.codes.astype('<u4').tobytes().decode('utf-32-le')
+
+    @property
+    def nbytes(self) -> int:
+        """
+        占用的内存（字节）
+        """
+        return self.codes.nbytes + self.segment_index.nbytes + self.times.nbytes
+
+    def times_for(self, mapping: np.ndarray, end_time: float, start_time: float = 0.0) -> np.ndarray:
+        """
+        按 "用户字符 → 时间轴字符" 的映射取每个用户字符的时间
+
+        未匹配的字符（映射为 -1）在前后最近的已匹配字符之间线性插值；
+        开头之前视为 start_time，末尾之后视为 end_time。
+
+        Args:
+            mapping: 每个用户字符对应的时间轴下标，-1 表示未匹配
+            end_time: 音频（最后一个段落）的结束时间
+            start_time: 这段时间轴的开始时间（整段音频为 0；流式对齐时为当前窗口的开始）
+
+        Returns:
+            每个用户字符的时间戳 (float64)
+        """
+        mapping = np.asarray(mapping, dtype=np.int64)
+        n = len(mapping)
+        matched = (mapping >= 0) & (mapping < len(self.times))
+        if matched.all():
+            return self.times[mapping]
+
+        known_positions = np.concatenate(([-1], np.flatnonzero(matched), [n]))
+        known_times = np.concatenate(([start_time], self.times[mapping[matched]], [end_time]))
+        return np.interp(np.arange(n), known_positions, known_times)
@@ -10,7 +10,9 @@ import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
-from txt2srt import align_audio_text, generate_srt, format_timestamp
+import contextlib
+from txt2srt_report import AlignmentReport
+from txt2srt_profile import profiler_from_env
 
 
 class AudioTextAlignerUI:
@@ -280,6 +282,9 @@ class AudioTextAlignerUI:
         self.progress.start()
         
         try:
+            # 对齐模块（NumPy 等）在第一次处理时才导入，窗口秒开
+            from txt2srt import align_audio_text, generate_srt, format_timestamp
+            
             self.log("=" * 60)
             self.log("🚀 开始处理...")
             self.log(f"📁 音频文件: {os.path.basename(self.audio_path.get())}")
@@ -301,20 +306,28 @@ class AudioTextAlignerUI:
             
             # 处理音频
             lang = None if self.language.get() == "auto" else self.language.get()
-            segments = align_audio_text(
-                self.audio_path.get(),
-                text_content,
-                model_name=self.model_size.get(),
-                max_chars=self.max_chars.get()
-            )
-            
-            self.log(f"✅ 语音识别完成！识别到 {len(segments)} 个段落")
-            self.log("")
-            
-            # 生成SRT
-            generate_srt(segments, self.output_path.get())
+            # 环境变量 TXT2SRT_PROFILE 开启时，每个任务的剖析结果写入单独的目录
+            profiler = profiler_from_env(self.audio_path.get(), ui="tkinter", model=self.model_size.get())
+            report = AlignmentReport(self.audio_path.get(), model=self.model_size.get(), profiler=profiler) if profiler else None
+            with profiler or contextlib.nullcontext():
+                segments = align_audio_text(
+                    self.audio_path.get(),
+                    text_content,
+                    model_name=self.model_size.get(),
+                    max_chars=self.max_chars.get(),
+                    report=report
+                )
+                
+                self.log(f"✅ 语音识别完成！识别到 {len(segments)} 个段落")
+                self.log("")
+                
+                # 生成SRT
+                generate_srt(segments, self.output_path.get())
             
             self.log(f"✅ SRT文件已生成: {self.output_path.get()}")
+            if profiler is not None:
+                profiler.save_report(report)
+                self.log(f"🔬 剖析结果已保存: {profiler.job_dir}")
             self.log("")
             self.log("📊 统计信息:")
             self.log(f"   - 字幕段落数: {len(segments)}")
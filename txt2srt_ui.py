@@ -7,8 +7,10 @@
 
 import os
 import sys
-import tempfile
+import time
 import socket
+import threading
+import contextlib
 
 # 修复 Windows 终端中文乱码问题
 if sys.platform == "win32":
@@ -17,7 +19,79 @@ if sys.platform == "win32":
     sys.stderr.reconfigure(encoding='utf-8')
 
 import gradio as gr
-from txt2srt import align_audio_text, generate_srt, format_timestamp
+from txt2srt_report import AlignmentReport
+from txt2srt_profile import profiler_from_env
+from txt2srt_jobs import JobQueue, QueueFull
+from txt2srt_workspace import JobWorkspace
+
+
+# 所有用户共用的任务队列（同时处理数 TXT2SRT_UI_WORKERS，排队上限 TXT2SRT_UI_QUEUE_SIZE）
+job_queue = JobQueue.from_env()
+
+# 每个任务的输出目录（根目录 TXT2SRT_UI_WORKDIR，后台按时间/大小清理）
+workspace = JobWorkspace()
+
+# 排队时刷新状态的间隔（秒）
+QUEUE_POLL_SECONDS = 1.0
+
+
+def submit_audio_text(audio_file, text_input, text_file, model_size, language, max_chars):
+    """
+    把任务放入共享队列，排队和处理期间持续更新状态（Gradio 生成器函数）
+    
+    参数与返回值同 process_audio_text
+    """
+    try:
+        job = job_queue.submit(process_audio_text, audio_file, text_input, text_file, model_size, language, max_chars)
+    except QueueFull:
+        stats = job_queue.stats()
+        yield None, "", f"❌ 服务器繁忙：已有 {stats['pending']} 个任务在排队，请稍后再试"
+        return
+    
+    try:
+        while not job.wait(QUEUE_POLL_SECONDS):
+            position = job_queue.position(job)
+            stats = job_queue.stats()
+            if position > 0:
+                status = f"⏳ 排队中：您是第 {position} 位（前面还有 {position - 1} 个任务）\n"
+                status += f"   正在处理 {stats['running']} 个任务，同时最多处理 {stats['workers']} 个"
+            elif job.started is None:
+                # 已出队但还没开始运行（工作线程取出任务和 Job._run 记录开始时间之间）
+                status = "🚀 任务即将开始...\n"
+                status += f"🎯 模型大小: {model_size}"
+            else:
+                status = f"⏳ 正在处理... 已用时 {time.time() - job.started:.0f} 秒\n"
+                status += f"🎯 模型大小: {model_size}"
+            yield None, "", status
+    except GeneratorExit:
+        # 用户关闭页面：还没开始的任务直接取消
+        job_queue.cancel(job)
+        raise
+    
+    if job.error is not None:
+        yield None, "", f"❌ 处理出错: {job.error}"
+    else:
+        yield job.result
+
+
+def warm_up_models():
+    """
+    后台预加载环境变量 TXT2SRT_UI_PRELOAD 指定的模型（逗号分隔，如 "small,base"），第一个用户不用等模型加载
+    """
+    names = [name.strip().lower() for name in os.environ.get("TXT2SRT_UI_PRELOAD", "").split(",") if name.strip()]
+    if not names:
+        return
+    
+    def run():
+        from txt2srt import load_whisper_model
+        for name in names:
+            try:
+                load_whisper_model(name, use_gpu=True)
+            except Exception as e:
+                print(f"⚠️ 预加载模型 {name} 失败: {e}")
+    
+    print(f"🔥 后台预加载模型: {', '.join(names)}")
+    threading.Thread(target=run, name="txt2srt-preload", daemon=True).start()
 
 
 def process_audio_text(audio_file, text_input, text_file, model_size, language, max_chars):
@@ -36,6 +110,9 @@ def process_audio_text(audio_file, text_input, text_file, model_size, language,
         (srt_file_path, preview_text, status_message)
     """
     try:
+        # 对齐模块在第一次处理时才导入（界面启动更快）
+        from txt2srt import align_audio_text, generate_srt, format_timestamp
+        
         # 验证输入
         if audio_file is None:
             return None, "", "❌ 错误：请上传音频文件"
@@ -73,20 +150,26 @@ def process_audio_text(audio_file, text_input, text_file, model_size, language,
         
         # 处理音频
         language_code = None if language == "自动检测" else language
-        segments = align_audio_text(
-            audio_path,
-            text_content,
-            model_name=model_size.lower(),
-            use_gpu=True,  # 启用GPU加速
-            max_chars=int(max_chars)  # 每行字数限制
-        )
-        
-        # 生成SRT文件
-        output_dir = tempfile.gettempdir()
-        srt_filename = os.path.splitext(os.path.basename(audio_path))[0] + ".srt"
-        srt_path = os.path.join(output_dir, srt_filename)
-        
-        generate_srt(segments, srt_path)
+        # 环境变量 TXT2SRT_PROFILE 开启时，每个任务的剖析结果写入单独的目录
+        profiler = profiler_from_env(audio_path, ui="gradio", model=model_size.lower())
+        report = AlignmentReport(audio_path, model=model_size.lower(), profiler=profiler) if profiler else None
+        with profiler or contextlib.nullcontext():
+            segments = align_audio_text(
+                audio_path,
+                text_content,
+                model_name=model_size.lower(),
+                use_gpu=True,  # 启用GPU加速
+                max_chars=int(max_chars),  # 每行字数限制
+                report=report
+            )
+            
+            # 生成SRT文件（每个任务单独的目录，同名音频的并发任务互不覆盖）
+            srt_filename = os.path.splitext(os.path.basename(audio_path))[0] + ".srt"
+            with workspace.job() as job_dir:
+                srt_path = os.path.join(job_dir, srt_filename)
+                generate_srt(segments, srt_path)
+        if profiler is not None:
+            profiler.save_report(report)
         
         # 生成预览内容（前10个段落）
         preview = "📄 字幕预览 (前10个段落):\n\n"
@@ -104,6 +187,8 @@ def process_audio_text(audio_file, text_input, text_file, model_size, language,
         success_msg += f"  - 字幕段落数: {len(segments)}\n"
         success_msg += f"  - 音频时长: {segments[-1]['end']:.2f} 秒\n"
         success_msg += f"  - 输出文件: {srt_filename}\n"
+        if profiler is not None:
+            success_msg += f"  - 剖析结果: {profiler.job_dir}\n"
         
         return srt_path, preview, success_msg
         
@@ -269,9 +354,10 @@ def create_ui():
                 """
             )
         
-        # 绑定处理函数
+        # 绑定处理函数（并发由 job_queue 控制，Gradio 只负责推送排队位置和结果）
         process_btn.click(
-            fn=process_audio_text,
+            fn=submit_audio_text,
+            concurrency_limit=None,
             inputs=[
                 audio_input,
                 text_input,
@@ -323,7 +409,14 @@ def main():
     print("正在启动服务器...")
     print()
     
+    stats = job_queue.stats()
+    print(f"同时处理 {stats['workers']} 个任务，最多排队 {stats['max_pending']} 个")
+    warm_up_models()
+    workspace.start_janitor()
+    print(f"任务输出目录: {workspace.root}")
+    
     app = create_ui()
+    app.queue()
     
     # 启动应用
     # Gradio会自动寻找可用端口（从7860开始）
@@ -332,8 +425,8 @@ def main():
         share=False,
         inbrowser=True,  # 自动打开浏览器
         show_error=True,
-        # 兼容新版Gradio
-        allowed_paths=None
+        # 允许下载任务输出目录中的字幕（TXT2SRT_UI_WORKDIR 可能不在系统临时目录下）
+        allowed_paths=[workspace.root]
     )
 
 
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+语音活动检测（VAD）与按时长比例分配文本
+
+用于不运行 Whisper 识别的对齐模式：
+1. detect_speech_regions 找出音频中的语音区间
+   （优先使用 faster-whisper 自带的 Silero VAD，不可用时退化为 NumPy 能量检测）
+2. distribute_sentences 把用户句子按字符数比例铺到语音区间上（静音处不放文字），
+   句子边界附近有停顿时对齐到停顿处
+3. draft_align 组合以上两步：不加载任何模型，几秒钟生成草稿字幕
+"""
+
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from txt2srt_timeline import PUNCTUATION
+
+
+SAMPLE_RATE = 16000
+
+
+def count_chars(text: str) -> int:
+    """
+    计算有效字符数（去除标点和空白）
+    """
+    return len([c for c in text if c.strip() and c not in PUNCTUATION])
+
+
+def detect_speech_regions(samples: np.ndarray, min_silence_ms: int = 300) -> List[Tuple[float, float]]:
+    """
+    检测语音区间
+
+    Args:
+        samples: 16kHz 单声道 float32 音频
+        min_silence_ms: 短于该时长的静音不切分
+
+    Returns:
+        语音区间列表 [(开始秒, 结束秒), ...]，按时间排序
+    """
+    if len(samples) == 0:
+        return []
+
+    try:
+        from faster_whisper.vad import get_speech_timestamps, VadOptions
+        speech = get_speech_timestamps(samples, VadOptions(min_silence_duration_ms=min_silence_ms))
+        return [(ts["start"] / SAMPLE_RATE, ts["end"] / SAMPLE_RATE) for ts in speech]
+    except ImportError:
+        return _energy_speech_regions(samples, min_silence_ms)
+
+
+def _energy_speech_regions(samples: np.ndarray, min_silence_ms: int = 300) -> List[Tuple[float, float]]:
+    """
+    NumPy 能量检测：30ms 帧能量高于自适应阈值的视为语音
+    """
+    frame = SAMPLE_RATE * 30 // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0.0, len(samples) / SAMPLE_RATE)]
+
+    energy = np.sqrt(np.square(samples[:n_frames * frame].reshape(n_frames, frame)).mean(axis=1))
+    # 阈值取在底噪（低分位）和语音（高分位）之间
+    noise_floor = np.percentile(energy, 10)
+    speech_level = np.percentile(energy, 90)
+    voiced = energy > noise_floor + 0.1 * (speech_level - noise_floor)
+
+    # 填平短于 min_silence_ms 的静音
+    min_gap = max(1, min_silence_ms // 30)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(float(start * frame / SAMPLE_RATE), float(end * frame / SAMPLE_RATE)) for start, end in regions]
+
+
+def distribute_sentences(sentences: List[str], regions: List[Tuple[float, float]], snap_seconds: float = 0.0) -> List[Dict]:
+    """
+    把句子按字符数比例分配到语音区间上
+
+    把所有语音区间首尾相接成一条"语音时间轴"，每个字符占用相同的语音时长，
+    再把句子在语音时间轴上的起止位置换算回真实时间（静音区不会分到文字）。
+
+    snap_seconds > 0 时，句子边界与某个停顿的距离在 snap_seconds 以内就对齐到该停顿：
+    前一句在停顿开始处结束，后一句在停顿结束处开始（句子通常在停顿处结束）。
+
+    Args:
+        sentences: 用户句子列表
+        regions: 语音区间列表 [(开始秒, 结束秒), ...]
+        snap_seconds: 句子边界吸附到停顿的最大距离（秒，0 表示不吸附）
+
+    Returns:
+        [{"start", "end", "text"}, ...]
+    """
+    sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+    if not sentences or not regions:
+        return []
+
+    starts = np.array([start for start, _ in regions], dtype=np.float64)
+    ends = np.array([end for _, end in regions], dtype=np.float64)
+    # 每个语音区间在语音时间轴上的起点
+    speech_offsets = np.concatenate(([0.0], np.cumsum(ends - starts)))
+    total_speech = speech_offsets[-1]
+
+    counts = np.array([max(1, count_chars(sentence)) for sentence in sentences], dtype=np.float64)
+    boundaries = np.concatenate(([0.0], np.cumsum(counts))) / counts.sum() * total_speech
+
+    def to_real_time(position, side):
+        # 落在两个区间交界处时，句首取后一个区间的开头，句尾取前一个区间的结尾
+        k = np.searchsorted(speech_offsets, position, side=side) - 1
+        k = np.clip(k, 0, len(regions) - 1)
+        return starts[k] + (position - speech_offsets[k])
+
+    sentence_starts = to_real_time(boundaries[:-1], "right")
+    sentence_ends = to_real_time(boundaries[1:], "left")
+
+    if snap_seconds > 0 and len(regions) > 1 and len(sentences) > 1:
+        _snap_to_pauses(sentence_starts, sentence_ends, starts, ends, snap_seconds)
+
+    return [
+        {"start": float(start), "end": float(end), "text": sentence}
+        for start, end, sentence in zip(sentence_starts, sentence_ends, sentences)
+    ]
+
+
+def _snap_to_pauses(sentence_starts: np.ndarray, sentence_ends: np.ndarray, starts: np.ndarray, ends: np.ndarray, snap_seconds: float):
+    """
+    把句子边界吸附到最近的停顿（原地修改），每个停顿最多被一个边界使用
+    """
+    pause_starts = ends[:-1]
+    pause_ends = starts[1:]
+    pause_middles = (pause_starts + pause_ends) / 2
+
+    # 每个句子边界（第 i 句与第 i+1 句之间）最近的停顿
+    boundary_times = (sentence_ends[:-1] + sentence_starts[1:]) / 2
+    nearest = np.clip(np.searchsorted(pause_middles, boundary_times), 1, len(pause_middles)) - 1
+    further = np.minimum(nearest + 1, len(pause_middles) - 1)
+    use_further = np.abs(pause_middles[further] - boundary_times) < np.abs(pause_middles[nearest] - boundary_times)
+    nearest = np.where(use_further, further, nearest)
+
+    used = -1
+    for i, k in enumerate(nearest):
+        if k <= used or abs(pause_middles[k] - boundary_times[i]) > snap_seconds:
+            continue
+        # 吸附后两句都必须保留正的时长
+        if pause_starts[k] <= sentence_starts[i] or pause_ends[k] >= sentence_ends[i + 1]:
+            continue
+        sentence_ends[i] = pause_starts[k]
+        sentence_starts[i + 1] = pause_ends[k]
+        used = k
+
+
+def draft_align(audio_path: str, sentences: List[str], snap_seconds: float = 1.5) -> List[Dict]:
+    """
+    草稿对齐：只做语音活动检测，把句子按字符数比例分配到语音区间上
+
+    不加载 Whisper / wav2vec2 模型，CPU 上远快于实时（主要耗时是 ffmpeg 解码和 VAD）。
+
+    Args:
+        audio_path: 音频文件路径
+        sentences: 用户句子列表
+        snap_seconds: 句子边界吸附到停顿的最大距离（秒）
+
+    Returns:
+        [{"start", "end", "text"}, ...]
+    """
+    from txt2srt_longaudio import load_audio_range
+
+    samples = load_audio_range(audio_path, 0.0, None)
+    regions = detect_speech_regions(samples)
+    if not regions:
+        regions = [(0.0, len(samples) / SAMPLE_RATE)]
+    print(f"   检测到 {len(regions)} 个语音区间（音频 {len(samples) / SAMPLE_RATE:.1f} 秒）")
+    return distribute_sentences(sentences, regions, snap_seconds=snap_seconds)
@@ -7,13 +7,20 @@
 
 import os
 import sys
+import gc
 import argparse
+import contextlib
 import re
-from typing import List, Dict
+import bisect
+import threading
+from typing import List, Dict, Union
 
-# WhisperX 相关导入
-import whisperx
-import torch
+import numpy as np
+
+from txt2srt_timeline import CharTimeline, remove_punctuation, text_to_codes
+from txt2srt_cues import CueList, settle_starts
+from txt2srt_models import acquire_inference
+from txt2srt_report import AlignmentReport, STAGE_NAMES, stage, write_report
 
 
 def format_timestamp(seconds: float) -> str:
@@ -124,13 +131,299 @@ def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
     return segments if segments else [sentence]
 
 
+class WhisperXAligner:
+    """
+    可复用的 WhisperX 对齐器：缓存 ASR 模型和 wav2vec2 对齐模型
+    
+    - ASR 模型按 (模型名, 计算精度) 缓存
+    - 对齐模型及其 metadata 按语言缓存
+    - 批量处理多个文件时，每个文件只需解码音频 + 推理
+    - 可被多个线程共用：模型只加载一次，同一模型的推理依次进行（见 txt2srt_models.acquire_inference）
+    """
+    
+    def __init__(self, use_gpu: bool = True, backend=None):
+        """
+        Args:
+            use_gpu: 是否使用GPU
+            backend: 提供 load_model / load_align_model / load_audio / align 的后端
+                     （默认为 whisperx 模块本身；基准测试可替换为模拟识别后端）
+        """
+        self.device = "cuda" if use_gpu and _cuda_available() else "cpu"
+        self.compute_type = "float16" if self.device == "cuda" else "int8"
+        if backend is None:
+            # whisperx 会连带导入 torch / transformers，创建对齐器时才导入（--help 等不需要）
+            import whisperx
+            backend = whisperx
+        self.backend = backend
+        
+        # (model_name, compute_type) -> ASR 模型
+        self._asr_models = {}
+        # language -> (model_a, metadata)
+        self._align_models = {}
+        self._load_lock = threading.RLock()
+    
+    def get_asr_model(self, model_name: str):
+        """获取（必要时加载）Whisper ASR 模型"""
+        key = (model_name, self.compute_type)
+        with self._load_lock:
+            if key not in self._asr_models:
+                print(f"   加载 WhisperX 模型 ({model_name}, {self.compute_type})...")
+                self._asr_models[key] = self.backend.load_model(model_name, self.device, compute_type=self.compute_type)
+            else:
+                print(f"   复用已加载的 WhisperX 模型 ({model_name}, {self.compute_type})")
+            return self._asr_models[key]
+    
+    def get_align_model(self, language: str):
+        """获取（必要时加载）指定语言的 wav2vec2 对齐模型"""
+        with self._load_lock:
+            if language not in self._align_models:
+                print(f"   加载对齐模型 (wav2vec2, {language})...")
+                self._align_models[language] = self.backend.load_align_model(
+                    language_code=language, 
+                    device=self.device
+                )
+            else:
+                print(f"   复用已加载的对齐模型 (wav2vec2, {language})")
+            return self._align_models[language]
+    
+    def unload_asr(self, model_name: str = None):
+        """卸载 ASR 模型（model_name 为 None 时卸载全部）"""
+        with self._load_lock:
+            for key in list(self._asr_models):
+                if model_name is None or key[0] == model_name:
+                    del self._asr_models[key]
+        self._release_memory()
+    
+    def unload_align(self, language: str = None):
+        """卸载对齐模型（language 为 None 时卸载全部）"""
+        with self._load_lock:
+            for key in list(self._align_models):
+                if language is None or key == language:
+                    del self._align_models[key]
+        self._release_memory()
+    
+    def _release_memory(self):
+        gc.collect()
+        if self.device == "cuda":
+            import torch
+            torch.cuda.empty_cache()
+    
+    def align(
+        self,
+        audio_path: str, 
+        text: str, 
+        model_name: str = "base", 
+        max_chars: int = 30,
+        language: str = "zh",
+        report: AlignmentReport = None
+    ) -> List[Dict]:
+        """
+        使用缓存的模型执行一次音频-文本对齐，参数含义同 align_audio_text_whisperx
+        """
+        if self.device == "cuda":
+            try:
+                import torch
+                gpu_name = torch.cuda.get_device_name(0)
+                print(f"✅ 使用设备: CUDA ({gpu_name})")
+            except:
+                print(f"✅ 使用设备: CUDA")
+        else:
+            print("⚠️ GPU不可用，使用CPU处理（速度较慢）")
+        
+        print(f"\n🎯 步骤1: 加载 WhisperX 模型 ({model_name})...")
+        with stage(report, "model_load"):
+            model = self.get_asr_model(model_name)
+        
+        print(f"🎯 步骤2: 使用 Whisper 进行初步识别...")
+        with stage(report, "decode"):
+            audio = self.backend.load_audio(audio_path)
+        if report is not None:
+            report.audio_seconds = len(audio) / 16000
+        with acquire_inference(model, report), stage(report, "transcribe"):
+            result = model.transcribe(audio, batch_size=16, language=language)
+        
+        print(f"   识别到 {len(result['segments'])} 个语音段落")
+        
+        print(f"\n🎯 步骤3: 加载对齐模型 (wav2vec2)...")
+        with stage(report, "align_model_load"):
+            model_a, metadata = self.get_align_model(language)
+        
+        print(f"🎯 步骤4: 执行强制对齐...")
+        # 执行对齐 - 这是 WhisperX 的核心优势
+        with acquire_inference(model_a, report), stage(report, "forced_align"):
+            result = self.backend.align(
+                result["segments"], 
+                model_a, 
+                metadata, 
+                audio, 
+                self.device,
+                return_char_alignments=True  # 获取字符级对齐
+            )
+        
+        word_segments = _extract_word_segments(result)
+        print(f"   获得 {len(word_segments)} 个词级时间戳")
+        
+        print(f"\n🎯 步骤5: 将用户文本映射到时间戳...")
+        
+        # 分割用户文本
+        with stage(report, "split"):
+            user_sentences = split_text_into_segments(text, max_chars=max_chars)
+        print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
+        
+        return self._finish(user_sentences, word_segments, report)
+    
+    def align_without_asr(
+        self,
+        audio_path: str,
+        text: str,
+        max_chars: int = 30,
+        language: str = "zh",
+        block_seconds: float = 30.0,
+        padding: float = 1.0,
+        report: AlignmentReport = None
+    ) -> List[Dict]:
+        """
+        不运行 Whisper 识别，直接用用户文本做 wav2vec2 强制对齐
+        
+        步骤：
+        1. VAD 找出语音区间，合并成不超过 block_seconds 的粗分段（在停顿处切开）
+        2. 用户句子按字符数比例铺到语音时间轴上，按句子中点归入各个粗分段
+        3. 每个粗分段前后各放宽 padding 秒，交给 whisperx.align 做 CTC 强制对齐
+        
+        省掉了自回归解码（CPU 上最耗时的步骤），适合干净的朗读/解说音频。
+        """
+        from txt2srt_vad import detect_speech_regions, distribute_sentences
+        
+        print(f"✅ 使用设备: {self.device.upper()}（强制对齐模式，跳过 Whisper 识别）")
+        
+        print(f"\n🎯 步骤1: 检测语音区间 (VAD)...")
+        with stage(report, "decode"):
+            audio = self.backend.load_audio(audio_path)
+        duration = len(audio) / 16000
+        if report is not None:
+            report.audio_seconds = duration
+        with stage(report, "vad"):
+            regions = detect_speech_regions(audio)
+        if not regions:
+            regions = [(0.0, duration)]
+        print(f"   检测到 {len(regions)} 个语音区间")
+        
+        with stage(report, "split"):
+            user_sentences = split_text_into_segments(text, max_chars=max_chars)
+        print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
+        
+        print(f"\n🎯 步骤2: 按时长比例把句子分配到粗分段...")
+        blocks = []
+        for start, end in regions:
+            if blocks and end - blocks[-1][0] <= block_seconds:
+                blocks[-1][1] = end
+            else:
+                blocks.append([start, end])
+        
+        block_texts = [[] for _ in blocks]
+        block_ends = [end for _, end in blocks]
+        for sentence in distribute_sentences(user_sentences, regions):
+            middle = (sentence["start"] + sentence["end"]) / 2
+            k = min(bisect.bisect_left(block_ends, middle), len(blocks) - 1)
+            block_texts[k].append(sentence["text"])
+        
+        separator = "" if language in ("zh", "ja", "ko", "th", "lo", "my", "yue") else " "
+        coarse_segments = [
+            {
+                "start": max(0.0, start - padding),
+                "end": min(duration, end + padding),
+                "text": separator.join(texts)
+            }
+            for (start, end), texts in zip(blocks, block_texts) if texts
+        ]
+        print(f"   共 {len(coarse_segments)} 个粗分段")
+        
+        print(f"\n🎯 步骤3: 加载对齐模型 (wav2vec2)...")
+        with stage(report, "align_model_load"):
+            model_a, metadata = self.get_align_model(language)
+        
+        print(f"🎯 步骤4: 执行强制对齐...")
+        with acquire_inference(model_a, report), stage(report, "forced_align"):
+            result = self.backend.align(
+                coarse_segments,
+                model_a,
+                metadata,
+                audio,
+                self.device,
+                return_char_alignments=True
+            )
+        
+        word_segments = _extract_word_segments(result)
+        print(f"   获得 {len(word_segments)} 个词级时间戳")
+        
+        print(f"\n🎯 步骤5: 将用户文本映射到时间戳...")
+        return self._finish(user_sentences, word_segments, report)
+    
+    def _finish(self, user_sentences: List[str], word_segments: List[Dict], report: AlignmentReport = None) -> List[Dict]:
+        """
+        词级时间戳 → 用户句子时间戳，并修复重叠
+        """
+        # 使用词级时间戳为用户句子分配时间
+        with stage(report, "match"):
+            aligned_segments = align_user_sentences_to_words(user_sentences, word_segments, report=report)
+        
+        # 后处理：修复重叠
+        with stage(report, "postprocess"):
+            aligned_segments = fix_overlapping_timestamps(aligned_segments)
+        
+        print(f"\n✅ 对齐完成！生成了 {len(aligned_segments)} 个字幕段落")
+        
+        if report is not None:
+            report.finish(aligned_segments)
+        return aligned_segments
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def _extract_word_segments(result: Dict) -> List[Dict]:
+    """
+    提取 whisperx.align 结果中的词级时间戳（跳过无法对齐的词）
+    """
+    word_segments = []
+    for segment in result["segments"]:
+        if "words" in segment:
+            for word in segment["words"]:
+                if "start" in word and "end" in word:
+                    word_segments.append({
+                        "word": word["word"],
+                        "start": word["start"],
+                        "end": word["end"]
+                    })
+    return word_segments
+
+
+# 进程内共享的对齐器（按设备区分），重复调用 align_audio_text_whisperx 时复用模型
+_default_aligners = {}
+
+
+def get_default_aligner(use_gpu: bool = True) -> WhisperXAligner:
+    """获取进程内共享的 WhisperXAligner"""
+    if use_gpu not in _default_aligners:
+        _default_aligners[use_gpu] = WhisperXAligner(use_gpu=use_gpu)
+    return _default_aligners[use_gpu]
+
+
 def align_audio_text_whisperx(
     audio_path: str, 
     text: str, 
     model_name: str = "base", 
     use_gpu: bool = True,
     max_chars: int = 30,
-    language: str = "zh"
+    language: str = "zh",
+    aligner: WhisperXAligner = None,
+    skip_asr: bool = False,
+    report: AlignmentReport = None
 ) -> List[Dict]:
     """
     使用 WhisperX 进行音频-文本对齐
@@ -147,240 +440,250 @@ def align_audio_text_whisperx(
         use_gpu: 是否使用GPU
         max_chars: 每行最大字符数
         language: 语言代码
+        aligner: 复用的 WhisperXAligner（默认使用进程内共享的对齐器）
+        skip_asr: 跳过 Whisper 识别，用 VAD + 按时长比例切分得到粗分段后直接强制对齐用户文本
+        report: 分阶段指标（可选，传入 AlignmentReport 后填充各阶段耗时、内存、字符数和匹配率）
     
     Returns:
         包含时间戳的文本段落列表
     """
-    # 设置设备
-    device = "cuda" if use_gpu and torch.cuda.is_available() else "cpu"
-    compute_type = "float16" if device == "cuda" else "int8"
-    
-    if device == "cuda":
-        try:
-            gpu_name = torch.cuda.get_device_name(0)
-            print(f"✅ 使用设备: CUDA ({gpu_name})")
-        except:
-            print(f"✅ 使用设备: CUDA")
-    else:
-        print("⚠️ GPU不可用，使用CPU处理（速度较慢）")
-    
-    print(f"\n🎯 步骤1: 加载 WhisperX 模型 ({model_name})...")
-    model = whisperx.load_model(model_name, device, compute_type=compute_type)
-    
-    print(f"🎯 步骤2: 使用 Whisper 进行初步识别...")
-    audio = whisperx.load_audio(audio_path)
-    result = model.transcribe(audio, batch_size=16, language=language)
-    
-    print(f"   识别到 {len(result['segments'])} 个语音段落")
-    
-    print(f"\n🎯 步骤3: 加载对齐模型 (wav2vec2)...")
-    # 加载对齐模型
-    model_a, metadata = whisperx.load_align_model(
-        language_code=language, 
-        device=device
-    )
-    
-    print(f"🎯 步骤4: 执行强制对齐...")
-    # 执行对齐 - 这是 WhisperX 的核心优势
-    result = whisperx.align(
-        result["segments"], 
-        model_a, 
-        metadata, 
-        audio, 
-        device,
-        return_char_alignments=True  # 获取字符级对齐
+    if aligner is None:
+        aligner = get_default_aligner(use_gpu)
+    
+    if skip_asr:
+        return aligner.align_without_asr(
+            audio_path,
+            text,
+            max_chars=max_chars,
+            language=language,
+            report=report
+        )
+    
+    return aligner.align(
+        audio_path,
+        text,
+        model_name=model_name,
+        max_chars=max_chars,
+        language=language,
+        report=report
     )
-    
-    # 提取词级时间戳
-    word_segments = []
-    for segment in result["segments"]:
-        if "words" in segment:
-            for word in segment["words"]:
-                if "start" in word and "end" in word:
-                    word_segments.append({
-                        "word": word["word"],
-                        "start": word["start"],
-                        "end": word["end"]
-                    })
-    
-    print(f"   获得 {len(word_segments)} 个词级时间戳")
-    
-    print(f"\n🎯 步骤5: 将用户文本映射到时间戳...")
-    
-    # 分割用户文本
-    user_sentences = split_text_into_segments(text, max_chars=max_chars)
-    print(f"   用户文本有 {len(user_sentences)} 个句子（每行限制 {max_chars} 字）")
-    
-    # 使用词级时间戳为用户句子分配时间
-    aligned_segments = align_user_sentences_to_words(user_sentences, word_segments)
-    
-    # 后处理：修复重叠
-    aligned_segments = fix_overlapping_timestamps(aligned_segments)
-    
-    print(f"\n✅ 对齐完成！生成了 {len(aligned_segments)} 个字幕段落")
-    
-    return aligned_segments
+
+
+def _score_offsets(recognized_codes: np.ndarray, sentence_codes: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """
+    计算句子放在识别文本每个起始位置 lo..hi-1 时逐字相等的字符数（向量化）
+
+    对 recognized_codes[lo:hi+len-1] 取长度为句子长度的滑动窗口视图（不复制），
+    一次比较出所有起始位置的得分；超出识别文本末尾的部分不计分。
+    """
+    length = len(sentence_codes)
+    window = recognized_codes[lo:hi + length - 1]
+    missing = (hi - lo) + length - 1 - len(window)
+    if missing > 0:
+        # 用不会出现在文本中的码点补齐末尾
+        window = np.concatenate((window, np.full(missing, 0xFFFFFFFF, dtype=np.uint32)))
+    views = np.lib.stride_tricks.sliding_window_view(window, length)
+    return (views == sentence_codes).sum(axis=1)
 
 
 def align_user_sentences_to_words(
     user_sentences: List[str], 
-    word_segments: List[Dict]
-) -> List[Dict]:
+    word_segments: List[Dict],
+    search_chars: int = 50,
+    min_match_ratio: float = 0.3,
+    min_match_chars: int = 4,
+    max_search_chars: int = 4000,
+    far_match_ratio: float = 0.6,
+    report: AlignmentReport = None
+) -> CueList:
     """
     将用户句子与 WhisperX 的词级时间戳对齐
     
     策略：使用字符级匹配，找到每个用户句子对应的时间范围
+    
+    先在当前位置之后 search_chars 个字符内查找；最佳匹配的字符数低于句子长度的
+    min_match_ratio 时（例如朗读时跳过了一段，或文稿缺了一段），搜索范围向前后
+    成倍扩大，直到找到足够好的位置或达到 max_search_chars。
+
+    字幕顺序始终与文稿一致：
+    - 扩大搜索不早于上一个可靠匹配的句子的结束位置，也不越过下一句
+      （下一句在当前位置附近能可靠匹配时，本句不能落在它之后）
+    - 扩大搜索要求匹配比例不低于 far_match_ratio（离当前位置越远，偶然凑出几个相同字符的位置越多）
+    - 找不到可靠位置的句子紧接在上一句之后；之后的句子向后找回位置时（朗读时跳过了这几句），
+      这几句按长度平分两次可靠匹配之间的时间
+    
+    Args:
+        user_sentences: 用户句子列表
+        word_segments: WhisperX 词级时间戳
+        search_chars: 初始搜索范围（字符数）
+        min_match_ratio: 认为匹配可靠的最低匹配比例
+        min_match_chars: 扩大搜索后接受的最少匹配字符数（避免短句在远处误匹配）
+        max_search_chars: 向前后扩大搜索的最大距离（字符数，中文约15分钟语音）
+        far_match_ratio: 扩大搜索后接受的最低匹配比例
+        report: 分阶段指标（可选，记录字符数和匹配率 = 匹配上的字符数 / 用户字符数）
     """
     if not word_segments:
         print("⚠️ 警告: 没有词级时间戳，使用估算")
         return []
     
-    # 构建识别文本的字符-时间映射
-    char_times = []
-    for word in word_segments:
-        word_text = word["word"]
-        word_start = word["start"]
-        word_end = word["end"]
-        word_duration = word_end - word_start
-        
-        # 为每个字符估算时间
-        for i, char in enumerate(word_text):
-            if char.strip():  # 跳过空格
-                char_time = word_start + (i / len(word_text)) * word_duration
-                char_times.append({
-                    "char": char,
-                    "time": char_time
-                })
-    
-    # 提取识别的字符序列（去除标点）
-    def remove_punct(text):
-        return ''.join([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
-    
-    recognized_chars = [ct["char"] for ct in char_times if ct["char"] not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]']
-    recognized_times = [ct["time"] for ct in char_times if ct["char"] not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]']
-    
-    # 为每个用户句子找到对应的时间范围
-    aligned_segments = []
-    current_char_idx = 0
+    # 构建识别文本的字符时间轴（去除标点）
+    timeline = CharTimeline.from_words(word_segments)
+    recognized_codes = timeline.codes
+    recognized_times = timeline.times
+    total_chars = len(recognized_codes)
     
+    # 有效句子（去除标点后非空）及其码点，扩大搜索时要看下一句的位置
+    sentences = []
     for sentence in user_sentences:
-        if not sentence.strip():
-            continue
-        
-        sentence_chars = remove_punct(sentence)
-        if not sentence_chars:
-            continue
+        sentence_chars = remove_punctuation(sentence) if sentence.strip() else ""
+        if sentence_chars:
+            sentences.append((sentence.strip(), sentence_chars, text_to_codes(sentence_chars)))
+    
+    def local_match(codes, position):
+        """在 position 之后 search_chars 个字符内的最佳位置和得分（得分相同时取最靠前的位置）"""
+        search_range = min(search_chars, total_chars - position)
+        if search_range <= 0:
+            return position, 0
+        scores = _score_offsets(recognized_codes, codes, position, position + search_range)
+        best_offset = int(np.argmax(scores))
+        return position + best_offset, int(scores[best_offset])
+    
+    # 为每个用户句子找到对应的字符范围 [开始, 结束)
+    spans = []
+    current_char_idx = 0
+    # 上一个可靠匹配的结束位置（向后搜索的下限），以及它之后的句子在 spans 中的开始下标
+    reliable_char_idx = 0
+    unreliable_from = 0
+    widened = 0
+    user_chars = matched_chars = 0
+    
+    for k, (sentence, sentence_chars, sentence_codes) in enumerate(sentences):
+        length = len(sentence_codes)
+        user_chars += length
         
         # 在识别字符中查找匹配
-        best_start_idx = current_char_idx
-        best_end_idx = min(current_char_idx + len(sentence_chars), len(recognized_chars))
+        best_start_idx, best_match_score = local_match(sentence_codes, current_char_idx)
         
-        # 简单的滑动窗口匹配
-        best_match_score = 0
-        search_range = min(50, len(recognized_chars) - current_char_idx)
-        
-        for offset in range(search_range):
-            start_idx = current_char_idx + offset
-            end_idx = min(start_idx + len(sentence_chars), len(recognized_chars))
-            
-            if end_idx > len(recognized_chars):
+        # 匹配较差时成倍扩大搜索范围（向前后两个方向）
+        required = max(min_match_ratio * length, min_match_chars)
+        far_required = max(far_match_ratio * length, min_match_chars)
+        # 下一句在当前位置附近可靠匹配的位置：本句扩大搜索时不能越过它
+        next_limit = None
+        radius = search_chars
+        while best_match_score < required <= length and current_char_idx < total_chars and radius < max_search_chars:
+            radius = min(radius * 2, max_search_chars)
+            if next_limit is None:
+                next_limit = total_chars
+                if k + 1 < len(sentences):
+                    next_codes = sentences[k + 1][2]
+                    next_start, next_score = local_match(next_codes, current_char_idx)
+                    if next_score >= max(min_match_ratio * len(next_codes), min_match_chars):
+                        next_limit = next_start
+            lo = max(reliable_char_idx, current_char_idx - radius)
+            hi = min(next_limit, current_char_idx + radius)
+            if hi > lo:
+                scores = _score_offsets(recognized_codes, sentence_codes, lo, hi)
+                top = int(scores.max())
+                if top >= far_required and top > best_match_score:
+                    # 得分相同时取离当前位置最近的
+                    candidates = np.flatnonzero(scores == top) + lo
+                    best_start_idx = int(candidates[np.argmin(np.abs(candidates - current_char_idx))])
+                    best_match_score = top
+                    widened += 1
+                    break
+            if lo <= reliable_char_idx and hi >= next_limit:
                 break
-            
-            # 计算匹配分数
-            match_count = sum(
-                1 for i, char in enumerate(sentence_chars) 
-                if start_idx + i < len(recognized_chars) and recognized_chars[start_idx + i] == char
-            )
-            
-            if match_count > best_match_score:
-                best_match_score = match_count
-                best_start_idx = start_idx
-                best_end_idx = min(start_idx + len(sentence_chars), len(recognized_chars))
-        
-        # 获取时间戳
-        if best_start_idx < len(recognized_times) and best_end_idx > 0:
-            start_time = recognized_times[best_start_idx]
-            end_time = recognized_times[min(best_end_idx - 1, len(recognized_times) - 1)]
+        
+        matched_chars += best_match_score
+        if best_match_score >= min_match_ratio * length:
+            if best_start_idx < current_char_idx:
+                # 向后找回了位置：上一个可靠匹配之后的句子（朗读时可能跳过了）按长度
+                # 平分两次可靠匹配之间的字符，保持字幕顺序与文稿一致
+                pending = spans[unreliable_from:]
+                weights = np.cumsum([0] + [len(sentences[i][1]) for i in range(unreliable_from, k)])
+                bounds = reliable_char_idx + (best_start_idx - reliable_char_idx) * weights // max(1, weights[-1])
+                for span, span_start, span_end in zip(pending, bounds[:-1].tolist(), bounds[1:].tolist()):
+                    span[0], span[1] = span_start, span_end
+            best_end_idx = min(best_start_idx + length, total_chars)
+            reliable_char_idx = best_end_idx
+            unreliable_from = k + 1
+        else:
+            # 没有可靠的位置：紧接在上一句之后
+            best_start_idx = current_char_idx
+            best_end_idx = min(best_start_idx + length, total_chars)
+        spans.append([best_start_idx, best_end_idx])
+        current_char_idx = best_end_idx
+    
+    # 获取时间戳
+    starts, ends, texts = [], [], []
+    for (sentence, sentence_chars, _), (best_start_idx, best_end_idx) in zip(sentences, spans):
+        if best_start_idx < len(recognized_times):
+            start_time = float(recognized_times[best_start_idx])
+            end_time = float(recognized_times[max(best_start_idx, min(best_end_idx - 1, len(recognized_times) - 1))])
             
             # 确保最小时长
             if end_time - start_time < 0.5:
                 end_time = start_time + max(0.5, len(sentence_chars) * 0.15)
-            
-            aligned_segments.append({
-                "start": start_time,
-                "end": end_time,
-                "text": sentence.strip()
-            })
-            
-            # 更新当前位置
-            current_char_idx = best_end_idx
-        else:
+        elif texts:
             # 无法匹配，使用估算
-            if aligned_segments:
-                last_end = aligned_segments[-1]["end"]
-                estimated_duration = max(1.0, len(sentence_chars) * 0.15)
-                aligned_segments.append({
-                    "start": last_end,
-                    "end": last_end + estimated_duration,
-                    "text": sentence.strip()
-                })
+            start_time = ends[-1]
+            end_time = start_time + max(1.0, len(sentence_chars) * 0.15)
+        else:
+            continue
+        starts.append(start_time)
+        ends.append(end_time)
+        texts.append(sentence)
     
-    return aligned_segments
+    if widened:
+        print(f"   🔎 {widened} 个句子在扩大搜索范围后重新找到位置")
+    
+    if report is not None:
+        report.user_sentences = len(sentences)
+        report.user_chars = user_chars
+        report.recognized_chars = total_chars
+        report.match_rate = matched_chars / user_chars if user_chars else None
+    
+    return CueList(np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64), texts)
 
 
-def fix_overlapping_timestamps(segments: List[Dict]) -> List[Dict]:
+def fix_overlapping_timestamps(segments: Union[CueList, List[Dict]]) -> CueList:
     """
-    修复重叠的时间戳
+    修复重叠的时间戳（在 starts/ends 数组上整体计算）
     """
     if len(segments) == 0:
         return segments
     
-    segments = sorted(segments, key=lambda x: x["start"])
-    fixed_segments = []
+    cues = CueList.from_segments(segments).sorted_by_start().copy()
+    original_ends = cues.ends
     
-    for i, segment in enumerate(segments):
-        start = segment["start"]
-        end = segment["end"]
-        text = segment["text"]
-        
-        # 计算合理的最大时长
-        text_chars = len([c for c in text if c.strip() and c not in '。，！？；：、,.!?;: 　「」『』""''（）()【】[]'])
-        max_duration = max(2.0, 1.0 + text_chars * 0.4)
-        min_duration = max(0.8, 0.5 + text_chars * 0.12)
-        
-        # 确保不与前一个重叠
-        if i > 0:
-            prev_end = fixed_segments[-1]["end"]
-            if start < prev_end:
-                start = prev_end
+    # 计算合理的最大时长
+    text_chars = cues.char_counts()
+    max_duration = np.maximum(2.0, 1.0 + text_chars * 0.4)
+    min_duration = np.maximum(0.8, 0.5 + text_chars * 0.12)
+    next_starts = np.append(cues.starts[1:], np.inf)
+    
+    def compute_ends(starts, index):
+        start = starts[index]
+        end = original_ends[index]
         
         # 修复时长
         duration = end - start
-        if duration > max_duration:
-            end = start + max_duration
-        if duration < min_duration:
-            end = start + min_duration
+        end = np.where(duration > max_duration[index], start + max_duration[index], end)
+        end = np.where(duration < min_duration[index], start + min_duration[index], end)
         
         # 添加阅读缓冲
         end = end + 0.3
         
         # 确保不超过下一个字幕
-        if i + 1 < len(segments):
-            next_start = segments[i + 1]["start"]
-            if end > next_start:
-                end = max(start + 0.5, next_start - 0.05)
+        next_start = next_starts[index]
+        end = np.where(end > next_start, np.maximum(start + 0.5, next_start - 0.05), end)
         
         # 确保最小时长
-        if end <= start:
-            end = start + max(1.0, text_chars * 0.15)
-        
-        fixed_segments.append({
-            "start": start,
-            "end": end,
-            "text": text
-        })
+        return np.where(end <= start, start + np.maximum(1.0, text_chars[index] * 0.15), end)
     
-    return fixed_segments
+    # 确保不与前一个重叠（递推约束）
+    ends = settle_starts(cues.starts, compute_ends)
+    return CueList(cues.starts, ends, cues.texts)
 
 
 def generate_srt(segments: List[Dict], output_path: str):
@@ -433,6 +736,34 @@ def main():
         type=int,
         default=30
     )
+    parser.add_argument(
+        "--no-asr",
+        help="跳过 Whisper 识别：按语音区间切分用户文本后直接强制对齐（适合干净的朗读音频，CPU 上快数倍）",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--report",
+        help="完成后打印分阶段耗时/内存汇总表",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--report-json",
+        help="把分阶段指标写入 <输出文件>.report.json",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--profile",
+        help="性能剖析：cProfile 剖析整个任务（all）或单个阶段，并记录分句/匹配阶段的内存分配",
+        nargs="?",
+        const="all",
+        default=None,
+        choices=("all",) + STAGE_NAMES
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="剖析结果根目录（每个任务一个子目录，默认: 环境变量 TXT2SRT_PROFILE_DIR 或 ./profiles）",
+        default=None
+    )
     
     args = parser.parse_args()
     
@@ -460,18 +791,36 @@ def main():
     print("🎵 音频-文本对齐工具 (WhisperX 版本)")
     print("=" * 60)
     
-    segments = align_audio_text_whisperx(
-        args.audio, 
-        text_content, 
-        args.model,
-        max_chars=args.max_chars,
-        language=args.language
-    )
-    
-    # 生成SRT
-    generate_srt(segments, output_path)
+    engine = "whisperx-noasr" if args.no_asr else "whisperx"
+    profiler = None
+    if args.profile:
+        from txt2srt_profile import RunProfiler
+        profiler = RunProfiler.for_job(args.audio, cpu_stage=args.profile, root=args.profile_dir,
+                                       meta={"engine": engine, "model": args.model})
+    
+    report = None
+    if args.report or args.report_json or profiler is not None:
+        report = AlignmentReport(args.audio, engine=engine, model=args.model, profiler=profiler)
+    with profiler or contextlib.nullcontext():
+        segments = align_audio_text_whisperx(
+            args.audio, 
+            text_content, 
+            args.model,
+            max_chars=args.max_chars,
+            language=args.language,
+            skip_asr=args.no_asr,
+            report=report
+        )
+        
+        # 生成SRT
+        with stage(report, "write_srt"):
+            generate_srt(segments, output_path)
     
     print(f"\n✅ 完成！共生成 {len(segments)} 个字幕段落")
+    write_report(report, output_path, show=args.report, save_json=args.report_json)
+    if profiler is not None:
+        profiler.save_report(report)
+        print(f"🔬 剖析结果已保存: {profiler.job_dir}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Web 界面的任务工作目录：每个任务一个独立目录，后台定期清理
+
+- 每个任务在工作根目录下创建 <时间>-<任务ID>/，同名音频的并发任务互不覆盖
+- 字幕先写入临时文件再原子改名（generate_srt），下载时不会拿到写了一半的文件
+- 后台清理线程按存活时间和总大小删除旧任务目录（先删最旧的，正在处理的任务不删）
+
+环境变量：
+    TXT2SRT_UI_WORKDIR          工作根目录（默认 <系统临时目录>/txt2srt_jobs）
+    TXT2SRT_UI_JOB_TTL_SECONDS  任务目录保留多少秒（默认 86400，0 表示不按时间清理）
+    TXT2SRT_UI_WORKDIR_MB       工作根目录总大小上限（MB，默认 1024，0 表示不限制）
+"""
+
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import contextlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class JobWorkspace:
+    """
+    任务工作目录管理（线程安全）
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl_seconds: Optional[float] = None, max_mb: Optional[float] = None):
+        """
+        Args:
+            root: 工作根目录，None 表示读取环境变量
+            ttl_seconds: 任务目录保留时间（秒），None 表示读取环境变量，0 表示不按时间清理
+            max_mb: 总大小上限（MB），None 表示读取环境变量，0 表示不限制
+        """
+        if root is None:
+            root = os.environ.get("TXT2SRT_UI_WORKDIR") or os.path.join(tempfile.gettempdir(), "txt2srt_jobs")
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("TXT2SRT_UI_JOB_TTL_SECONDS", 86400))
+        if max_mb is None:
+            max_mb = float(os.environ.get("TXT2SRT_UI_WORKDIR_MB", 1024))
+
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_mb = max_mb
+
+        # 正在处理的任务目录名（清理时跳过）
+        self._active = set()
+        self._lock = threading.Lock()
+        self._janitor = None
+
+        self.created = 0
+        self.removed = 0
+
+    def create(self) -> str:
+        """
+        创建一个新的任务目录并标记为正在使用，返回目录路径
+        """
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:12]}"
+        # 先登记再创建，清理线程不会删掉刚创建的空目录
+        with self._lock:
+            self._active.add(name)
+            self.created += 1
+        path = os.path.join(self.root, name)
+        os.mkdir(path)
+        return path
+
+    def release(self, path: str):
+        """
+        任务结束：目录保留给用户下载，之后由清理线程按时间/大小删除
+        """
+        with self._lock:
+            self._active.discard(os.path.basename(path))
+
+    @contextlib.contextmanager
+    def job(self) -> Iterator[str]:
+        """
+        with workspace.job() as job_dir: ...  —— 处理期间目录不会被清理
+        """
+        path = self.create()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def sweep(self) -> int:
+        """
+        删除过期的任务目录；总大小仍超出上限时从最旧的开始删除。返回删除数量
+        """
+        now = time.time()
+        limit = self.max_mb * 1024 * 1024
+        with self._lock:
+            active = set(self._active)
+
+        jobs = self._scan()
+        total = sum(size for _, _, size in jobs)
+        removed = []
+        # 从最旧的开始：过期的直接删，没过期的在总大小超限时删
+        for mtime, name, size in jobs:
+            if name in active:
+                continue
+            expired = self.ttl_seconds > 0 and now - mtime > self.ttl_seconds
+            if expired or (self.max_mb > 0 and total > limit):
+                removed.append(name)
+                total -= size
+
+        for name in removed:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        if removed:
+            with self._lock:
+                self.removed += len(removed)
+            print(f"   🧹 已清理 {len(removed)} 个旧任务目录 ({self.root})")
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        jobs = self._scan()
+        with self._lock:
+            return {
+                "root": self.root,
+                "jobs": len(jobs),
+                "active": len(self._active),
+                "used_mb": round(sum(size for _, _, size in jobs) / 1024 / 1024, 1),
+                "max_mb": self.max_mb,
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "removed": self.removed,
+            }
+
+    def start_janitor(self, interval: Optional[float] = None):
+        """
+        启动后台清理线程（守护线程，不阻止进程退出）
+        """
+        if self._janitor is not None or (self.ttl_seconds <= 0 and self.max_mb <= 0):
+            return
+        if interval is None:
+            interval = max(10.0, min(600.0, self.ttl_seconds / 10)) if self.ttl_seconds > 0 else 600.0
+
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except OSError as e:
+                    print(f"   ⚠️ 清理任务目录失败: {e}")
+                time.sleep(interval)
+
+        self._janitor = threading.Thread(target=run, name="txt2srt-workspace-janitor", daemon=True)
+        self._janitor.start()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """
+        列出任务目录 [(最后修改时间, 目录名, 大小字节), ...]，按修改时间从旧到新排序
+        """
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        jobs = []
+        for name in names:
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            mtime, size = _dir_usage(path)
+            jobs.append((mtime, name, size))
+        jobs.sort()
+        return jobs
+
+    def __repr__(self) -> str:
+        return f"JobWorkspace({self.root!r}, ttl_seconds={self.ttl_seconds}, max_mb={self.max_mb})"
+
+
+def _dir_usage(path: str) -> Tuple[float, int]:
+    """
+    目录内最新的修改时间和文件总大小（目录在统计过程中被删除时按空目录计）
+    """
+    try:
+        latest = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0, 0
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, filename))
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            latest = max(latest, stat.st_mtime)
+    return latest, size